@@ -5,9 +5,63 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+from datetime import time, timedelta
+
 from flask import Flask
-from database import init_database, add_sample_data
+from flask.json.provider import DefaultJSONProvider
+import availability_counters
+from compression import init_compression
+from database import (
+    init_database, add_sample_data, init_request_connections, optimize_database, warm_up_database,
+    prune_book_changes
+)
+from models import Record
+from rate_limit import init_rate_limiting
 from routes import register_blueprints
+from scheduler import JobScheduler
+from services.hold_service import expire_ready_holds
+from services.notice_service import queue_overdue_notices, deliver_notices
+from services.overdue_service import refresh_loan_fees
+from services.patron_summary_service import refresh_stale_patron_summaries
+
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+class LibraryJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that serializes data-layer records like dicts.
+
+    Compact output is encoded with orjson when it is installed. Datetimes
+    are still passed to default() so they keep Flask's format.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_dumps(self, obj) -> bytes:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._orjson_dumps(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if orjson is None or pretty:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson_dumps(obj) + b'\n', mimetype=self.mimetype)
 
 
 def create_app():
@@ -19,6 +73,12 @@ def create_app():
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    app.json = LibraryJSONProvider(app)
+    # JSON responses are compact even in debug mode
+    app.json.compact = True
+    init_compression(app)
+    init_rate_limiting(app)
+    init_request_connections(app)
     
     # Initialize the database
     init_database()
@@ -26,12 +86,39 @@ def create_app():
     # Add sample data for testing and demonstration
     add_sample_data()
     
+    # Refresh planner statistics and prepare hot statements before the first request
+    warm_up_database()
+    
+    # Replay any unflushed availability changes and keep counts in memory
+    if availability_counters.WRITE_BEHIND_AVAILABILITY:
+        availability_counters.start_write_behind()
+    
     # Register all route blueprints
     register_blueprints(app)
     
     return app
 
 
+def create_scheduler():
+    """
+    Create the background job scheduler with the library's periodic jobs.
+    
+    Returns:
+        JobScheduler: Scheduler ready to be started
+    """
+    scheduler = JobScheduler()
+    scheduler.add_daily_job('refresh_loan_fees', refresh_loan_fees, at=time(2, 0))
+    scheduler.add_interval_job('expire_ready_holds', expire_ready_holds, interval=timedelta(hours=1))
+    scheduler.add_interval_job('refresh_patron_summaries', refresh_stale_patron_summaries,
+                               interval=timedelta(minutes=30))
+    scheduler.add_daily_job('optimize_database', optimize_database, at=time(3, 0))
+    scheduler.add_daily_job('prune_book_changes', prune_book_changes, at=time(4, 0))
+    scheduler.add_daily_job('queue_overdue_notices', queue_overdue_notices, at=time(6, 0))
+    scheduler.add_interval_job('deliver_notices', deliver_notices, interval=timedelta(minutes=15))
+    return scheduler
+
+
 if __name__ == '__main__':
     app = create_app()
+    create_scheduler().start()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,324 @@
+"""
+Availability Counters Module - Write-behind copy counts for hot titles
+
+Every borrow or return normally updates the book's row in one transaction,
+so when hundreds of patrons borrow the same title at once they all queue
+for SQLite's write lock. With write-behind counters enabled,
+``database.update_book_availability`` changes the count in memory instead:
+
+- Books are spread over ``STRIPES`` stripes, each with its own lock, so
+  changes to different titles do not wait for each other.
+- A borrow reserves a copy under its stripe's lock. It succeeds only if the
+  committed count plus every change not yet flushed leaves a copy, so
+  copies are never promised twice. The committed count is read on each
+  borrow, which keeps writers that bypass the counters (adding copies,
+  holds) in view.
+- Each change is appended to the stripe's intent log before it is
+  acknowledged.
+- A background thread flushes the changes every ``FLUSH_INTERVAL_SECONDS``
+  in a single transaction, aggregated per book. The same transaction
+  records how far into each intent log it got, and logs that are fully
+  flushed are deleted.
+
+After a crash, starting the counters again replays the intents that were
+logged but not flushed, each exactly once. Intents reach the operating
+system as soon as they are written, which is enough to survive the process
+dying; set ``INTENT_LOG_FSYNC`` to also survive a power failure, at the
+cost of an fsync per change.
+
+The counters live in one process. Enable them only when a single process
+serves borrows and returns, otherwise processes could promise the same
+copy.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import database
+from database import STATEMENTS, apply_availability_deltas, get_availability_checkpoints
+
+logger = logging.getLogger(__name__)
+
+# Route update_book_availability through the counters (started by create_app)
+WRITE_BEHIND_AVAILABILITY = False
+STRIPES = 16
+FLUSH_INTERVAL_SECONDS = 0.5
+INTENT_LOG_FSYNC = False
+
+
+class _Stripe:
+    """The counters of the books hashed to one stripe, and its intent log."""
+
+    def __init__(self, name: str, log_dir: str, seq: int):
+        self.name = name
+        self.lock = threading.Lock()
+        # book_id -> [change, unbranched part], not yet flushed
+        self.pending: Dict[int, List[int]] = {}
+        # book_id -> change being flushed right now
+        self.in_flight: Dict[int, int] = {}
+        self.seq = seq
+        self._log_dir = log_dir
+        self._conn = None
+        self._log = None
+        self._segments: List[str] = []
+
+    def committed(self, book_id: int) -> Optional[int]:
+        if self._conn is None:
+            # Autocommit, so no read holds a lock once it has returned
+            self._conn = sqlite3.connect(database.DATABASE, check_same_thread=False, isolation_level=None)
+        rows = self._conn.execute(STATEMENTS['available_copies'], (book_id,)).fetchall()
+        return rows[0][0] if rows else None
+
+    def append(self, book_id: int, change: int, at_default_branch: bool) -> None:
+        if self._log is None:
+            path = os.path.join(self._log_dir, f'{self.name}.{self.seq + 1:012d}.log')
+            self._log = open(path, 'a')
+            self._segments.append(path)
+        self.seq += 1
+        self._log.write(f'{self.seq} {book_id} {change} {int(at_default_branch)}\n')
+        self._log.flush()
+        if INTENT_LOG_FSYNC:
+            os.fsync(self._log.fileno())
+
+    def rotate(self) -> List[str]:
+        """Start a new log segment; returns the segments written so far."""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        return list(self._segments)
+
+    def forget(self, segments: List[str]) -> None:
+        """Drop flushed segments from the log."""
+        for path in segments:
+            os.remove(path)
+        self._segments = [path for path in self._segments if path not in segments]
+
+    def close(self) -> None:
+        self.rotate()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class AvailabilityCounters:
+    """
+    Striped write-behind counters of available copies.
+
+    Args:
+        log_dir: Directory of the intent logs (defaults to DATABASE + '.intents')
+        stripes: Number of stripes
+        flush_interval: Seconds between background flushes
+
+    Raises:
+        RuntimeError: If intents left by an earlier run could not be applied
+    """
+
+    def __init__(self, log_dir: Optional[str] = None, stripes: int = STRIPES,
+                 flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.log_dir = log_dir or f'{database.DATABASE}.intents'
+        self.flush_interval = flush_interval
+        os.makedirs(self.log_dir, exist_ok=True)
+        checkpoints = self.recover()
+        self._stripes = [_Stripe(f'stripe-{i:02d}', self.log_dir, checkpoints.get(f'stripe-{i:02d}', 0))
+                         for i in range(stripes)]
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stripe(self, book_id: int) -> _Stripe:
+        return self._stripes[book_id % len(self._stripes)]
+
+    def adjust(self, book_id: int, change: int, at_default_branch: bool = True) -> bool:
+        """
+        Change a book's available copies (+1 for return, -1 for borrow).
+
+        Args:
+            at_default_branch: Also change a branch in the main database at
+                flush time, as an unbranched update_book_availability() would;
+                False when the caller has updated a branch itself
+
+        Returns:
+            bool: False if the book is unknown or a borrow finds no copy left
+        """
+        stripe = self._stripe(book_id)
+        with stripe.lock:
+            pending = stripe.pending.get(book_id)
+            try:
+                if change < 0:
+                    committed = stripe.committed(book_id)
+                    if committed is None:
+                        return False
+                    available = committed + (pending[0] if pending else 0) + stripe.in_flight.get(book_id, 0)
+                    if available + change < 0:
+                        return False
+                stripe.append(book_id, change, at_default_branch)
+            except (sqlite3.Error, OSError) as e:
+                logger.error('Availability change for book %s failed: %s', book_id, e)
+                return False
+            if pending is None:
+                pending = stripe.pending[book_id] = [0, 0]
+            pending[0] += change
+            if at_default_branch:
+                pending[1] += change
+        return True
+
+    def available(self, book_id: int) -> Optional[int]:
+        """Get a book's available copies, including changes not flushed yet."""
+        stripe = self._stripe(book_id)
+        with stripe.lock:
+            committed = stripe.committed(book_id)
+            if committed is None:
+                return None
+            pending = stripe.pending.get(book_id)
+            return committed + (pending[0] if pending else 0) + stripe.in_flight.get(book_id, 0)
+
+    def flush(self) -> int:
+        """
+        Write the pending changes of every stripe to the database in one transaction.
+
+        Returns:
+            int: Number of books whose counts were flushed
+
+        Raises:
+            RuntimeError: If the transaction failed; the changes stay pending
+        """
+        with self._flush_lock:
+            taken = []
+            deltas: Dict[int, List[int]] = {}
+            for stripe in self._stripes:
+                with stripe.lock:
+                    if not stripe.pending:
+                        continue
+                    pending, stripe.pending = stripe.pending, {}
+                    for book_id, (change, unbranched) in pending.items():
+                        stripe.in_flight[book_id] = stripe.in_flight.get(book_id, 0) + change
+                        delta = deltas.setdefault(book_id, [0, 0])
+                        delta[0] += change
+                        delta[1] += unbranched
+                    taken.append((stripe, pending, stripe.seq, stripe.rotate()))
+            if not taken:
+                return 0
+
+            checkpoints = {stripe.name: seq for stripe, _, seq, _ in taken}
+            if not apply_availability_deltas({book_id: tuple(delta) for book_id, delta in deltas.items()},
+                                             checkpoints, self._committing(taken)):
+                self._restore(taken)
+                raise RuntimeError('Failed to flush availability counters')
+            for stripe, _, _, segments in taken:
+                with stripe.lock:
+                    stripe.forget(segments)
+            return len(deltas)
+
+    @contextmanager
+    def _committing(self, taken):
+        # Readers see the flushed changes either in flight or committed,
+        # never both and never neither
+        stripes = [stripe for stripe, _, _, _ in taken]
+        for stripe in stripes:
+            stripe.lock.acquire()
+        try:
+            yield
+            for stripe, pending, _, _ in taken:
+                for book_id, (change, _) in pending.items():
+                    remaining = stripe.in_flight[book_id] - change
+                    if remaining:
+                        stripe.in_flight[book_id] = remaining
+                    else:
+                        del stripe.in_flight[book_id]
+        finally:
+            for stripe in reversed(stripes):
+                stripe.lock.release()
+
+    def _restore(self, taken) -> None:
+        for stripe, pending, _, _ in taken:
+            with stripe.lock:
+                for book_id, (change, unbranched) in pending.items():
+                    stripe.in_flight[book_id] -= change
+                    if not stripe.in_flight[book_id]:
+                        del stripe.in_flight[book_id]
+                    current = stripe.pending.setdefault(book_id, [0, 0])
+                    current[0] += change
+                    current[1] += unbranched
+
+    def recover(self) -> Dict[str, int]:
+        """
+        Apply the intents an earlier run logged but did not flush, then delete its logs.
+
+        Returns:
+            Dict[str, int]: Last sequence number of each log
+        """
+        checkpoints = get_availability_checkpoints()
+        names = sorted(name for name in os.listdir(self.log_dir) if name.endswith('.log'))
+        deltas: Dict[int, List[int]] = {}
+        replayed = dict(checkpoints)
+        for name in names:
+            log = name.split('.', 1)[0]
+            with open(os.path.join(self.log_dir, name)) as f:
+                for line in f:
+                    fields = line.split()
+                    # A torn last line was never acknowledged
+                    if len(fields) != 4:
+                        continue
+                    seq, book_id, change, at_default_branch = map(int, fields)
+                    if seq <= checkpoints.get(log, 0):
+                        continue
+                    delta = deltas.setdefault(book_id, [0, 0])
+                    delta[0] += change
+                    delta[1] += change if at_default_branch else 0
+                    replayed[log] = max(replayed.get(log, 0), seq)
+        if deltas and not apply_availability_deltas(
+                {book_id: tuple(delta) for book_id, delta in deltas.items()}, replayed):
+            raise RuntimeError(f'Failed to replay availability intents in {self.log_dir}')
+        if deltas:
+            logger.warning('Replayed unflushed availability changes for %d book(s)', len(deltas))
+        for name in names:
+            os.remove(os.path.join(self.log_dir, name))
+        return replayed
+
+    def start(self) -> None:
+        """Start the background flush thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='availability-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the flush thread, flush what is left and close the logs."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Availability flush failed')
+
+
+def start_write_behind(log_dir: Optional[str] = None, stripes: int = STRIPES,
+                       flush_interval: float = FLUSH_INTERVAL_SECONDS) -> AvailabilityCounters:
+    """Start write-behind counters and route update_book_availability through them."""
+    stop_write_behind()
+    counters = AvailabilityCounters(log_dir, stripes, flush_interval)
+    counters.start()
+    database.AVAILABILITY_COUNTERS = counters
+    return counters
+
+
+def stop_write_behind() -> None:
+    """Flush and stop the running counters, if any, and go back to direct updates."""
+    counters = database.AVAILABILITY_COUNTERS
+    if counters is None:
+        return
+    database.AVAILABILITY_COUNTERS = None
+    counters.stop()
@@ -0,0 +1,229 @@
+"""
+Backup Module - Online backups of the library database
+
+Backups use SQLite's online backup API, copying a few pages at a time and
+sleeping between steps so borrow/return requests are never locked out for
+long. Each snapshot is written to a temporary file, checked with
+``PRAGMA integrity_check`` and only then renamed into place, so a
+half-written file is never mistaken for a backup. Old snapshots are rotated
+out, and a snapshot can be restored into the live database the same way.
+
+Usage:
+    python -m backup create [--dir backups] [--pages 256] [--pause 0.01] [--keep 7]
+    python -m backup list [--dir backups]
+    python -m backup verify PATH
+    python -m backup restore PATH [--pages 256] [--pause 0.01]
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import database
+
+DEFAULT_BACKUP_DIR = 'backups'
+# Pages copied per step and the pause between steps
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_PAUSE = 0.01
+# Snapshots kept by rotation
+DEFAULT_KEEP = 7
+# A write to the source restarts an incremental copy; after this many
+# restarts the rest is copied in a single step instead
+MAX_RESTARTS = 3
+
+_BACKUP_PREFIX = 'library-'
+
+
+class BackupError(Exception):
+    """Raised when a backup or restore cannot be completed."""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def copy_in_steps(source: sqlite3.Connection, target: sqlite3.Connection, pages: int,
+          pause: float, log: Optional[Callable[[str], None]] = None) -> None:
+    """Copy source into target in throttled steps."""
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except _TooManyRestarts:
+        if log:
+            log(f'Source kept changing; finishing after {MAX_RESTARTS} restarts in one step')
+        source.backup(target, pages=-1)
+
+
+def verify_backup(path: str) -> bool:
+    """Check a backup file with PRAGMA integrity_check."""
+    if not os.path.exists(path):
+        return False
+    try:
+        conn = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return result == 'ok'
+
+
+def list_backups(backup_dir: str = DEFAULT_BACKUP_DIR) -> List[str]:
+    """List backup files in backup_dir, oldest first."""
+    return sorted(glob.glob(os.path.join(backup_dir, f'{_BACKUP_PREFIX}*.db')))
+
+
+def rotate_backups(backup_dir: str = DEFAULT_BACKUP_DIR, keep: int = DEFAULT_KEEP) -> List[str]:
+    """
+    Delete all but the newest keep backups.
+
+    Returns:
+        List[str]: Paths of the deleted backups
+    """
+    backups = list_backups(backup_dir)
+    expired = backups[:-keep] if keep > 0 else backups
+    for path in expired:
+        os.remove(path)
+    return expired
+
+
+def create_backup(backup_dir: str = DEFAULT_BACKUP_DIR, pages: int = DEFAULT_PAGES_PER_STEP,
+                  pause: float = DEFAULT_STEP_PAUSE, keep: Optional[int] = DEFAULT_KEEP,
+                  log: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Take an online snapshot of the current database.
+
+    Args:
+        backup_dir: Directory the snapshot is written to
+        pages: Pages copied per step
+        pause: Seconds to sleep between steps
+        keep: Snapshots to keep after rotation (None disables rotation)
+        log: Optional callable receiving progress messages
+
+    Returns:
+        str: Path of the new snapshot
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(backup_dir, f'{_BACKUP_PREFIX}{stamp}.db')
+    temp_path = f'{path}.partial'
+
+    started = time.perf_counter()
+    source = sqlite3.connect(database.DATABASE)
+    target = sqlite3.connect(temp_path)
+    try:
+        copy_in_steps(source, target, pages, pause, log)
+    except sqlite3.Error as e:
+        raise BackupError(f'Backup of {database.DATABASE} failed: {e}') from e
+    finally:
+        target.close()
+        source.close()
+
+    if not verify_backup(temp_path):
+        os.remove(temp_path)
+        raise BackupError(f'Backup of {database.DATABASE} failed the integrity check')
+    os.replace(temp_path, path)
+    if log:
+        log(f'Backed up {database.DATABASE} to {path} in {time.perf_counter() - started:.2f}s')
+
+    if keep is not None:
+        for expired in rotate_backups(backup_dir, keep):
+            if log:
+                log(f'Removed old backup {expired}')
+    return path
+
+
+def restore_backup(path: str, pages: int = DEFAULT_PAGES_PER_STEP,
+                   pause: float = DEFAULT_STEP_PAUSE,
+                   log: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Restore a snapshot into the current database.
+
+    The snapshot is copied through the backup API rather than over the file,
+    so it takes the proper locks and connections held by a running app see
+    the restored data on their next query.
+    """
+    if not verify_backup(path):
+        raise BackupError(f'{path} is missing or failed the integrity check')
+
+    source = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+    target = sqlite3.connect(database.DATABASE)
+    try:
+        copy_in_steps(source, target, pages, pause, log)
+    except sqlite3.Error as e:
+        raise BackupError(f'Restore into {database.DATABASE} failed: {e}') from e
+    finally:
+        target.close()
+        source.close()
+    if log:
+        log(f'Restored {database.DATABASE} from {path}')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m backup',
+                                     description='Online backups of the library database.')
+    parser.add_argument('--database', default=database.DATABASE,
+                        help='Path to the SQLite database (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create = subparsers.add_parser('create', help='Take a snapshot and rotate old ones')
+    create.add_argument('--dir', default=DEFAULT_BACKUP_DIR,
+                        help='Backup directory (default: %(default)s)')
+    create.add_argument('--keep', type=int, default=DEFAULT_KEEP,
+                        help='Snapshots to keep (default: %(default)s)')
+
+    listing = subparsers.add_parser('list', help='List snapshots')
+    listing.add_argument('--dir', default=DEFAULT_BACKUP_DIR,
+                         help='Backup directory (default: %(default)s)')
+
+    verify = subparsers.add_parser('verify', help='Check a snapshot for corruption')
+    verify.add_argument('path')
+
+    restore = subparsers.add_parser('restore', help='Restore a snapshot into the database')
+    restore.add_argument('path')
+
+    for command in (create, restore):
+        command.add_argument('--pages', type=int, default=DEFAULT_PAGES_PER_STEP,
+                             help='Pages copied per step (default: %(default)s)')
+        command.add_argument('--pause', type=float, default=DEFAULT_STEP_PAUSE,
+                             help='Seconds to sleep between steps (default: %(default)s)')
+
+    args = parser.parse_args(argv)
+    database.DATABASE = args.database
+
+    try:
+        if args.command == 'create':
+            create_backup(args.dir, args.pages, args.pause, args.keep, log=print)
+        elif args.command == 'list':
+            for path in list_backups(args.dir):
+                print(f'{path}  {os.path.getsize(path)} bytes')
+        elif args.command == 'verify':
+            ok = verify_backup(args.path)
+            print(f'{args.path}: {"ok" if ok else "FAILED"}')
+            return 0 if ok else 1
+        else:
+            restore_backup(args.path, args.pages, args.pause, log=print)
+    except BackupError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark: /api/search response size and latency
+
+Builds a throwaway catalog of BOOKS books and requests a broad search
+through the Flask test client with different encoders, compression and
+field projection.
+
+Usage:
+    python benchmarks/bench_api_search.py [books] [requests]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+import database
+from database import get_db_connection, index_unindexed_books
+
+
+def build_database(books: int) -> None:
+    conn = get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 3, 2)',
+        ((f'Benchmark Title {i}', f'Benchmark Author {i % 500}', f'{9780000000000 + i}') for i in range(books))
+    )
+    conn.commit()
+    after_id = 0
+    while after_id is not None:
+        _, after_id = index_unindexed_books(conn, after_id, 5000)
+    conn.close()
+
+
+def measure(client, url: str, headers: dict, requests: int):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url, headers=headers)
+    elapsed = time.perf_counter() - start
+    return len(response.data), elapsed / requests * 1000
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    orjson = app_module.orjson
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        app_module.add_sample_data = lambda: None
+        app = app_module.create_app()
+        build_database(books)
+        client = app.test_client()
+
+        gzip_headers = {'Accept-Encoding': 'gzip'}
+        page = '/api/search?title=benchmark&limit=100'
+        cases = [
+            ('stdlib json', None, '/api/search?q=benchmark', {}),
+            ('orjson', orjson, '/api/search?q=benchmark', {}),
+            ('orjson + gzip', orjson, '/api/search?q=benchmark', gzip_headers),
+            ('page of 100, stdlib json', None, page, {}),
+            ('page of 100, orjson + gzip', orjson, page, gzip_headers),
+            ('page of 100, fields=title,isbn + gzip', orjson, page + '&fields=title,isbn', gzip_headers),
+        ]
+        print(f'books={books} requests={requests}')
+        for name, encoder, url, headers in cases:
+            app_module.orjson = encoder
+            size, latency = measure(client, url, headers, requests)
+            print(f'{name:40s} {size:>10d} bytes  {latency:8.2f}ms')
+        app_module.orjson = orjson
+
+
+if __name__ == '__main__':
+    main()
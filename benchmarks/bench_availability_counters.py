@@ -0,0 +1,65 @@
+"""
+Benchmark: write-behind availability counters
+
+Builds a throwaway database with one title of COPIES copies and has
+THREADS threads borrow and return it OPS times each through
+update_book_availability, first with direct updates and then with the
+write-behind counters, printing throughput for both.
+
+Usage:
+    python benchmarks/bench_availability_counters.py [threads] [ops] [copies]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, insert_book, update_book_availability
+from availability_counters import start_write_behind, stop_write_behind
+
+
+def hammer(threads: int, ops: int) -> float:
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(ops):
+            if update_book_availability(1, -1):
+                update_book_availability(1, +1)
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    copies = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        init_database()
+        insert_book('Launch Title', 'Author', '9780000000001', copies, copies)
+        print(f'threads={threads} ops/thread={ops} copies={copies}')
+
+        elapsed = hammer(threads, ops)
+        print(f'direct:       {elapsed:.2f}s  {threads * ops / elapsed:,.0f} borrow+return/s')
+
+        start_write_behind()
+        elapsed = hammer(threads, ops)
+        stop_write_behind()
+        print(f'write-behind: {elapsed:.2f}s  {threads * ops / elapsed:,.0f} borrow+return/s')
+
+
+if __name__ == '__main__':
+    main()
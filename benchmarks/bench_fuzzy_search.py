@@ -0,0 +1,82 @@
+"""
+Benchmark: typo-tolerant title and author search
+
+Builds a throwaway catalog of BOOKS generated titles and authors, indexes it
+with the trigram index and times fuzzy searches for misspelled words.
+
+Usage:
+    python benchmarks/bench_fuzzy_search.py [books] [queries]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import get_db_connection, index_unindexed_books, init_database
+from services.library_service import search_books_in_catalog
+
+CONSONANTS = 'bcdfghjklmnprstvwz'
+VOWELS = 'aeiou'
+
+
+def make_word(rng: random.Random) -> str:
+    # Pronounceable words give a realistic spread of common and rare trigrams
+    return ''.join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4)))
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def build_database(books: int, rng: random.Random) -> list:
+    init_database()
+    vocabulary = [make_word(rng) for _ in range(20000)]
+    conn = get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 1)',
+        ((' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 5))).title(),
+          f'{rng.choice(vocabulary).title()} {rng.choice(vocabulary).title()}',
+          f'{9780000000000 + i}') for i in range(books))
+    )
+    conn.commit()
+    after_id = 0
+    while after_id is not None:
+        _, after_id = index_unindexed_books(conn, after_id, 10000)
+    conn.close()
+    return vocabulary
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        start = time.perf_counter()
+        vocabulary = build_database(books, rng)
+        print(f'built and indexed {books} books in {time.perf_counter() - start:.1f}s')
+
+        long_words = [word for word in vocabulary if len(word) >= 6]
+        terms = [misspell(rng.choice(long_words), rng) for _ in range(queries)]
+        timings = []
+        matches = 0
+        for term in terms:
+            start = time.perf_counter()
+            matches += bool(search_books_in_catalog(term, 'title', threshold=0.4))
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    print(f'books={books} queries={queries} with results={matches}')
+    print(f'median: {timings[len(timings) // 2] * 1000:.2f}ms  '
+          f'p95: {timings[int(len(timings) * 0.95)] * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark: patron status report generation
+
+Builds a throwaway database with PATRONS patrons holding LOANS_PER_PATRON
+loans each (roughly a third of them overdue) and times
+get_patron_status_report for every patron.
+
+Usage:
+    python benchmarks/bench_patron_report.py [patrons] [loans_per_patron]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, insert_book, insert_borrow_record
+from services.library_service import get_patron_status_report
+
+
+def build_database(patrons: int, loans_per_patron: int) -> None:
+    init_database()
+    for i in range(loans_per_patron):
+        insert_book(f'Benchmark Book {i}', f'Author {i}', f'{9780000000000 + i}', patrons, 0)
+
+    now = datetime.now()
+    for p in range(patrons):
+        patron_id = f'{100000 + p:06d}'
+        for i in range(loans_per_patron):
+            borrow_date = now - timedelta(days=(p + i) % 30)
+            insert_borrow_record(patron_id, i + 1, borrow_date, borrow_date + timedelta(days=14))
+
+
+def main() -> None:
+    patrons = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    loans_per_patron = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        build_database(patrons, loans_per_patron)
+
+        patron_ids = [f'{100000 + p:06d}' for p in range(patrons)]
+        start = time.perf_counter()
+        for patron_id in patron_ids:
+            get_patron_status_report(patron_id)
+        elapsed = time.perf_counter() - start
+
+    print(f'patrons={patrons} loans/patron={loans_per_patron}')
+    print(f'total: {elapsed:.3f}s  per report: {elapsed / patrons * 1000:.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: memory and time to materialize a catalog listing
+
+Compares the old sqlite3.Row -> dict conversion against building Book
+records directly from result tuples, for ROWS books held in memory.
+
+Usage:
+    python benchmarks/bench_record_memory.py [rows]
+"""
+
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import BOOK_COLUMNS, _fetch_records
+from models import Book
+
+
+def build_database(rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY, title TEXT NOT NULL, author TEXT NOT NULL,
+            isbn TEXT NOT NULL, total_copies INTEGER NOT NULL, available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Title {i}', f'Author {i % 5000}', f'{9780000000000 + i}', 3, i % 4) for i in range(rows))
+    )
+    conn.commit()
+    return conn
+
+
+def measure(label: str, load) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    books = load()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<12} rows={len(books)} time={elapsed:.2f}s '
+          f'retained={current / 1e6:.1f}MB peak={peak / 1e6:.1f}MB')
+    del books
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    conn = build_database(rows)
+    sql = f'SELECT {BOOK_COLUMNS} FROM books ORDER BY title'
+
+    def load_dicts():
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(book) for book in conn.execute(sql).fetchall()]
+        finally:
+            conn.row_factory = None
+
+    measure('dict rows', load_dicts)
+    measure('Book records', lambda: _fetch_records(conn, Book, sql))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: batch patron status reports
+
+Builds a throwaway database with PATRONS patrons holding LOANS_PER_PATRON
+loans each and times run_patron_reports with 1, 2, 4, ... worker processes
+up to the number of CPUs, printing the speedup over a single worker.
+
+Usage:
+    python benchmarks/bench_report_runner.py [patrons] [loans_per_patron]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import init_database, to_epoch
+from reports import run_patron_reports
+
+
+def build_database(patrons: int, loans_per_patron: int) -> None:
+    init_database()
+    conn = sqlite3.connect(database.DATABASE)
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, 0)
+    ''', [(f'Benchmark Book {i}', f'Author {i}', f'{9780000000000 + i}', patrons)
+          for i in range(loans_per_patron)])
+
+    now = datetime.now()
+    rows = []
+    for p in range(patrons):
+        for i in range(loans_per_patron):
+            borrow_date = now - timedelta(days=(p + i) % 30)
+            due_date = borrow_date + timedelta(days=14)
+            rows.append((f'{100000 + p:06d}', i + 1, borrow_date.isoformat(), due_date.isoformat(),
+                         to_epoch(borrow_date), to_epoch(due_date)))
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, borrow_ts, due_ts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+
+def main() -> None:
+    patrons = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    loans_per_patron = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    cpus = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        build_database(patrons, loans_per_patron)
+        print(f'patrons={patrons} loans/patron={loans_per_patron} cpus={cpus}')
+
+        baseline = None
+        workers = 1
+        while workers <= cpus:
+            start = time.perf_counter()
+            run_patron_reports(os.path.join(tmp, 'reports.jsonl'), workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f'workers={workers}: {elapsed:.2f}s  {patrons / elapsed:,.0f} reports/s  '
+                  f'speedup {baseline / elapsed:.2f}x')
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
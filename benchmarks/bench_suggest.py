@@ -0,0 +1,54 @@
+"""
+Benchmark: typeahead suggestions
+
+Builds a prefix index over BOOKS generated titles and authors and times
+suggestion lookups for short prefixes of words in the catalog.
+
+Usage:
+    python benchmarks/bench_suggest.py [books] [queries]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Book
+from services.suggest_service import PrefixIndex
+
+CONSONANTS = 'bcdfghjklmnprstvwz'
+VOWELS = 'aeiou'
+
+
+def make_word(rng: random.Random) -> str:
+    return ''.join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4)))
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    rng = random.Random(42)
+    vocabulary = [make_word(rng) for _ in range(20000)]
+    catalog = [
+        Book(i + 1, ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 5))).title(),
+             f'{rng.choice(vocabulary).title()} {rng.choice(vocabulary).title()}',
+             f'{9780000000000 + i}', 1, 1)
+        for i in range(books)
+    ]
+
+    start = time.perf_counter()
+    index = PrefixIndex(catalog)
+    print(f'indexed {books} books ({len(index.keys)} keys) in {time.perf_counter() - start:.2f}s')
+
+    prefixes = [rng.choice(vocabulary)[:rng.randint(2, 5)] for _ in range(queries)]
+    start = time.perf_counter()
+    for prefix in prefixes:
+        index.search(prefix, 10)
+    elapsed = time.perf_counter() - start
+    print(f'queries={queries} per lookup: {elapsed / queries * 1e6:.1f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Compression Module - gzip/brotli response compression
+
+Responses are compressed when the client accepts it, the body is of a
+compressible type and at least ``COMPRESSION_MIN_SIZE`` bytes. Brotli is
+preferred when the optional ``brotli`` package is installed and the client
+lists it; otherwise gzip is used. Streamed responses (the catalog page) are
+compressed chunk by chunk with a flush after each one, so streaming still
+delivers the first bytes early. Server-sent event streams are left alone.
+"""
+
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Smallest body worth compressing; below this the headers cost more than they save
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/plain', 'text/css', 'text/javascript',
+    'application/javascript',
+}
+GZIP_LEVEL = 6
+# Brotli's higher qualities are too slow for responses built per request
+BROTLI_QUALITY = 4
+
+
+def _accepted(header: str, encoding: str) -> bool:
+    """Check whether an Accept-Encoding header allows encoding (q > 0)."""
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() not in (encoding, '*'):
+            continue
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding for an Accept-Encoding header."""
+    if brotli is not None and _accepted(accept_encoding, 'br'):
+        return 'br'
+    if _accepted(accept_encoding, 'gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a complete body."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def _compress_stream(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk.encode() if isinstance(chunk, str) else chunk)
+            data += compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response: Response) -> Response:
+    """Compress a response in place if the request and response allow it."""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app: Flask) -> None:
+    """Compress eligible responses of app."""
+    app.after_request(compress_response)
@@ -3,19 +3,566 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import json
+import math
+import os
+import re
+import itertools
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+from flask import g, has_app_context
+
+from models import Book, BookChange, Hold, Loan
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Loan dates are stored both as ISO text and as integer epoch seconds
+# (borrow_ts, due_ts, return_ts). Epochs count seconds of the naive local
+# timestamp since 1970-01-01, matching how the ISO values are written.
+_EPOCH = datetime(1970, 1, 1)
+
+def to_epoch(value: datetime) -> int:
+    """Convert a naive datetime to whole epoch seconds."""
+    return (value - _EPOCH) // timedelta(seconds=1)
+
+def from_epoch(seconds: int) -> datetime:
+    """Convert epoch seconds back to a naive datetime."""
+    return _EPOCH + timedelta(seconds=seconds)
+
+# Column order matching the Book record's fields
+BOOK_COLUMNS = 'id, title, author, isbn, total_copies, available_copies'
+# Holds with the title of their book and their place in its queue
+_HOLD_SELECT = '''
+    SELECT h.id, h.book_id, h.patron_id, h.status, h.created_ts, h.ready_ts, b.title,
+           CASE WHEN h.status = 'waiting' THEN (
+               SELECT COUNT(*) FROM holds q
+               WHERE q.book_id = h.book_id AND q.status = 'waiting' AND q.id <= h.id
+           ) ELSE 0 END AS queue_position
+    FROM holds h
+    JOIN books b ON h.book_id = b.id
+'''
+
+# Statement registry. The SQL of the hot request paths (catalog reads,
+# borrows, returns, holds, patron figures, branch inventory) lives here
+# under a name, so every caller sends SQLite the identical string and hits
+# the connection's statement cache, and warm_statements() knows what to
+# prepare on a new connection. Branch inventory statements are templates
+# for one inventory table, filled in by _inventory_sql(). Transaction
+# control, shard attachment and SQL built per call (catalog search
+# filters, IN lists sized to the input) are tracked as 'other'.
+STATEMENTS = {
+    'all_books': f'SELECT {BOOK_COLUMNS} FROM books ORDER BY title',
+    'book_by_id': f'SELECT {BOOK_COLUMNS} FROM books WHERE id = ?',
+    'book_by_isbn': f'SELECT {BOOK_COLUMNS} FROM books WHERE isbn = ?',
+    'catalog_version': 'SELECT MAX(id) FROM books',
+    'patron_loans': '''
+        SELECT br.id, br.book_id, b.title, b.author, br.borrow_ts, br.due_ts,
+               br.due_ts < ? AS is_overdue, br.branch_id, b.item_type
+        FROM borrow_records br
+        JOIN books b ON br.book_id = b.id
+        WHERE br.patron_id = ? AND br.return_date IS NULL
+        ORDER BY br.borrow_ts
+    ''',
+    'patron_loan_count': '''
+        SELECT COUNT(*) as count FROM borrow_records
+        WHERE patron_id = ? AND return_date IS NULL
+    ''',
+    'book_exists': 'SELECT 1 FROM books WHERE id = ?',
+    'book_copies': 'SELECT total_copies, available_copies FROM books WHERE id = ?',
+    'materialized_fee': '''
+        SELECT is_overdue, days_overdue, fee_amount, valid_until_ts FROM loan_fees
+        WHERE patron_id = ? AND book_id = ?
+        ORDER BY loan_id LIMIT 1
+    ''',
+    'latest_change_seq': 'SELECT MAX(seq) AS seq FROM book_changes',
+    'oldest_change_seq': 'SELECT MIN(seq) AS seq FROM book_changes',
+    'changes_since': '''
+        SELECT seq, book_id, change_type, available_copies, total_copies, changed_ts
+        FROM book_changes WHERE seq > ? ORDER BY seq LIMIT ?
+    ''',
+    'insert_book': '''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies, item_type)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+    'insert_loan': '''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, borrow_ts, due_ts,
+                                    branch_id, item_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'update_availability': '''
+        UPDATE books SET available_copies = available_copies + ?
+        WHERE id = ? AND available_copies + ? >= 0
+    ''',
+    'available_copies': 'SELECT available_copies FROM books WHERE id = ?',
+    'oldest_open_loan': '''
+        SELECT id, item_id, due_ts, branch_id FROM borrow_records
+        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+        ORDER BY id LIMIT 1
+    ''',
+    'open_loan': '''
+        SELECT id, item_id, due_ts, branch_id FROM borrow_records
+        WHERE id = ? AND patron_id = ? AND book_id = ? AND return_date IS NULL
+    ''',
+    'delete_loan_fees': 'DELETE FROM loan_fees WHERE loan_id = ?',
+    'patron_summary': '''
+        SELECT patron_id, open_loans, overdue_count, accrued_fees, fees_paid,
+               last_activity_ts, refreshed_ts, valid_until_ts, version
+        FROM patron_summary WHERE patron_id = ?
+    ''',
+    'ready_hold': _HOLD_SELECT + '''
+        WHERE h.patron_id = ? AND h.book_id = ? AND h.status = 'ready'
+    ''',
+    'ready_hold_id': '''
+        SELECT id FROM holds WHERE patron_id = ? AND book_id = ? AND status = 'ready'
+    ''',
+    'next_waiting_hold': '''
+        SELECT id FROM holds
+        WHERE book_id = ? AND status = 'waiting'
+        ORDER BY id LIMIT 1
+    ''',
+    'mark_hold_ready': "UPDATE holds SET status = 'ready', ready_ts = ? WHERE id = ?",
+    'set_hold_status': 'UPDATE holds SET status = ? WHERE id = ?',
+    'all_branches': 'SELECT id, name, shard FROM branches ORDER BY id',
+    'branch_shard': 'SELECT shard FROM branches WHERE id = ?',
+    'branch_shards': 'SELECT DISTINCT shard FROM branches WHERE shard IS NOT NULL ORDER BY shard',
+    'adjust_branch_copies': '''
+        UPDATE {table} SET available_copies = available_copies + ?
+        WHERE book_id = ? AND branch_id = ? AND available_copies + ? BETWEEN 0 AND total_copies
+    ''',
+    'adjust_any_branch_copies': '''
+        UPDATE {table} SET available_copies = available_copies + ?
+        WHERE book_id = ? AND branch_id = (
+            SELECT branch_id FROM {table}
+            WHERE book_id = ? AND available_copies + ? BETWEEN 0 AND total_copies
+            ORDER BY branch_id = ? DESC, branch_id LIMIT 1
+        )
+    ''',
+    'branch_copies': '''
+        SELECT branch_id, total_copies, available_copies FROM {table} WHERE book_id = ?
+    ''',
+    'close_loan': 'UPDATE borrow_records SET return_date = ?, return_ts = ? WHERE id = ?',
+    'item_by_barcode': '''
+        SELECT i.id, i.book_id, i.barcode, i.branch_id, i.status, b.title,
+               br.id AS loan_id, br.patron_id
+        FROM items i
+        JOIN books b ON i.book_id = b.id
+        LEFT JOIN borrow_records br ON br.item_id = i.id AND br.return_date IS NULL
+        WHERE i.barcode = ?
+    ''',
+    'free_item': '''
+        SELECT id FROM items WHERE book_id = ? AND status = 'available'
+        ORDER BY branch_id = ? DESC, id LIMIT 1
+    ''',
+    'check_out_item': "UPDATE items SET status = 'on_loan' WHERE id = ? AND book_id = ? AND status = 'available'",
+    'check_in_item': "UPDATE items SET status = 'available' WHERE id = ?",
+    'set_loan_item': 'UPDATE borrow_records SET item_id = ? WHERE id = ?',
+    'log_book_change': '''
+        INSERT INTO book_changes (book_id, change_type, available_copies, total_copies, changed_ts)
+        SELECT id, ?, available_copies, total_copies, ? FROM books WHERE id = ?
+    ''',
+    'adjust_patron_summary': '''
+        INSERT INTO patron_summary (patron_id, open_loans, fees_paid, last_activity_ts, valid_until_ts)
+        VALUES (?, MAX(?, 0), ?, ?, 0)
+        ON CONFLICT (patron_id) DO UPDATE SET
+            open_loans = MAX(open_loans + ?, 0),
+            fees_paid = fees_paid + ?,
+            last_activity_ts = MAX(COALESCE(last_activity_ts, 0), ?),
+            valid_until_ts = CASE WHEN ? IS NULL THEN valid_until_ts
+                                  ELSE MIN(COALESCE(valid_until_ts, ?), ?) END,
+            version = version + 1
+    ''',
+}
+_STATEMENT_NAMES = {sql: name for name, sql in STATEMENTS.items()}
+
+def _inventory_sql(name: str, table: str) -> str:
+    """Fill in a branch inventory statement for one inventory table, tracked under its name."""
+    sql = STATEMENTS[name].format(table=table)
+    _STATEMENT_NAMES.setdefault(sql, name)
+    return sql
+
+# Read replica routing. When REPLICA_DATABASE is set, reads made inside
+# replica_reads() (catalog search, patron reports) are served from a
+# read-only copy of the primary. Once the copy is older than
+# REPLICA_MAX_STALENESS seconds a background thread refreshes it with the
+# SQLite backup API, REPLICA_PAGES_PER_STEP pages at a time, and reads use
+# the primary until it is done; set the staleness to None when the replica
+# file is kept up to date by something else. A thread that has committed a
+# write since the copy was taken keeps reading the primary, so it always
+# sees its own writes.
+REPLICA_DATABASE = None
+REPLICA_MAX_STALENESS = 30.0
+REPLICA_PAGES_PER_STEP = 256
+REPLICA_STEP_PAUSE = 0.01
+
+_replica_lock = threading.Lock()
+_replica_state = {'source': None, 'refreshed_at': 0.0}
+_replica_refresher: Optional[threading.Thread] = None
+_local = threading.local()
+
+# Statement cache of pooled connections. Python's default of 128 is plenty
+# for one request, but pooled connections live long enough to see every
+# statement the app sends.
+STATEMENT_CACHE_SIZE = 512
+_DEFAULT_STATEMENT_CACHE_SIZE = 128
+
+# Hits and misses per registry statement (everything else under 'other').
+# Counters are bumped without a lock; an occasional lost update is fine.
+_statement_stats: Dict[str, List[int]] = {}
+
+def _unicode_lower(text):
+    return text.lower() if isinstance(text, str) else text
+
+class _Cursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        self.connection._note_statement(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection._note_statement(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+class _Connection(sqlite3.Connection):
+    """
+    Connection that tracks its statement cache.
+
+    sqlite3 keeps the last cached_statements SQL strings of a connection
+    prepared, least recently used first out. The same bookkeeping here tells
+    whether each execute reused a prepared statement or compiled a new one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_size = kwargs.get('cached_statements', _DEFAULT_STATEMENT_CACHE_SIZE)
+        self._prepared = OrderedDict()
+        # SQLite's lower() only folds ASCII; search needs Python's
+        self.create_function('unicode_lower', 1, _unicode_lower, deterministic=True)
+
+    def _note_statement(self, sql: str) -> None:
+        stats = _statement_stats.setdefault(_STATEMENT_NAMES.get(sql, 'other'), [0, 0])
+        if sql in self._prepared:
+            self._prepared.move_to_end(sql)
+            stats[0] += 1
+            return
+        stats[1] += 1
+        self._prepared[sql] = None
+        if len(self._prepared) > self._cache_size:
+            self._prepared.popitem(last=False)
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or _Cursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class _PrimaryConnection(_Connection):
+    """Connection to the primary that remembers when this thread last committed a write."""
+
+    def commit(self):
+        super().commit()
+        if self.total_changes:
+            _local.last_write = time.monotonic()
+
 def get_db_connection():
     """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(DATABASE, factory=_PrimaryConnection)
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
+@contextmanager
+def replica_reads():
+    """Let reads in this block (on this thread) be served from the read replica."""
+    previous = getattr(_local, 'use_replica', False)
+    _local.use_replica = True
+    try:
+        yield
+    finally:
+        _local.use_replica = previous
+
+def refresh_replica() -> bool:
+    """Copy the primary database into REPLICA_DATABASE, waiting for any refresh in progress."""
+    with _replica_lock:
+        return _copy_to_replica()
+
+def _copy_to_replica() -> bool:
+    # backup imports this module, so it is imported here
+    from backup import copy_in_steps
+
+    if not REPLICA_DATABASE:
+        return False
+    source_path = DATABASE
+    replica_path = REPLICA_DATABASE
+    temp_path = f'{replica_path}.tmp'
+    started = time.monotonic()
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(temp_path)
+    try:
+        copy_in_steps(source, target, REPLICA_PAGES_PER_STEP, REPLICA_STEP_PAUSE)
+        target.close()
+        source.close()
+        # Swap the file so readers of the old copy are never disturbed
+        os.replace(temp_path, replica_path)
+    except Exception as e:
+        target.close()
+        source.close()
+        return False
+    _replica_state.update(source=source_path, refreshed_at=started)
+    return True
+
+def _start_replica_refresh() -> None:
+    """Refresh the replica on a background thread unless a refresh is already running."""
+    global _replica_refresher
+    if not _replica_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            _copy_to_replica()
+        finally:
+            _replica_lock.release()
+
+    try:
+        _replica_refresher = threading.Thread(target=run, name='replica-refresh', daemon=True)
+        _replica_refresher.start()
+    except Exception:
+        _replica_lock.release()
+        raise
+
+def _replica_is_usable() -> bool:
+    last_write = getattr(_local, 'last_write', None)
+    if REPLICA_MAX_STALENESS is None:
+        return True
+    if last_write is not None and last_write >= _replica_state['refreshed_at']:
+        return False
+    fresh = (_replica_state['source'] == DATABASE
+             and time.monotonic() - _replica_state['refreshed_at'] <= REPLICA_MAX_STALENESS)
+    if fresh:
+        return True
+    # The copy is made in the background; until it is done, reads use the
+    # primary rather than wait or exceed the staleness bound
+    _start_replica_refresh()
+    return False
+
+def get_read_connection():
+    """
+    Get a connection for read-only queries.
+
+    Inside replica_reads() this is a read-only connection to the replica
+    when one is configured and fresh enough; otherwise the primary.
+    """
+    if (not (REPLICA_DATABASE and getattr(_local, 'use_replica', False))
+            or _has_uncommitted_writes() or not _replica_is_usable()):
+        return _connection()
+    try:
+        conn = sqlite3.connect(Path(REPLICA_DATABASE).resolve().as_uri() + '?mode=ro', uri=True,
+                               factory=_Connection)
+    except sqlite3.Error:
+        return _connection()
+    conn.row_factory = sqlite3.Row
+    return conn
+
+# Request-scoped connections. Once init_request_connections() has been
+# called for an app, the helpers below share one connection per request
+# (kept on flask.g, taken from a pool on first use and returned at
+# teardown) instead of connecting for every call. With unit_of_work=True the request's writes
+# also form one transaction that is committed when the request ends, or
+# rolled back if it raised. get_db_connection() always returns a new
+# connection of its own.
+REQUEST_UNIT_OF_WORK = False
+# Idle connections kept for reuse per database file, and how many
+# database files keep a pool
+POOL_SIZE = 4
+MAX_POOLED_DATABASES = 4
+
+class _ConnectionPool:
+    """Long-lived primary connections shared out to request scopes."""
+
+    def __init__(self):
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> '_PrimaryConnection':
+        path = DATABASE
+        with self._lock:
+            idle = self._idle.get(path)
+            if idle:
+                return idle.pop()
+        conn = sqlite3.connect(path, factory=_PrimaryConnection, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.pool_path = path
+        warm_statements(conn)
+        return conn
+
+    def release(self, conn: '_PrimaryConnection') -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        evicted = []
+        with self._lock:
+            idle = self._idle.get(conn.pool_path)
+            if idle is None:
+                idle = self._idle[conn.pool_path] = []
+                while len(self._idle) > MAX_POOLED_DATABASES:
+                    evicted.extend(self._idle.popitem(last=False)[1])
+            if len(idle) < POOL_SIZE:
+                idle.append(conn)
+            else:
+                evicted.append(conn)
+        for stale in evicted:
+            stale.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            pools, self._idle = list(self._idle.values()), OrderedDict()
+        for idle in pools:
+            for conn in idle:
+                conn.close()
+
+_pool = _ConnectionPool()
+
+class _RequestScope:
+    """The shared connection of one request."""
+
+    def __init__(self, unit_of_work: bool):
+        self.unit_of_work = unit_of_work
+        self.conn = None
+        self.savepoints = itertools.count()
+        # Callbacks waiting for the unit of work to commit
+        self.on_commit = []
+
+    def handle(self) -> '_ScopedConnection':
+        if self.conn is None:
+            self.conn = _pool.acquire()
+            if self.unit_of_work:
+                # Shards cannot be attached once the transaction has begun
+                _attach_all_shards(self.conn)
+                self.conn.execute('BEGIN')
+        return _ScopedConnection(self)
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        conn, self.conn = self.conn, None
+        callbacks, self.on_commit = self.on_commit, []
+        if conn is not None:
+            try:
+                if self.unit_of_work and error is None:
+                    changed = conn.total_changes
+                    conn.commit()
+                    if changed:
+                        _notify_book_change()
+                else:
+                    conn.rollback()
+            finally:
+                _pool.release(conn)
+        if error is None:
+            for callback in callbacks:
+                callback()
+
+class _ScopedConnection:
+    """
+    A helper's view of the request's shared connection.
+
+    close() leaves the shared connection open but discards what the helper
+    did not commit, as closing a private connection would. In a unit of
+    work each view is a savepoint: commit() releases it into the request's
+    transaction and the helper's own BEGIN statements are skipped.
+    """
+
+    def __init__(self, scope: _RequestScope):
+        self._conn = scope.conn
+        self._savepoint = None
+        if scope.unit_of_work:
+            self._savepoint = f'helper_{next(scope.savepoints)}'
+            self._conn.execute(f'SAVEPOINT {self._savepoint}')
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, sql: str, parameters=()):
+        if self._savepoint and sql.lstrip()[:5].upper() == 'BEGIN':
+            return self._conn.cursor()
+        return self._conn.execute(sql, parameters)
+
+    def commit(self) -> None:
+        if self._savepoint:
+            self._conn.execute(f'RELEASE {self._savepoint}')
+            self._conn.execute(f'SAVEPOINT {self._savepoint}')
+        else:
+            self._conn.commit()
+
+    def rollback(self) -> None:
+        if self._savepoint:
+            self._conn.execute(f'ROLLBACK TO {self._savepoint}')
+        else:
+            self._conn.rollback()
+
+    def close(self) -> None:
+        if self._savepoint:
+            self.rollback()
+            self._conn.execute(f'RELEASE {self._savepoint}')
+            self._savepoint = None
+        elif self._conn.in_transaction:
+            self._conn.rollback()
+
+def init_request_connections(app, unit_of_work: Optional[bool] = None) -> None:
+    """
+    Give each request of app one shared database connection.
+
+    Args:
+        app: Flask application
+        unit_of_work: Commit the request's writes once at the end
+            (defaults to REQUEST_UNIT_OF_WORK)
+    """
+    if unit_of_work is None:
+        unit_of_work = REQUEST_UNIT_OF_WORK
+
+    @app.before_request
+    def _open_request_scope():
+        g._db_scope = _RequestScope(unit_of_work)
+
+    @app.teardown_appcontext
+    def _close_request_scope(error):
+        scope = g.pop('_db_scope', None)
+        if scope is not None:
+            scope.close(error)
+
+def _connection():
+    """Get the current request's shared connection, or a new one outside a request."""
+    if has_app_context():
+        scope = g.get('_db_scope')
+        if scope is not None:
+            return scope.handle()
+    return get_db_connection()
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """
+    Run callback once the writes made so far are committed.
+
+    Inside a request's unit of work that is when the request commits, and
+    the callback is dropped if the request rolls back. Everywhere else
+    each helper has already committed its writes, so it runs right away.
+    """
+    scope = g.get('_db_scope') if has_app_context() else None
+    if scope is not None and scope.unit_of_work:
+        scope.on_commit.append(callback)
+    else:
+        callback()
+
+def _has_uncommitted_writes() -> bool:
+    scope = g.get('_db_scope') if has_app_context() else None
+    return bool(scope and scope.conn is not None and scope.conn.in_transaction
+                and scope.conn.total_changes)
+
 def init_database():
     """Initialize the database with required tables."""
     conn = get_db_connection()
@@ -48,9 +595,13 @@ def init_database():
     conn.commit()
     conn.close()
 
+    # Bring the schema up to date (indexes, new columns and tables)
+    from migrations import apply_migrations
+    apply_migrations()
+
 def add_sample_data():
     """Add sample data to the database if it's empty."""
-    conn = get_db_connection()
+    conn = _connection()
     book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
     
     if book_count == 0:
@@ -61,19 +612,24 @@ def add_sample_data():
             ('1984', 'George Orwell', '9780451524935', 1)
         ]
         
+        item_ids = []
         for title, author, isbn, copies in sample_books:
-            conn.execute('''
+            cursor = conn.execute('''
                 INSERT INTO books (title, author, isbn, total_copies, available_copies)
                 VALUES (?, ?, ?, ?, ?)
             ''', (title, author, isbn, copies, copies))
+            item_ids.append(_add_items(conn, cursor.lastrowid, copies, DEFAULT_BRANCH))
+            _index_book_trigrams(conn, cursor.lastrowid, title, author)
         
         # Make 1984 unavailable by adding a borrow record
+        borrow_date = datetime.now() - timedelta(days=5)
+        due_date = datetime.now() + timedelta(days=9)
         conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, borrow_ts, due_ts, item_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', ('123456', 3, borrow_date.isoformat(), due_date.isoformat(),
+              to_epoch(borrow_date), to_epoch(due_date), item_ids[2][0]))
+        conn.execute("UPDATE items SET status = 'on_loan' WHERE id = ?", (item_ids[2][0],))
         
         # Update available copies for 1984
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
@@ -82,87 +638,1322 @@ def add_sample_data():
     
     conn.close()
 
+# Statement cache warm-up and planner statistics
+
+def warm_statements(conn: sqlite3.Connection) -> int:
+    """
+    Prepare the registry's queries on conn so the first requests using it
+    find them in its statement cache. Writes are left to their first use.
+
+    Returns:
+        int: Number of statements prepared
+    """
+    warmed = 0
+    for sql in STATEMENTS.values():
+        if not sql.lstrip().upper().startswith('SELECT') or '{table}' in sql:
+            continue
+        try:
+            conn.execute(sql, (0,) * sql.count('?'))
+        except sqlite3.Error:
+            continue
+        warmed += 1
+    return warmed
+
+def optimize_database() -> bool:
+    """Refresh the query planner's statistics: a full ANALYZE the first time, PRAGMA optimize after."""
+    conn = get_db_connection()
+    try:
+        analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        conn.execute('PRAGMA optimize' if analyzed else 'ANALYZE')
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def warm_up_database() -> None:
+    """Update planner statistics and open a warmed pooled connection; run at startup."""
+    optimize_database()
+    _pool.release(_pool.acquire())
+
+def get_statement_cache_stats() -> Dict:
+    """
+    Get statement cache hits and misses since startup, overall and per
+    registry statement (SQL outside the registry is counted as 'other').
+    """
+    statements = [{'statement': name, 'hits': hits, 'misses': misses}
+                  for name, (hits, misses) in list(_statement_stats.items())]
+    statements.sort(key=lambda entry: entry['hits'] + entry['misses'], reverse=True)
+    hits = sum(entry['hits'] for entry in statements)
+    misses = sum(entry['misses'] for entry in statements)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        'statements': statements
+    }
+
+def reset_statement_cache_stats() -> None:
+    """Clear the statement cache counters."""
+    _statement_stats.clear()
+
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
+def _fetch_records(conn: sqlite3.Connection, record_type, sql: str, params: tuple = ()) -> List:
+    """Run a query and build record_type instances directly from the result tuples."""
+    cursor = conn.cursor()
+    cursor.row_factory = record_type.row_factory
+    return cursor.execute(sql, params).fetchall()
+
+def get_all_books() -> List[Book]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    conn = get_read_connection()
+    books = _fetch_records(conn, Book, STATEMENTS['all_books'])
     conn.close()
-    return [dict(book) for book in books]
+    return books
+
+def iter_all_books(batch_size: int = 500) -> Iterator[Book]:
+    """
+    Yield every book ordered by title, one batch at a time.
 
-def get_book_by_id(book_id: int) -> Optional[Dict]:
+    Each batch is a separate short query continuing after the last title
+    and ID seen, so a slow consumer never holds a read lock on the database.
+    """
+    last = None
+    while True:
+        conn = get_read_connection()
+        if last is None:
+            books = _fetch_records(conn, Book, f'''
+                SELECT {BOOK_COLUMNS} FROM books ORDER BY title, id LIMIT ?
+            ''', (batch_size,))
+        else:
+            books = _fetch_records(conn, Book, f'''
+                SELECT {BOOK_COLUMNS} FROM books WHERE (title, id) > (?, ?)
+                ORDER BY title, id LIMIT ?
+            ''', (last.title, last.id, batch_size))
+        conn.close()
+        yield from books
+        if len(books) < batch_size:
+            return
+        last = books[-1]
+
+def get_book_by_id(book_id: int) -> Optional[Book]:
     """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    conn = get_read_connection()
+    books = _fetch_records(conn, Book, STATEMENTS['book_by_id'], (book_id,))
     conn.close()
-    return dict(book) if book else None
+    return books[0] if books else None
 
-def get_book_by_isbn(isbn: str) -> Optional[Dict]:
+def get_book_by_isbn(isbn: str) -> Optional[Book]:
     """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    conn = get_read_connection()
+    books = _fetch_records(conn, Book, STATEMENTS['book_by_isbn'], (isbn,))
     conn.close()
-    return dict(book) if book else None
+    return books[0] if books else None
+
+def get_catalog_version() -> int:
+    """
+    Get a number that changes whenever a book is added to the catalog.
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
+    Books are never removed and their titles, authors and ISBNs never
+    change, so the highest book ID identifies the catalog contents.
+    """
+    conn = get_read_connection()
+    version = conn.execute(STATEMENTS['catalog_version']).fetchone()[0]
+    conn.close()
+    return version or 0
+
+def get_patron_borrowed_books(patron_id: str) -> List[Loan]:
     """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
-        JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ? AND br.return_date IS NULL
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
+    conn = get_read_connection()
+    records = conn.execute(STATEMENTS['patron_loans'], (to_epoch(datetime.now()), patron_id)).fetchall()
     conn.close()
     
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
-    
-    return borrowed_books
+    return [
+        Loan(loan_id, book_id, title, author, from_epoch(borrow_ts), from_epoch(due_ts), bool(is_overdue),
+             branch_id=branch_id, item_type=item_type)
+        for loan_id, book_id, title, author, borrow_ts, due_ts, is_overdue, branch_id, item_type in records
+    ]
+
+def get_borrowed_books_for_patrons(patron_ids: List[str]) -> Dict[str, List[Loan]]:
+    """Get currently borrowed books for several patrons at once, keyed by patron ID."""
+    now_ts = to_epoch(datetime.now())
+    loans = {patron_id: [] for patron_id in patron_ids}
+    conn = get_read_connection()
+    # Stay well below SQLite's limit on bound parameters
+    for start in range(0, len(patron_ids), 500):
+        chunk = patron_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        records = conn.execute(f'''
+            SELECT br.patron_id, br.id, br.book_id, b.title, b.author, br.borrow_ts, br.due_ts,
+                   br.due_ts < ? AS is_overdue, br.branch_id, b.item_type
+            FROM borrow_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.patron_id IN ({placeholders}) AND br.return_date IS NULL
+            ORDER BY br.patron_id, br.borrow_ts
+        ''', (now_ts, *chunk)).fetchall()
+        for (patron_id, loan_id, book_id, title, author, borrow_ts, due_ts, is_overdue,
+             branch_id, item_type) in records:
+            loans[patron_id].append(Loan(loan_id, book_id, title, author, from_epoch(borrow_ts),
+                                         from_epoch(due_ts), bool(is_overdue),
+                                         branch_id=branch_id, item_type=item_type))
+    conn.close()
+    return loans
+
+def get_overdue_borrow_records(as_of: Optional[datetime] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Get open loans whose due date is before as_of (defaults to now), oldest due first."""
+    as_of_ts = to_epoch(as_of or datetime.now())
+    conn = get_read_connection()
+    records = conn.execute('''
+        SELECT br.id, br.patron_id, br.book_id, br.due_ts, (? - br.due_ts) / 86400 AS days_overdue
+        FROM borrow_records br
+        WHERE br.return_date IS NULL AND br.due_ts < ?
+        ORDER BY br.due_ts
+        LIMIT ?
+    ''', (as_of_ts, as_of_ts, -1 if limit is None else limit)).fetchall()
+    conn.close()
+    return [{
+        'id': record['id'],
+        'patron_id': record['patron_id'],
+        'book_id': record['book_id'],
+        'due_date': from_epoch(record['due_ts']),
+        'days_overdue': record['days_overdue']
+    } for record in records]
 
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
+    conn = get_read_connection()
+    count = conn.execute(STATEMENTS['patron_loan_count'], (patron_id,)).fetchone()['count']
     conn.close()
     return count
 
-def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
-    """Insert a new book into the database."""
-    conn = get_db_connection()
+def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int,
+                item_type: Optional[str] = None) -> bool:
+    """Insert a new book into the database; item_type selects its late fee rules."""
+    conn = _connection()
+    try:
+        cursor = conn.execute(STATEMENTS['insert_book'],
+                              (title, author, isbn, total_copies, available_copies, item_type))
+        _add_items(conn, cursor.lastrowid, total_copies, DEFAULT_BRANCH)
+        _log_book_change(conn, cursor.lastrowid, 'added')
+        _index_book_trigrams(conn, cursor.lastrowid, title, author)
+        conn.commit()
+        conn.close()
+        _notify_book_change()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def _insert_borrow_record(conn: sqlite3.Connection, patron_id: str, book_id: int,
+                          borrow_date: datetime, due_date: datetime,
+                          branch_id: Optional[str] = None, item_id: Optional[int] = None) -> int:
+    """
+    Insert a borrow record and update the patron summary (inside the caller's transaction).
+
+    The loan takes the given item, or else any copy of the book not on loan
+    (from branch_id if it has one). Books without items get a loan without one.
+
+    Raises:
+        ValueError: If the given item is already on loan
+    """
+    if item_id is not None and not conn.execute(STATEMENTS['check_out_item'], (item_id, book_id)).rowcount:
+        raise ValueError(f'Item {item_id} is not available')
+    cursor = conn.execute(STATEMENTS['insert_loan'], (
+        patron_id, book_id, borrow_date.isoformat(), due_date.isoformat(),
+        to_epoch(borrow_date), to_epoch(due_date), branch_id, item_id
+    ))
+    if item_id is None:
+        # Chosen after the insert, once this transaction holds the write
+        # lock, so concurrent borrows cannot choose the same copy
+        item = conn.execute(STATEMENTS['free_item'], (book_id, branch_id or DEFAULT_BRANCH)).fetchone()
+        if item:
+            conn.execute(STATEMENTS['check_out_item'], (item['id'], book_id))
+            conn.execute(STATEMENTS['set_loan_item'], (item['id'], cursor.lastrowid))
+    # A new loan is not overdue yet; it only bounds how long the
+    # patron's overdue figures stay valid
+    _adjust_patron_summary(conn, patron_id, 1, 0.0, to_epoch(borrow_date), to_epoch(due_date))
+    return cursor.lastrowid
+
+def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                         branch_id: Optional[str] = None, item_id: Optional[int] = None) -> bool:
+    """
+    Insert a new borrow record into the database.
+
+    Args:
+        branch_id: Branch the copy came from
+        item_id: Copy being lent (e.g. from a barcode scan); fails if it is on loan
+    """
+    conn = _connection()
+    try:
+        _insert_borrow_record(conn, patron_id, book_id, borrow_date, due_date, branch_id, item_id)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+# Write-behind availability counters (see availability_counters). While
+# set, update_book_availability() changes the catalog-wide copy counts in
+# memory and the counters flush them to books in batches.
+AVAILABILITY_COUNTERS = None
+
+def update_book_availability(book_id: int, change: int, branch_id: Optional[str] = None) -> bool:
+    """
+    Update the available copies of a book by a given amount (+1 for return, -1 for borrow).
+
+    With branch_id the change is made at that branch, and fails if the
+    branch does not have the copies (or the room) for it. Without one it
+    goes to a branch in the main database that does, preferring
+    DEFAULT_BRANCH, and fails if none does. The catalog-wide count changes
+    in the same transaction, or through AVAILABILITY_COUNTERS when they are
+    enabled; a borrow fails if that count has no copy left either way.
+    """
+    counters = AVAILABILITY_COUNTERS
+    if counters is None:
+        return _update_book_availability(book_id, change, branch_id, rollup=True)
+    if branch_id is None:
+        return counters.adjust(book_id, change)
+    # Take the copy from the catalog-wide count before the branch's, and
+    # give it back there after, so the counters never promise a copy twice
+    if change < 0 and not counters.adjust(book_id, change, at_default_branch=False):
+        return False
+    if not _update_book_availability(book_id, change, branch_id, rollup=False):
+        if change < 0:
+            counters.adjust(book_id, -change, at_default_branch=False)
+        return False
+    return change < 0 or counters.adjust(book_id, change, at_default_branch=False)
+
+def _update_book_availability(book_id: int, change: int, branch_id: Optional[str], rollup: bool) -> bool:
+    conn = _connection()
+    try:
+        table = 'main.branch_inventory' if branch_id is None else _inventory_table(conn, branch_id)
+        if table is None or not _adjust_branch_inventory(conn, table, book_id, change, branch_id):
+            # No branch has the copy (or the room) for it, so the
+            # catalog-wide count is left alone as well
+            conn.close()
+            return False
+        if rollup:
+            # Refused if it would take a copy the book does not have; closing
+            # the connection undoes the branch change as well
+            if not conn.execute(STATEMENTS['update_availability'], (change, book_id, change)).rowcount:
+                conn.close()
+                return False
+            _log_book_change(conn, book_id, 'availability')
+        conn.commit()
+        conn.close()
+        if rollup:
+            _notify_book_change()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def _close_loan(conn: sqlite3.Connection, loan, return_date: datetime) -> None:
+    """Record a loan's return and put its item back (inside the caller's transaction)."""
+    # Materialized fees only describe open loans
+    conn.execute(STATEMENTS['delete_loan_fees'], (loan['id'],))
+    conn.execute(STATEMENTS['close_loan'], (return_date.isoformat(), to_epoch(return_date), loan['id']))
+    if loan['item_id'] is not None:
+        conn.execute(STATEMENTS['check_in_item'], (loan['item_id'],))
+
+def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime,
+                                     loan_id: Optional[int] = None) -> bool:
+    """
+    Update the return date for a borrow record.
+
+    Closes the given open loan, or the patron's oldest open loan of the
+    book when loan_id is None.
+    """
+    conn = _connection()
+    try:
+        loan = _find_open_loan(conn, patron_id, book_id, loan_id)
+        if loan:
+            _close_loan(conn, loan, return_date)
+            # The returned loan may have been overdue, so mark the patron's
+            # overdue figures stale
+            _adjust_patron_summary(conn, patron_id, -1, 0.0, to_epoch(return_date), 0)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def _find_open_loan(conn: sqlite3.Connection, patron_id: str, book_id: int,
+                    loan_id: Optional[int] = None) -> Optional[sqlite3.Row]:
+    if loan_id is None:
+        return conn.execute(STATEMENTS['oldest_open_loan'], (patron_id, book_id)).fetchone()
+    return conn.execute(STATEMENTS['open_loan'], (loan_id, patron_id, book_id)).fetchone()
+
+def return_loan(patron_id: str, book_id: int, return_date: datetime, loan_id: Optional[int] = None,
+                branch_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    Close a loan and hand its copy on, in one transaction.
+
+    The copy goes to the next waiting hold on the book, or else back on the
+    shelf: at branch_id if that branch stocks the book and has room for it,
+    otherwise at the branch the loan came from, otherwise at a branch of the
+    main database. If no branch can take it nothing is changed, so a copy
+    is never closed out of its loan without being counted somewhere.
+
+    Returns:
+        dict: 'due_date' of the loan and 'hold_id' (None if the copy was
+              shelved); None if there is no such open loan or it failed
+    """
+    counters = AVAILABILITY_COUNTERS
+    conn = _connection()
+    try:
+        loan = _find_open_loan(conn, patron_id, book_id, loan_id)
+        if not loan:
+            conn.close()
+            return None
+        # Resolved (and their shards attached) before the write transaction
+        targets = []
+        for target in dict.fromkeys((branch_id, loan['branch_id'])):
+            table = _inventory_table(conn, target) if target is not None else None
+            if table is not None:
+                targets.append((target, table))
+        targets.append((None, 'main.branch_inventory'))
+
+        conn.execute('BEGIN IMMEDIATE')
+        loan = _find_open_loan(conn, patron_id, book_id, loan['id'])
+        if not loan:
+            conn.close()
+            return None
+        _close_loan(conn, loan, return_date)
+        # The returned loan may have been overdue, so mark the patron's
+        # overdue figures stale
+        _adjust_patron_summary(conn, patron_id, -1, 0.0, to_epoch(return_date), 0)
+        hold_id = _assign_next_hold(conn, book_id, return_date)
+        if hold_id is None:
+            shelved = any(_adjust_branch_inventory(conn, table, book_id, +1, target) for target, table in targets)
+            if shelved and counters is None:
+                shelved = conn.execute(STATEMENTS['update_availability'], (+1, book_id, +1)).rowcount == 1
+                _log_book_change(conn, book_id, 'availability')
+            if not shelved:
+                # Closing the connection undoes the loan's return as well
+                conn.close()
+                return None
+        conn.commit()
+        conn.close()
+        if hold_id is None:
+            if counters is not None:
+                counters.adjust(book_id, +1, at_default_branch=False)
+            else:
+                _notify_book_change()
+        return {'due_date': from_epoch(loan['due_ts']), 'hold_id': hold_id}
+    except Exception as e:
+        conn.close()
+        return None
+
+# Hold queue operations
+
+def _hold_from_row(row) -> Hold:
+    hold_id, book_id, patron_id, status, created_ts, ready_ts, title, position = row
+    return Hold(hold_id, book_id, patron_id, status, from_epoch(created_ts),
+                from_epoch(ready_ts) if ready_ts is not None else None, title, position)
+
+def insert_hold(patron_id: str, book_id: int, placed_date: datetime) -> Optional[int]:
+    """Add a patron to the end of a book's hold queue. Returns the new hold ID."""
+    conn = _connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO holds (book_id, patron_id, status, created_ts)
+            VALUES (?, ?, 'waiting', ?)
+        ''', (book_id, patron_id, to_epoch(placed_date)))
+        conn.commit()
+        conn.close()
+        return cursor.lastrowid
+    except Exception as e:
+        conn.close()
+        return None
+
+def get_hold_by_id(hold_id: int) -> Optional[Hold]:
+    """Get a specific hold by ID."""
+    conn = _connection()
+    row = conn.execute(_HOLD_SELECT + 'WHERE h.id = ?', (hold_id,)).fetchone()
+    conn.close()
+    return _hold_from_row(row) if row else None
+
+def get_patron_holds(patron_id: str) -> List[Hold]:
+    """Get a patron's active (waiting or ready) holds, oldest first."""
+    conn = _connection()
+    rows = conn.execute(_HOLD_SELECT + '''
+        WHERE h.patron_id = ? AND h.status IN ('waiting', 'ready')
+        ORDER BY h.id
+    ''', (patron_id,)).fetchall()
+    conn.close()
+    return [_hold_from_row(row) for row in rows]
+
+def get_ready_hold(patron_id: str, book_id: int) -> Optional[Hold]:
+    """Get the patron's ready hold on a book, if a copy is waiting for them."""
+    conn = _connection()
+    row = conn.execute(STATEMENTS['ready_hold'], (patron_id, book_id)).fetchone()
+    conn.close()
+    return _hold_from_row(row) if row else None
+
+def get_expired_ready_holds(ready_before: datetime) -> List[Hold]:
+    """Get ready holds that were set aside before the given time."""
+    conn = _connection()
+    rows = conn.execute(_HOLD_SELECT + '''
+        WHERE h.status = 'ready' AND h.ready_ts < ?
+        ORDER BY h.ready_ts
+    ''', (to_epoch(ready_before),)).fetchall()
+    conn.close()
+    return [_hold_from_row(row) for row in rows]
+
+def update_hold_status(hold_id: int, status: str) -> bool:
+    """Set the status of a hold (fulfilled, cancelled, expired)."""
+    conn = _connection()
+    try:
+        conn.execute(STATEMENTS['set_hold_status'], (status, hold_id))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def assign_next_hold(book_id: int, ready_date: datetime) -> Optional[int]:
+    """
+    Mark the first waiting hold on a book as ready for pickup.
+
+    The head of the queue is found and updated in a single write
+    transaction, so two concurrent returns never hand out the same hold.
+    Returns the assigned hold ID, or None if nobody is waiting.
+    """
+    conn = _connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        hold_id = _assign_next_hold(conn, book_id, ready_date)
+        conn.commit()
+        conn.close()
+        return hold_id
+    except Exception as e:
+        conn.close()
+        return None
+
+def _assign_next_hold(conn: sqlite3.Connection, book_id: int, ready_date: datetime) -> Optional[int]:
+    """Mark the head of a book's hold queue ready (inside the caller's transaction)."""
+    row = conn.execute(STATEMENTS['next_waiting_hold'], (book_id,)).fetchone()
+    if not row:
+        return None
+    conn.execute(STATEMENTS['mark_hold_ready'], (to_epoch(ready_date), row['id']))
+    return row['id']
+
+# Book change feed
+
+# Days of change log entries kept for feed clients; older ones are pruned
+# daily and clients further behind resync
+BOOK_CHANGE_RETENTION_DAYS = 7
+
+# Wakes long-poll waiters in this process after a change is committed.
+# Writers in other processes are picked up by the waiters' poll interval.
+_book_change_condition = threading.Condition()
+
+def _log_book_change(conn: sqlite3.Connection, book_id: int, change_type: str) -> None:
+    """Append a book's current counts to the change log (inside the caller's transaction)."""
+    conn.execute(STATEMENTS['log_book_change'], (change_type, to_epoch(datetime.now()), book_id))
+
+def _notify_book_change() -> None:
+    with _book_change_condition:
+        _book_change_condition.notify_all()
+
+def get_latest_book_change_seq() -> int:
+    """Get the sequence number of the most recent book change (0 if none)."""
+    conn = _connection()
+    seq = conn.execute(STATEMENTS['latest_change_seq']).fetchone()['seq']
+    conn.close()
+    return seq or 0
+
+def get_oldest_book_change_seq() -> int:
+    """Get the sequence number of the oldest retained book change (0 if none)."""
+    conn = _connection()
+    seq = conn.execute(STATEMENTS['oldest_change_seq']).fetchone()['seq']
+    conn.close()
+    return seq or 0
+
+def get_book_changes_since(since: int, limit: int = 500) -> List[BookChange]:
+    """Get book changes with a sequence number greater than since, in order."""
+    conn = _connection()
+    rows = conn.execute(STATEMENTS['changes_since'], (since, limit)).fetchall()
+    conn.close()
+    return [
+        BookChange(seq, book_id, change_type, available, total, from_epoch(changed_ts))
+        for seq, book_id, change_type, available, total, changed_ts in rows
+    ]
+
+def wait_for_book_changes(since: int, timeout: float, limit: int = 500,
+                          poll_interval: float = 1.0) -> List[BookChange]:
+    """
+    Long-poll for book changes after since.
+
+    Returns as soon as there is at least one change, or an empty list once
+    timeout seconds have passed. Commits in this process wake waiters
+    immediately; poll_interval bounds the delay for other processes.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        changes = get_book_changes_since(since, limit)
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes
+        with _book_change_condition:
+            _book_change_condition.wait(min(poll_interval, remaining))
+
+def prune_book_changes(keep_after: Optional[datetime] = None) -> int:
+    """
+    Delete change log entries older than keep_after (defaults to
+    BOOK_CHANGE_RETENTION_DAYS ago). Returns the number removed.
+    """
+    keep_after = keep_after or datetime.now() - timedelta(days=BOOK_CHANGE_RETENTION_DAYS)
+    conn = _connection()
+    try:
+        cursor = conn.execute('DELETE FROM book_changes WHERE changed_ts < ?', (to_epoch(keep_after),))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount
+    except Exception as e:
+        conn.close()
+        return 0
+
+# Background job coordination
+
+def acquire_lock(name: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    Acquire or renew a time-limited lease.
+
+    Succeeds if the lease is free, expired, or already held by owner.
+    The check and update happen in one write transaction, so at most one
+    owner holds a lease at any time.
+    """
+    now_ts = to_epoch(datetime.now())
+    conn = _connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT owner, expires_ts FROM job_locks WHERE name = ?', (name,)).fetchone()
+        acquired = row is None or row['owner'] == owner or row['expires_ts'] <= now_ts
+        if acquired:
+            conn.execute('''
+                INSERT OR REPLACE INTO job_locks (name, owner, expires_ts) VALUES (?, ?, ?)
+            ''', (name, owner, now_ts + ttl_seconds))
+        conn.commit()
+        conn.close()
+        return acquired
+    except Exception as e:
+        conn.close()
+        return False
+
+def release_lock(name: str, owner: str) -> bool:
+    """Release a lease held by owner."""
+    conn = _connection()
+    try:
+        conn.execute('DELETE FROM job_locks WHERE name = ? AND owner = ?', (name, owner))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def get_job_last_run(name: str) -> Optional[datetime]:
+    """Get when a scheduled job last ran, if ever."""
+    conn = _connection()
+    row = conn.execute('SELECT last_run_ts FROM job_runs WHERE name = ?', (name,)).fetchone()
+    conn.close()
+    return from_epoch(row['last_run_ts']) if row else None
+
+def record_job_run(name: str, run_date: datetime, status: str, duration_ms: int) -> bool:
+    """Record the outcome of a scheduled job run."""
+    conn = _connection()
     try:
         conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
+            INSERT OR REPLACE INTO job_runs (name, last_run_ts, last_status, last_duration_ms)
+            VALUES (?, ?, ?, ?)
+        ''', (name, to_epoch(run_date), status, duration_ms))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+# Materialized loan fees
+
+def get_open_loans_batch(after_id: int, limit: int) -> List[Dict]:
+    """Get up to limit open loans with an ID greater than after_id, in ID order."""
+    conn = _connection()
+    rows = conn.execute('''
+        SELECT br.id, br.patron_id, br.book_id, br.due_ts, br.branch_id, b.item_type
+        FROM borrow_records br
+        JOIN books b ON br.book_id = b.id
+        WHERE br.return_date IS NULL AND br.id > ?
+        ORDER BY br.id LIMIT ?
+    ''', (after_id, limit)).fetchall()
+    conn.close()
+    return [{
+        'id': row['id'],
+        'patron_id': row['patron_id'],
+        'book_id': row['book_id'],
+        'due_date': from_epoch(row['due_ts']),
+        'branch_id': row['branch_id'],
+        'item_type': row['item_type']
+    } for row in rows]
+
+def save_loan_fees(rows: List[Tuple], computed_date: datetime) -> bool:
+    """
+    Store a batch of materialized loan fees in one transaction.
+
+    Each row is (loan_id, patron_id, book_id, is_overdue, days_overdue,
+    fee_amount, valid_until).
+    """
+    computed_ts = to_epoch(computed_date)
+    conn = _connection()
+    try:
+        conn.executemany('''
+            INSERT OR REPLACE INTO loan_fees
+                (loan_id, patron_id, book_id, is_overdue, days_overdue, fee_amount,
+                 computed_ts, valid_until_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (loan_id, patron_id, book_id, int(is_overdue), days, fee, computed_ts, to_epoch(valid_until))
+            for loan_id, patron_id, book_id, is_overdue, days, fee, valid_until in rows
+        ])
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def delete_stale_loan_fees(computed_before: datetime) -> int:
+    """Delete materialized fees not refreshed since computed_before (e.g. for returned loans)."""
+    conn = _connection()
+    try:
+        cursor = conn.execute('DELETE FROM loan_fees WHERE computed_ts < ?', (to_epoch(computed_before),))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount
+    except Exception as e:
+        conn.close()
+        return 0
+
+def get_setting(name: str) -> Optional[str]:
+    """Get a setting shared by every process, or None if it is not set."""
+    conn = _connection()
+    row = conn.execute('SELECT value FROM settings WHERE name = ?', (name,)).fetchone()
+    conn.close()
+    return row['value'] if row else None
+
+def _set_setting(conn: sqlite3.Connection, name: str, value: str) -> None:
+    """Set a shared setting inside the caller's transaction."""
+    conn.execute('''
+        INSERT INTO settings (name, value) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET value = excluded.value
+    ''', (name, value))
+
+def record_fee_policy(fingerprint: str) -> bool:
+    """
+    Record the fee policy in use. If the stored policy differs, every
+    materialized fee is dropped and every patron summary marked stale in
+    the same transaction. Summaries are bumped to a new version so
+    recomputes started under the old policy are not stored.
+    """
+    conn = _connection()
+    try:
+        if get_setting('fee_policy') == fingerprint:
+            conn.close()
+            return True
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT value FROM settings WHERE name = ?', ('fee_policy',)).fetchone()
+        if row is None or row['value'] != fingerprint:
+            conn.execute('DELETE FROM loan_fees')
+            conn.execute('UPDATE patron_summary SET valid_until_ts = 0, version = version + 1')
+            _set_setting(conn, 'fee_policy', fingerprint)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def get_materialized_late_fee(patron_id: str, book_id: int, as_of: datetime) -> Optional[Dict]:
+    """Get a patron's materialized fee for a book if it is still valid as of the given time."""
+    conn = get_read_connection()
+    row = conn.execute(STATEMENTS['materialized_fee'], (patron_id, book_id)).fetchone()
+    conn.close()
+    if not row or row['valid_until_ts'] <= to_epoch(as_of):
+        return None
+    return {
+        'is_overdue': bool(row['is_overdue']),
+        'days_overdue': row['days_overdue'],
+        'fee_amount': row['fee_amount']
+    }
+
+# Patron summary
+
+def _adjust_patron_summary(conn: sqlite3.Connection, patron_id: str, open_loans_delta: int,
+                           fees_paid_delta: float, activity_ts: int,
+                           valid_until_ts: Optional[int]) -> None:
+    """
+    Apply an incremental change to a patron's summary (inside the caller's transaction).
+
+    valid_until_ts lowers the row's validity bound (0 marks it stale);
+    None leaves it unchanged. New rows start stale so their first read
+    computes the overdue figures.
+    """
+    conn.execute(STATEMENTS['adjust_patron_summary'], (patron_id, open_loans_delta, fees_paid_delta, activity_ts,
+          open_loans_delta, fees_paid_delta, activity_ts,
+          valid_until_ts, valid_until_ts, valid_until_ts))
+
+def record_patron_payment(patron_id: str, amount: float, paid_date: datetime) -> bool:
+    """Add a late fee payment to a patron's summary."""
+    conn = _connection()
+    try:
+        _adjust_patron_summary(conn, patron_id, 0, amount, to_epoch(paid_date), None)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def get_patron_summary(patron_id: str) -> Optional[Dict]:
+    """Get a patron's materialized summary row."""
+    conn = _connection()
+    row = conn.execute(STATEMENTS['patron_summary'], (patron_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {
+        'patron_id': row['patron_id'],
+        'open_loans': row['open_loans'],
+        'overdue_count': row['overdue_count'],
+        'accrued_fees': row['accrued_fees'],
+        'fees_paid': row['fees_paid'],
+        'last_activity': from_epoch(row['last_activity_ts']) if row['last_activity_ts'] is not None else None,
+        'refreshed_at': from_epoch(row['refreshed_ts']) if row['refreshed_ts'] is not None else None,
+        'valid_until': from_epoch(row['valid_until_ts']) if row['valid_until_ts'] is not None else None,
+        'version': row['version']
+    }
+
+def save_patron_summary(patron_id: str, open_loans: int, overdue_count: int, accrued_fees: float,
+                        valid_until: Optional[datetime], refreshed_date: datetime,
+                        expected_version: int) -> bool:
+    """
+    Store recomputed figures for a patron.
+
+    Only applied if the row is still at expected_version (or does not
+    exist), so a recompute never overwrites a newer incremental change.
+    Returns False if the row changed in the meantime.
+    """
+    conn = _connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO patron_summary
+                (patron_id, open_loans, overdue_count, accrued_fees, refreshed_ts, valid_until_ts)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (patron_id) DO UPDATE SET
+                open_loans = excluded.open_loans,
+                overdue_count = excluded.overdue_count,
+                accrued_fees = excluded.accrued_fees,
+                refreshed_ts = excluded.refreshed_ts,
+                valid_until_ts = excluded.valid_until_ts,
+                version = version + 1
+            WHERE patron_summary.version = ?
+        ''', (patron_id, open_loans, overdue_count, accrued_fees, to_epoch(refreshed_date),
+              to_epoch(valid_until) if valid_until is not None else None, expected_version))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+    except Exception as e:
+        conn.close()
+        return False
+
+def get_stale_patron_ids(valid_before: datetime, after_patron_id: str, limit: int) -> List[str]:
+    """Get patrons whose summary expires before valid_before, in patron ID order."""
+    conn = _connection()
+    rows = conn.execute('''
+        SELECT patron_id FROM patron_summary
+        WHERE valid_until_ts < ? AND patron_id > ?
+        ORDER BY patron_id LIMIT ?
+    ''', (to_epoch(valid_before), after_patron_id, limit)).fetchall()
+    conn.close()
+    return [row['patron_id'] for row in rows]
+
+def get_patron_ids_batch(after_patron_id: str, limit: int) -> List[str]:
+    """Get patron IDs that have loans or a summary row, in patron ID order."""
+    conn = _connection()
+    rows = conn.execute('''
+        SELECT patron_id FROM (
+            SELECT patron_id FROM borrow_records WHERE patron_id > ?
+            UNION
+            SELECT patron_id FROM patron_summary WHERE patron_id > ?
+        )
+        ORDER BY patron_id LIMIT ?
+    ''', (after_patron_id, after_patron_id, limit)).fetchall()
+    conn.close()
+    return [row['patron_id'] for row in rows]
+
+# Batch checkout
+
+def borrow_books_batch(patron_id: str, book_ids: List[int], borrow_date: datetime,
+                       due_date: datetime, max_loans: int) -> Optional[List[Tuple[int, str]]]:
+    """
+    Borrow several books for one patron in a single transaction.
+
+    Each book is checked and loaned in order. A copy set aside for the
+    patron's ready hold is used first; otherwise a shelf copy is taken only
+    if one is available. Books beyond max_loans open loans are refused.
+
+    Returns:
+        List of (book_id, outcome) with outcome one of 'borrowed', 'not_found',
+        'not_available' or 'limit_reached'; None if the transaction failed.
+    """
+    # Copies taken from the write-behind counters, given back if this fails
+    counters = AVAILABILITY_COUNTERS
+    reserved = []
+    conn = _connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        open_loans = conn.execute(STATEMENTS['patron_loan_count'], (patron_id,)).fetchone()['count']
+
+        results = []
+        changed_books = False
+        for book_id in book_ids:
+            if not conn.execute(STATEMENTS['book_exists'], (book_id,)).fetchone():
+                results.append((book_id, 'not_found'))
+                continue
+            if open_loans >= max_loans:
+                results.append((book_id, 'limit_reached'))
+                continue
+
+            hold = conn.execute(STATEMENTS['ready_hold_id'], (patron_id, book_id)).fetchone()
+            if hold:
+                conn.execute(STATEMENTS['set_hold_status'], ('fulfilled', hold['id']))
+            elif counters is not None:
+                if not counters.adjust(book_id, -1):
+                    results.append((book_id, 'not_available'))
+                    continue
+                reserved.append(book_id)
+            else:
+                taken = conn.execute(STATEMENTS['update_availability'], (-1, book_id, -1)).rowcount
+                if not taken:
+                    results.append((book_id, 'not_available'))
+                    continue
+                _adjust_branch_inventory(conn, 'main.branch_inventory', book_id, -1)
+                _log_book_change(conn, book_id, 'availability')
+                changed_books = True
+
+            _insert_borrow_record(conn, patron_id, book_id, borrow_date, due_date)
+            open_loans += 1
+            results.append((book_id, 'borrowed'))
+
+        conn.commit()
+        conn.close()
+        if changed_books:
+            _notify_book_change()
+        return results
+    except Exception as e:
+        conn.close()
+        for book_id in reserved:
+            counters.adjust(book_id, +1)
+        return None
+
+def return_books_batch(patron_id: str, book_ids: List[int],
+                       return_date: datetime) -> Optional[List[Tuple[int, str, Optional[datetime]]]]:
+    """
+    Return several books for one patron in a single transaction.
+
+    Each entry closes one open loan of that book (the oldest first), and the
+    copy goes to the next waiting hold or back on the shelf.
+
+    Returns:
+        List of (book_id, outcome, due_date) with outcome 'returned' or
+        'not_borrowed'; None if the transaction failed.
+    """
+    return_ts = to_epoch(return_date)
+    conn = _connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        results = []
+        returned = 0
+        changed_books = False
+        # With write-behind counters, shelved copies are counted once the
+        # returns are committed
+        counters = AVAILABILITY_COUNTERS
+        shelved = []
+        for book_id in book_ids:
+            loan = conn.execute(STATEMENTS['oldest_open_loan'], (patron_id, book_id)).fetchone()
+            if not loan:
+                results.append((book_id, 'not_borrowed', None))
+                continue
+
+            _close_loan(conn, loan, return_date)
+            if _assign_next_hold(conn, book_id, return_date) is None:
+                if counters is not None:
+                    shelved.append(book_id)
+                else:
+                    conn.execute(STATEMENTS['update_availability'], (+1, book_id, +1))
+                    _adjust_branch_inventory(conn, 'main.branch_inventory', book_id, +1)
+                    _log_book_change(conn, book_id, 'availability')
+                    changed_books = True
+            returned += 1
+            results.append((book_id, 'returned', from_epoch(loan['due_ts'])))
+
+        if returned:
+            _adjust_patron_summary(conn, patron_id, -returned, 0.0, return_ts, 0)
+        conn.commit()
+        conn.close()
+        for book_id in shelved:
+            counters.adjust(book_id, +1)
+        if changed_books:
+            _notify_book_change()
+        return results
+    except Exception as e:
+        conn.close()
+        return None
+
+# Branches and per-branch inventory. branch_inventory holds each book's
+# copies per branch; books.total_copies/available_copies stay the
+# catalog-wide totals and change in the same transaction. A branch with a
+# shard keeps its inventory in that SQLite file (next to DATABASE), attached
+# to the connection when first needed; SQLite commits a transaction that
+# spans attached files atomically.
+DEFAULT_BRANCH = 'main'
+
+_INVENTORY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {schema}.branch_inventory (
+        book_id INTEGER NOT NULL,
+        branch_id TEXT NOT NULL,
+        total_copies INTEGER NOT NULL,
+        available_copies INTEGER NOT NULL,
+        PRIMARY KEY (book_id, branch_id)
+    ) WITHOUT ROWID
+'''
+
+def _shard_schema(shard: str) -> str:
+    return 'shard_' + re.sub(r'\W', '_', shard)
+
+def _shard_attached(conn: sqlite3.Connection, shard: str) -> bool:
+    return _shard_schema(shard) in {row[1] for row in conn.execute('PRAGMA database_list')}
+
+def _attach_shard(conn: sqlite3.Connection, shard: str) -> str:
+    """Attach a branch shard to conn unless it already is. Returns its schema name."""
+    schema = _shard_schema(shard)
+    if not _shard_attached(conn, shard):
+        path = os.path.join(os.path.dirname(os.path.abspath(DATABASE)), shard)
+        conn.execute(f'ATTACH DATABASE ? AS {schema}', (path,))
+        conn.execute(_INVENTORY_TABLE.format(schema=schema))
+    return schema
+
+def _branch_shard(conn: sqlite3.Connection, branch_id: str) -> Optional[str]:
+    """Get a branch's shard file, '' if it is kept in the main database, or None if unknown."""
+    row = conn.execute(STATEMENTS['branch_shard'], (branch_id,)).fetchone()
+    return None if row is None else (row['shard'] or '')
+
+def _inventory_table(conn: sqlite3.Connection, branch_id: str) -> Optional[str]:
+    """
+    Get the qualified inventory table of a branch, attaching its shard.
+
+    Returns None if the branch is unknown, or if its shard is not attached
+    and cannot be because conn is inside a transaction (a request's unit of
+    work attaches every shard before it begins; see _attach_all_shards).
+    """
+    shard = _branch_shard(conn, branch_id)
+    if shard is None:
+        return None
+    if not shard:
+        return 'main.branch_inventory'
+    if conn.in_transaction and not _shard_attached(conn, shard):
+        return None
+    return f'{_attach_shard(conn, shard)}.branch_inventory'
+
+def _attach_all_shards(conn: sqlite3.Connection) -> None:
+    """Attach every branch shard to conn, which must not be inside a transaction."""
+    try:
+        shards = [row[0] for row in conn.execute(STATEMENTS['branch_shards'])]
+    except sqlite3.OperationalError:
+        # Not migrated yet; there are no shards
+        return
+    for shard in shards:
+        _attach_shard(conn, shard)
+
+def _adjust_branch_inventory(conn: sqlite3.Connection, table: str, book_id: int, change: int,
+                             branch_id: Optional[str] = None) -> bool:
+    """
+    Change a book's available copies at a branch (inside the caller's transaction).
+
+    Without branch_id the first branch in table that can take the change
+    is used, DEFAULT_BRANCH first. Returns False if no branch could.
+    """
+    if branch_id is not None:
+        cursor = conn.execute(_inventory_sql('adjust_branch_copies', table),
+                              (change, book_id, branch_id, change))
+    else:
+        cursor = conn.execute(_inventory_sql('adjust_any_branch_copies', table),
+                              (change, book_id, book_id, change, DEFAULT_BRANCH))
+    return cursor.rowcount == 1
+
+def add_branch(branch_id: str, name: str, shard: Optional[str] = None) -> bool:
+    """
+    Add a branch.
+
+    Args:
+        shard: File name (relative to the database's directory) to keep the
+            branch's inventory in; None keeps it in the main database
+    """
+    conn = _connection()
+    try:
+        # Creates the shard's table now if possible; otherwise on first use
+        if shard and not conn.in_transaction:
+            _attach_shard(conn, shard)
+        conn.execute('INSERT INTO branches (id, name, shard) VALUES (?, ?, ?)', (branch_id, name, shard))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def get_branches() -> List[Dict]:
+    """Get all branches ordered by ID."""
+    conn = _connection()
+    rows = conn.execute(STATEMENTS['all_branches']).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def add_branch_copies(book_id: int, branch_id: str, copies: int) -> bool:
+    """Add new copies of a book at a branch, increasing the book's totals as well."""
+    conn = _connection()
+    try:
+        table = _inventory_table(conn, branch_id)
+        if table is None or copies <= 0:
+            conn.close()
+            return False
+        conn.execute('BEGIN IMMEDIATE')
+        updated = conn.execute('''
+            UPDATE books SET total_copies = total_copies + ?, available_copies = available_copies + ?
+            WHERE id = ?
+        ''', (copies, copies, book_id)).rowcount
+        if not updated:
+            conn.rollback()
+            conn.close()
+            return False
+        conn.execute(f'''
+            INSERT INTO {table} (book_id, branch_id, total_copies, available_copies) VALUES (?, ?, ?, ?)
+            ON CONFLICT (book_id, branch_id) DO UPDATE SET
+                total_copies = total_copies + excluded.total_copies,
+                available_copies = available_copies + excluded.available_copies
+        ''', (book_id, branch_id, copies, copies))
+        _add_items(conn, book_id, copies, branch_id)
+        _log_book_change(conn, book_id, 'availability')
         conn.commit()
         conn.close()
+        _notify_book_change()
         return True
     except Exception as e:
         conn.close()
         return False
 
-def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
-    """Insert a new borrow record into the database."""
+def get_book_availability(book_id: int) -> Optional[Dict]:
+    """
+    Get a book's copies per branch along with its catalog-wide totals.
+
+    Each inventory (main database and every shard) is read with a range
+    scan of its (book_id, branch_id) primary key.
+    """
+    conn = get_db_connection()
+    book = conn.execute(STATEMENTS['book_copies'], (book_id,)).fetchone()
+    if not book:
+        conn.close()
+        return None
+    shards = [row['shard'] for row in conn.execute(STATEMENTS['branch_shards'])]
+    tables = ['main.branch_inventory'] + [f'{_attach_shard(conn, shard)}.branch_inventory' for shard in shards]
+    branches = []
+    for table in tables:
+        branches.extend(dict(row) for row in conn.execute(_inventory_sql('branch_copies', table), (book_id,)))
+    conn.close()
+    branches.sort(key=lambda branch: branch['branch_id'])
+    return {
+        'book_id': book_id,
+        'total_copies': book['total_copies'],
+        'available_copies': book['available_copies'],
+        'branches': branches
+    }
+
+# Items: one row per physical copy, found by its barcode
+
+def _add_items(conn: sqlite3.Connection, book_id: int, copies: int, branch_id: str) -> List[int]:
+    """
+    Add new copies of a book as items (inside the caller's transaction).
+
+    Barcodes continue the book's numbering, ``<book>-<n>``, as assigned
+    by migration 0013.
+
+    Returns:
+        List[int]: IDs of the new items
+    """
+    start = conn.execute('SELECT COUNT(*) FROM items WHERE book_id = ?', (book_id,)).fetchone()[0]
+    return [
+        conn.execute('INSERT INTO items (book_id, barcode, branch_id) VALUES (?, ?, ?)',
+                     (book_id, f'{book_id:07d}-{n:04d}', branch_id)).lastrowid
+        for n in range(start + 1, start + copies + 1)
+    ]
+
+def get_item_by_barcode(barcode: str) -> Optional[Dict]:
+    """
+    Get a copy by its barcode, with its book's title and open loan (if any).
+
+    One lookup of the unique barcode index, plus one of the open-loan index.
+    """
+    conn = _connection()
+    row = conn.execute(STATEMENTS['item_by_barcode'], (barcode,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+# Write-behind availability flushes
+
+def apply_availability_deltas(deltas: Dict[int, Tuple[int, int]], checkpoints: Dict[str, int],
+                              commit_guard: Optional[ContextManager] = None) -> bool:
+    """
+    Apply aggregated copy count changes from the availability counters in one transaction.
+
+    Args:
+        deltas: book_id -> (change, part of the change not made at a branch);
+            that part goes to the main database's branches like an
+            unbranched update_book_availability() would
+        checkpoints: Intent log name -> last sequence number included
+        commit_guard: Held while committing, so the counters can swap their
+            in-flight changes for the committed ones without readers seeing both
+
+    Returns:
+        bool: True if the changes were committed
+    """
     conn = get_db_connection()
     try:
+        conn.execute('BEGIN IMMEDIATE')
+        for book_id, (change, unbranched) in deltas.items():
+            if not change and not unbranched:
+                continue
+            if not conn.execute(STATEMENTS['update_availability'], (change, book_id, change)).rowcount:
+                # The counters never hand out a copy the book does not have,
+                # so only a vanished book may be skipped
+                if conn.execute(STATEMENTS['book_by_id'], (book_id,)).fetchone():
+                    raise ValueError(f'Flush would leave book {book_id} with negative availability')
+                continue
+            if unbranched and not _adjust_branch_inventory(conn, 'main.branch_inventory', book_id, unbranched):
+                # No single branch can take the whole change; spread it a copy at a time
+                step = 1 if unbranched > 0 else -1
+                for _ in range(abs(unbranched)):
+                    _adjust_branch_inventory(conn, 'main.branch_inventory', book_id, step)
+            _log_book_change(conn, book_id, 'availability')
+        conn.executemany('''
+            INSERT INTO availability_log_checkpoints (log, seq) VALUES (?, ?)
+            ON CONFLICT (log) DO UPDATE SET seq = MAX(seq, excluded.seq)
+        ''', list(checkpoints.items()))
+        with commit_guard or nullcontext():
+            conn.commit()
+        conn.close()
+        if deltas:
+            _notify_book_change()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+def get_availability_checkpoints() -> Dict[str, int]:
+    """Get the last flushed sequence number of each availability intent log."""
+    conn = get_db_connection()
+    rows = conn.execute('SELECT log, seq FROM availability_log_checkpoints').fetchall()
+    conn.close()
+    return {row['log']: row['seq'] for row in rows}
+
+# Overdue notices
+
+def get_notice_patrons_batch(after_patron_id: str, due_before: datetime, limit: int) -> List[str]:
+    """Get patron IDs after after_patron_id with an open loan due before due_before, in order."""
+    conn = _connection()
+    rows = conn.execute('''
+        SELECT DISTINCT patron_id FROM borrow_records
+        WHERE return_date IS NULL AND patron_id > ? AND due_ts < ?
+        ORDER BY patron_id LIMIT ?
+    ''', (after_patron_id, to_epoch(due_before), limit)).fetchall()
+    conn.close()
+    return [row['patron_id'] for row in rows]
+
+def get_notice_loans(patron_ids: List[str], due_before: datetime) -> List[Dict]:
+    """Get the open loans of the given patrons due before due_before, by patron then due date."""
+    if not patron_ids:
+        return []
+    placeholders = ', '.join('?' * len(patron_ids))
+    conn = _connection()
+    rows = conn.execute(f'''
+        SELECT br.id, br.patron_id, br.book_id, b.title, b.author, br.due_ts, br.branch_id, b.item_type
+        FROM borrow_records br
+        JOIN books b ON br.book_id = b.id
+        WHERE br.patron_id IN ({placeholders}) AND br.return_date IS NULL AND br.due_ts < ?
+        ORDER BY br.patron_id, br.due_ts, br.id
+    ''', (*patron_ids, to_epoch(due_before))).fetchall()
+    conn.close()
+    return [{
+        'id': row['id'],
+        'patron_id': row['patron_id'],
+        'book_id': row['book_id'],
+        'title': row['title'],
+        'author': row['author'],
+        'due_date': from_epoch(row['due_ts']),
+        'branch_id': row['branch_id'],
+        'item_type': row['item_type']
+    } for row in rows]
+
+def get_notice_run(run_date: str) -> Optional[Dict]:
+    """Get the checkpoint of a notice run, or None if it has not started."""
+    conn = _connection()
+    row = conn.execute('''
+        SELECT run_date, last_patron_id, notices, completed_ts FROM notice_runs WHERE run_date = ?
+    ''', (run_date,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {
+        'run_date': row['run_date'],
+        'last_patron_id': row['last_patron_id'],
+        'notices': row['notices'],
+        'completed': from_epoch(row['completed_ts']) if row['completed_ts'] is not None else None
+    }
+
+def save_notice_batch(run_date: str, notices: List[Tuple[str, str, str]], last_patron_id: str,
+                      created: datetime, completed: bool = False) -> bool:
+    """
+    Queue a batch of rendered notices and advance the run's checkpoint.
+
+    Both happen in one transaction, so a restarted run neither loses nor
+    duplicates notices.
+
+    Args:
+        notices: (patron_id, subject, body) tuples
+        last_patron_id: Last patron covered by this batch
+        completed: Mark the run as finished
+    """
+    created_ts = to_epoch(created)
+    conn = _connection()
+    try:
+        cursor = conn.executemany('''
+            INSERT OR IGNORE INTO notice_outbox (run_date, patron_id, subject, body, created_ts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(run_date, patron_id, subject, body, created_ts) for patron_id, subject, body in notices])
         conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            INSERT INTO notice_runs (run_date, last_patron_id, notices, completed_ts)
             VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            ON CONFLICT (run_date) DO UPDATE SET
+                last_patron_id = excluded.last_patron_id,
+                notices = notices + excluded.notices,
+                completed_ts = excluded.completed_ts
+        ''', (run_date, last_patron_id, max(cursor.rowcount, 0), created_ts if completed else None))
         conn.commit()
         conn.close()
         return True
@@ -170,13 +1961,25 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
         conn.close()
         return False
 
-def update_book_availability(book_id: int, change: int) -> bool:
-    """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
+def get_pending_notices(after_id: int, limit: int, max_attempts: int) -> List[Dict]:
+    """Get up to limit unsent notices after after_id tried fewer than max_attempts times, oldest first."""
+    conn = _connection()
+    rows = conn.execute('''
+        SELECT id, run_date, patron_id, subject, body, attempts FROM notice_outbox
+        WHERE sent_ts IS NULL AND id > ? AND attempts < ?
+        ORDER BY id LIMIT ?
+    ''', (after_id, max_attempts, limit)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def mark_notice_sent(notice_id: int, sent_date: datetime) -> bool:
+    """Record that a notice was delivered."""
+    conn = _connection()
     try:
         conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
+            UPDATE notice_outbox SET sent_ts = ?, attempts = attempts + 1, last_error = NULL
+            WHERE id = ?
+        ''', (to_epoch(sent_date), notice_id))
         conn.commit()
         conn.close()
         return True
@@ -184,18 +1987,333 @@ def update_book_availability(book_id: int, change: int) -> bool:
         conn.close()
         return False
 
-def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
-    """Update the return date for a borrow record."""
-    conn = get_db_connection()
+def mark_notice_failed(notice_id: int, error: str) -> bool:
+    """Record a failed delivery attempt of a notice."""
+    conn = _connection()
     try:
         conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
+            UPDATE notice_outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?
+        ''', (error, notice_id))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        conn.close()
+        return False
+
+# Audit event log
+
+def insert_events(events: List[Tuple[str, Optional[str], Optional[int], Dict, datetime]],
+                  database: Optional[str] = None) -> bool:
+    """
+    Append a batch of audit events in one transaction.
+
+    Args:
+        events: (event_type, patron_id, book_id, details, created_date) tuples
+        database: Database path the events belong to (defaults to DATABASE)
+    """
+    conn = sqlite3.connect(database or DATABASE)
+    try:
+        conn.executemany('''
+            INSERT INTO events (event_type, patron_id, book_id, details, created_ts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (event_type, patron_id, book_id, json.dumps(details, default=str), to_epoch(created_date))
+            for event_type, patron_id, book_id, details, created_date in events
+        ])
         conn.commit()
         conn.close()
         return True
     except Exception as e:
         conn.close()
         return False
+
+def get_events(patron_id: Optional[str] = None, book_id: Optional[int] = None,
+               event_type: Optional[str] = None, after_id: int = 0,
+               limit: int = 100) -> List[Dict]:
+    """Get audit events matching the given filters, oldest first, after after_id."""
+    conditions = ['id > ?']
+    params = [after_id]
+    if patron_id is not None:
+        conditions.append('patron_id = ?')
+        params.append(patron_id)
+    if book_id is not None:
+        conditions.append('book_id = ?')
+        params.append(book_id)
+    if event_type is not None:
+        conditions.append('event_type = ?')
+        params.append(event_type)
+    params.append(limit)
+
+    conn = _connection()
+    rows = conn.execute(f'''
+        SELECT id, event_type, patron_id, book_id, details, created_ts
+        FROM events WHERE {' AND '.join(conditions)}
+        ORDER BY id LIMIT ?
+    ''', params).fetchall()
+    conn.close()
+    return [
+        {
+            'id': row['id'],
+            'event_type': row['event_type'],
+            'patron_id': row['patron_id'],
+            'book_id': row['book_id'],
+            'details': json.loads(row['details']),
+            'created_date': from_epoch(row['created_ts'])
+        }
+        for row in rows
+    ]
+
+# Trigram search index
+#
+# Titles and authors are split into padded word trigrams ("  f", " fi",
+# "fit", ...) stored in book_trigrams, with per-trigram document counts in
+# book_trigram_stats. A fuzzy query only probes its rarest trigrams: any
+# book reaching a similarity threshold must share at least that fraction of
+# the query's trigrams, so it necessarily contains one of the
+# len(query) - ceil(threshold * len(query)) + 1 rarest ones.
+
+TRIGRAM_FIELDS = ('title', 'author')
+# Upper bound on books a single fuzzy query scores
+MAX_TRIGRAM_CANDIDATES = 200
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+@lru_cache(maxsize=65536)
+def _word_trigrams(word: str) -> FrozenSet[str]:
+    padded = f'  {word} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def text_trigrams(text: str) -> Set[str]:
+    """Get the set of padded, lower-cased word trigrams of text."""
+    trigrams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        trigrams |= _word_trigrams(word)
+    return trigrams
+
+def trigram_similarity(query: str, text: str) -> float:
+    """
+    Score how well query matches text, from 0.0 to 1.0.
+
+    Only the words of text that share a trigram with the query take part,
+    so a misspelled surname still scores well against a full author name.
+    """
+    return query_similarity(text_trigrams(query), text)
+
+def query_similarity(query_trigrams: Set[str], text: str) -> float:
+    """trigram_similarity() for a query already split with text_trigrams()."""
+    if not query_trigrams:
+        return 0.0
+    matched = set()
+    for word in _WORD_RE.findall(text.lower()):
+        trigrams = _word_trigrams(word)
+        if not trigrams.isdisjoint(query_trigrams):
+            matched |= trigrams
+    shared = len(query_trigrams & matched)
+    return shared / (len(query_trigrams) + len(matched) - shared)
+
+def _index_book_trigrams(conn: sqlite3.Connection, book_id: int, title: str, author: str) -> None:
+    """Add a book to the trigram index (inside the caller's transaction)."""
+    for field, text in (('title', title), ('author', author)):
+        trigrams = [(field, trigram, book_id) for trigram in text_trigrams(text)]
+        conn.executemany('''
+            INSERT OR IGNORE INTO book_trigrams (field, trigram, book_id) VALUES (?, ?, ?)
+        ''', trigrams)
+        conn.executemany('''
+            INSERT INTO book_trigram_stats (field, trigram, book_count) VALUES (?, ?, 1)
+            ON CONFLICT (field, trigram) DO UPDATE SET book_count = book_count + 1
+        ''', [(field, trigram) for field, trigram, _ in trigrams])
+    conn.execute('INSERT INTO book_trigram_docs (book_id) VALUES (?)', (book_id,))
+
+def index_unindexed_books(conn: sqlite3.Connection, after_id: int = 0,
+                          batch_size: int = 500) -> Tuple[int, Optional[int]]:
+    """
+    Index the next batch of books after after_id that are missing from the
+    trigram index, and commit.
+
+    Returns:
+        tuple: (books indexed, last book ID examined or None past the end)
+    """
+    rows = conn.execute('''
+        SELECT id, title, author,
+               EXISTS (SELECT 1 FROM book_trigram_docs d WHERE d.book_id = books.id)
+        FROM books WHERE id > ? ORDER BY id LIMIT ?
+    ''', (after_id, batch_size)).fetchall()
+    indexed = 0
+    for book_id, title, author, already_indexed in rows:
+        if not already_indexed:
+            _index_book_trigrams(conn, book_id, title, author)
+            indexed += 1
+    conn.commit()
+    return indexed, rows[-1][0] if rows else None
+
+def get_trigram_candidates(field: str, query: str, threshold: float,
+                           limit: int = MAX_TRIGRAM_CANDIDATES) -> List[Book]:
+    """
+    Get the books that may match query with at least threshold similarity.
+
+    Candidates still need scoring with trigram_similarity().
+    """
+    if field not in TRIGRAM_FIELDS:
+        return []
+    query_trigrams = list(text_trigrams(query))
+    if not query_trigrams:
+        return []
+
+    conn = get_read_connection()
+    placeholders = ', '.join('?' * len(query_trigrams))
+    counts = dict(conn.execute(f'''
+        SELECT trigram, book_count FROM book_trigram_stats
+        WHERE field = ? AND trigram IN ({placeholders})
+    ''', [field] + query_trigrams).fetchall())
+    required = max(math.ceil(threshold * len(query_trigrams)), 1)
+    probes = sorted(query_trigrams, key=lambda t: counts.get(t, 0))
+    probes = [t for t in probes[:len(query_trigrams) - required + 1] if t in counts]
+    if not probes:
+        conn.close()
+        return []
+
+    # Books hitting the most probes are the likeliest matches, so they are
+    # kept when the candidate limit cuts in
+    books = _fetch_records(conn, Book, f'''
+        SELECT {BOOK_COLUMNS} FROM books
+        WHERE id IN (
+            SELECT book_id FROM book_trigrams
+            WHERE field = ? AND trigram IN ({', '.join('?' * len(probes))})
+            GROUP BY book_id
+            ORDER BY COUNT(*) DESC
+            LIMIT ?
+        )
+    ''', tuple([field] + probes + [limit]))
+    conn.close()
+    return books
+
+# Filtered catalog search
+
+# ORDER BY clause per sort option
+CATALOG_SORTS = {
+    'title': 'title COLLATE NOCASE, id',
+    'author': 'author COLLATE NOCASE, title COLLATE NOCASE, id',
+    'availability': 'available_copies DESC, title COLLATE NOCASE, id',
+}
+# Authors listed in the author facet
+AUTHOR_FACET_SIZE = 10
+
+def _substring_trigrams(term: str) -> Set[str]:
+    """
+    Get trigrams every indexed text containing term must have.
+
+    Words inside the term are complete, so they keep their padding; the
+    first and last words may be parts of longer words and are only padded
+    on the side facing another word of the term.
+    """
+    words = _WORD_RE.findall(term.lower())
+    trigrams = set()
+    for i, word in enumerate(words):
+        padded = word
+        if i > 0 or not _WORD_RE.match(term[0]):
+            padded = '  ' + padded
+        if i < len(words) - 1 or not _WORD_RE.match(term[-1]):
+            padded = padded + ' '
+        trigrams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return trigrams
+
+def _trigram_index_complete(conn: sqlite3.Connection) -> bool:
+    """Whether every book is in the trigram index (no book is pending)."""
+    return conn.execute('SELECT 1 FROM book_trigram_pending LIMIT 1').fetchone() is None
+
+def _contains_condition(conn: sqlite3.Connection, field: str, term: str) -> Tuple[str, list]:
+    """
+    SQL condition for a case-insensitive substring match, narrowed by the
+    trigram index while every book is in it.
+    """
+    condition = f'instr(unicode_lower({field}), ?) > 0'
+    params = [term.lower()]
+    trigrams = list(_substring_trigrams(term))
+    if trigrams and _trigram_index_complete(conn):
+        rarest = conn.execute(f'''
+            SELECT trigram, book_count FROM book_trigram_stats
+            WHERE field = ? AND trigram IN ({', '.join('?' * len(trigrams))})
+            ORDER BY book_count LIMIT 1
+        ''', [field] + trigrams).fetchone()
+        if rarest is None:
+            # No indexed book has any of the trigrams
+            return '0', []
+        condition = f'id IN (SELECT book_id FROM book_trigrams WHERE field = ? AND trigram = ?) AND {condition}'
+        params = [field, rarest[0]] + params
+    return condition, params
+
+def search_catalog(title: Optional[str] = None, author: Optional[str] = None,
+                   isbn: Optional[str] = None, available_only: bool = False,
+                   sort: str = 'title', limit: int = 50, offset: int = 0,
+                   fields: Optional[List[str]] = None) -> Dict:
+    """
+    Search the catalog on several fields at once, in SQL.
+
+    Title and author match case-insensitive substrings, ISBN matches exactly,
+    and all given filters must hold. Facet counts for each filter are
+    computed with the other filters applied, so they show how many results
+    choosing that facet value would give.
+
+    Only the given book fields are selected when fields is set (names
+    from Book._fields); the books are then plain dicts of those fields.
+
+    Returns:
+        dict: books (one page, as Book records), total, and facets with
+              'availability' ({'available': n, 'unavailable': n}) and
+              'authors' (list of {'author', 'count'})
+    """
+    if fields is not None and not set(fields) <= Book._field_set:
+        raise ValueError(f'Unknown book fields: {sorted(set(fields) - Book._field_set)}')
+    conn = get_read_connection()
+    conditions = {}
+    if title:
+        conditions['title'] = _contains_condition(conn, 'title', title)
+    if author:
+        conditions['author'] = _contains_condition(conn, 'author', author)
+    if isbn:
+        conditions['isbn'] = ('isbn = ?', [isbn])
+    if available_only:
+        conditions['available'] = ('available_copies > 0', [])
+
+    def where(exclude: Optional[str] = None) -> Tuple[str, list]:
+        parts = [(sql, params) for name, (sql, params) in conditions.items() if name != exclude]
+        if not parts:
+            return '1', []
+        return ' AND '.join(f'({sql})' for sql, _ in parts), [p for _, params in parts for p in params]
+
+    clause, params = where()
+    if fields is None:
+        books = _fetch_records(conn, Book, f'''
+            SELECT {BOOK_COLUMNS} FROM books WHERE {clause}
+            ORDER BY {CATALOG_SORTS[sort]} LIMIT ? OFFSET ?
+        ''', tuple(params + [limit, offset]))
+    else:
+        rows = conn.execute(f'''
+            SELECT {', '.join(fields)} FROM books WHERE {clause}
+            ORDER BY {CATALOG_SORTS[sort]} LIMIT ? OFFSET ?
+        ''', params + [limit, offset]).fetchall()
+        books = [dict(zip(fields, row)) for row in rows]
+    total = conn.execute(f'SELECT COUNT(*) FROM books WHERE {clause}', params).fetchone()[0]
+
+    clause, params = where('available')
+    available, unavailable = conn.execute(f'''
+        SELECT COALESCE(SUM(available_copies > 0), 0), COALESCE(SUM(available_copies <= 0), 0)
+        FROM books WHERE {clause}
+    ''', params).fetchone()
+
+    clause, params = where('author')
+    authors = conn.execute(f'''
+        SELECT author, COUNT(*) FROM books WHERE {clause}
+        GROUP BY author ORDER BY COUNT(*) DESC, author LIMIT ?
+    ''', params + [AUTHOR_FACET_SIZE]).fetchall()
+    conn.close()
+
+    return {
+        'books': books,
+        'total': total,
+        'facets': {
+            'availability': {'available': available, 'unavailable': unavailable},
+            'authors': [{'author': name, 'count': count} for name, count in authors]
+        }
+    }
@@ -0,0 +1,197 @@
+"""
+Event Log Module - Buffered writer for the audit event log
+
+Services record events without touching the database: each event goes into
+a bounded in-memory queue and a background thread writes them in group
+commits, one transaction per batch, once ``batch_size`` events have
+accumulated or ``flush_interval`` seconds have passed since the first one.
+When the queue is full, callers block for up to ``enqueue_timeout`` seconds
+and then write their event directly. A stalled writer therefore slows
+callers down to the speed of direct writes instead of growing memory.
+Pending events are flushed when the process exits.
+
+Events are written in their own transactions, after the write they
+describe:
+
+- Services record an event only once their write has succeeded. Inside a
+  request's unit of work the event is queued when the request commits,
+  and it is dropped if the request rolls back, so a rolled-back write
+  never leaves an event behind.
+- An event is queued after its write has committed, so a process killed
+  before the writer's next group commit loses the events still queued.
+  At most ``max_pending`` events are lost, covering up to about
+  ``flush_interval`` seconds. The log is an audit trail; loans and
+  payments themselves are always read from their own tables.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import database
+from database import insert_events, get_events
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class EventLog:
+    """
+    Queue of audit events drained by a background group-commit writer.
+
+    Args:
+        batch_size: Most events written in one transaction
+        flush_interval: Longest an event waits for a batch to fill up
+        max_pending: Capacity of the queue before callers are held back
+        enqueue_timeout: How long a caller waits for room in a full queue
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.5,
+                 max_pending: int = 10000, enqueue_timeout: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, event_type: str, patron_id: Optional[str] = None,
+               book_id: Optional[int] = None, **details) -> None:
+        """
+        Queue an event for the database currently configured in
+        ``database.DATABASE``, once the caller's writes are committed.
+        """
+        # The target database is captured now, not when the writer runs
+        item = (database.DATABASE, (event_type, patron_id, book_id, details, datetime.now()))
+        database.after_commit(lambda: self._enqueue(item))
+
+    def _enqueue(self, item) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.warning('Event log queue full; writing %s event directly', item[1][0])
+            self._write([item])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every event queued so far has been written.
+
+        Returns:
+            bool: False if the writer did not catch up within timeout
+        """
+        if not self._thread or not self._thread.is_alive():
+            self._drain()
+            return True
+        done = threading.Event()
+        # The marker needs room in the queue too, which a stalled writer
+        # may never make
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Write all pending events and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                # A stalled writer; what it has not taken is drained below
+                pass
+        self._drain()
+
+    def _ensure_started(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = []
+            waiters = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _drain(self) -> None:
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not _STOP:
+                batch.append(item)
+        self._write(batch)
+
+    def _write(self, batch: List) -> None:
+        by_database = {}
+        for path, event in batch:
+            by_database.setdefault(path, []).append(event)
+        for path, events in by_database.items():
+            if not insert_events(events, path):
+                logger.error('Failed to write %d audit events to %s', len(events), path)
+
+
+_event_log = EventLog()
+atexit.register(_event_log.close)
+
+def record_event(event_type: str, patron_id: Optional[str] = None,
+                 book_id: Optional[int] = None, **details) -> None:
+    """Queue an audit event on the shared event log."""
+    _event_log.record(event_type, patron_id, book_id, **details)
+
+def flush_events(timeout: Optional[float] = 5.0) -> bool:
+    """Wait for the shared event log to write everything queued so far."""
+    return _event_log.flush(timeout)
+
+def query_events(patron_id: Optional[str] = None, book_id: Optional[int] = None,
+                 event_type: Optional[str] = None, after_id: int = 0,
+                 limit: int = 100) -> List[Dict]:
+    """
+    Get audit events, oldest first, including any still waiting to be written.
+
+    Page through the log by passing the last returned ``id`` as after_id.
+    """
+    flush_events()
+    return get_events(patron_id, book_id, event_type, after_id, limit)
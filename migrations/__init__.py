@@ -0,0 +1,251 @@
+"""
+Migrations Package - Versioned schema migrations for the library database
+
+Each migration lives in its own module named ``mNNNN_<description>.py`` and
+exposes ``VERSION``, ``DESCRIPTION`` and ``upgrade(ctx)``. Pending migrations
+are applied in version order and recorded in the ``schema_version`` table, so
+an existing ``library.db`` can be brought up to date in place.
+
+Migrations must be idempotent: DDL should use ``IF NOT EXISTS`` (or the
+context helpers) and backfills should only touch rows that still need work.
+A runner that is interrupted half-way can then simply be started again.
+"""
+
+import importlib
+import pkgutil
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import database
+
+DEFAULT_BATCH_SIZE = 500
+
+_migrations = None
+
+
+class MigrationError(Exception):
+    """Raised when a migration fails or the migration set is inconsistent."""
+
+
+class MigrationContext:
+    """
+    Handle passed to each migration's ``upgrade`` function.
+
+    Statements issued through the context are only logged in dry-run mode,
+    and backfills commit after every batch so a large table is never held
+    under one long write lock.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, dry_run: bool = False,
+                 batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0,
+                 log: Optional[Callable[[str], None]] = None):
+        self.conn = conn
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.pause = pause
+        self._log = log
+
+    def log(self, message: str) -> None:
+        """Report progress through the runner's logger, if any."""
+        if self._log:
+            self._log(message)
+
+    def table_exists(self, table: str) -> bool:
+        """Check whether a table exists in the database."""
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        return row is not None
+
+    def column_exists(self, table: str, column: str) -> bool:
+        """Check whether a table has the given column."""
+        columns = self.conn.execute(f'PRAGMA table_info({table})').fetchall()
+        return any(c['name'] == column for c in columns)
+
+    def execute(self, sql: str, params: tuple = ()) -> None:
+        """Execute a schema statement (skipped in dry-run mode)."""
+        self.log(f'  {" ".join(sql.split())}')
+        if not self.dry_run:
+            self.conn.execute(sql, params)
+
+    def add_column(self, table: str, column: str, definition: str) -> None:
+        """Add a column to a table unless it already exists."""
+        if self.column_exists(table, column):
+            return
+        self.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    def backfill(self, table: str, set_clause: str, where: str = '1',
+                 params: tuple = (), batch_size: Optional[int] = None) -> int:
+        """
+        Run ``UPDATE table SET set_clause WHERE where`` in rowid-range batches.
+
+        Each batch is committed on its own, optionally followed by a short
+        pause so application writers can acquire the lock in between.
+
+        Args:
+            table: Table to update
+            set_clause: SQL assignments, e.g. ``"col = expr"``
+            where: Filter selecting rows that still need the backfill
+            params: Parameters bound to ``set_clause`` and ``where``
+            batch_size: Rows per batch (defaults to the runner's batch size)
+
+        Returns:
+            int: Number of rows updated (or that would be updated in dry-run)
+        """
+        batch_size = batch_size or self.batch_size
+        bounds = self.conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {table}').fetchone()
+        low, high = bounds[0], bounds[1]
+        if low is None:
+            return 0
+
+        if self.dry_run:
+            try:
+                count = self.conn.execute(
+                    f'SELECT COUNT(*) FROM {table} WHERE {where}', params
+                ).fetchone()[0]
+            except sqlite3.OperationalError:
+                # The filter references columns this migration has not
+                # created yet (dry-run skips the DDL), so assume every row.
+                count = self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            self.log(f'  would backfill {count} row(s) of {table} in batches of {batch_size}')
+            return count
+
+        updated = 0
+        start = low - 1
+        while start < high:
+            end = start + batch_size
+            cursor = self.conn.execute(
+                f'UPDATE {table} SET {set_clause} '
+                f'WHERE ({where}) AND rowid > ? AND rowid <= ?',
+                params + (start, end)
+            )
+            self.conn.commit()
+            updated += cursor.rowcount
+            start = end
+            if self.pause:
+                time.sleep(self.pause)
+
+        self.log(f'  backfilled {updated} row(s) of {table}')
+        return updated
+
+
+def discover_migrations() -> List:
+    """Return every migration module in this package, ordered by version."""
+    global _migrations
+    if _migrations is None:
+        modules = []
+        for info in pkgutil.iter_modules(__path__):
+            if info.name.startswith('m') and info.name[1:5].isdigit():
+                modules.append(importlib.import_module(f'{__name__}.{info.name}'))
+        modules.sort(key=lambda m: m.VERSION)
+
+        versions = [m.VERSION for m in modules]
+        if len(set(versions)) != len(versions):
+            raise MigrationError(f'Duplicate migration versions: {versions}')
+        _migrations = modules
+    return _migrations
+
+
+def ensure_version_table(conn: sqlite3.Connection) -> None:
+    """Create the schema_version bookkeeping table if needed."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def get_schema_version(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Get the highest applied migration version (0 for an unversioned database)."""
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).fetchone()
+        if not exists:
+            return 0
+        row = conn.execute('SELECT MAX(version) AS version FROM schema_version').fetchone()
+        return row['version'] or 0
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def pending_migrations(conn: sqlite3.Connection, target: Optional[int] = None) -> List:
+    """Get the migration modules that have not been applied yet."""
+    current = get_schema_version(conn)
+    return [
+        m for m in discover_migrations()
+        if m.VERSION > current and (target is None or m.VERSION <= target)
+    ]
+
+
+def apply_migrations(target: Optional[int] = None, dry_run: bool = False,
+                     batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0,
+                     log: Optional[Callable[[str], None]] = None) -> List[int]:
+    """
+    Apply pending migrations to the configured database.
+
+    Args:
+        target: Highest version to apply (defaults to the latest)
+        dry_run: Log what would happen without changing the database
+        batch_size: Rows per backfill batch
+        pause: Seconds to sleep between backfill batches
+        log: Optional callable receiving progress messages
+
+    Returns:
+        List[int]: Versions applied (or that would be applied in dry-run)
+    """
+    conn = database.get_db_connection()
+    conn.execute('PRAGMA busy_timeout = 5000')
+    applied = []
+    try:
+        if not dry_run:
+            ensure_version_table(conn)
+
+        for migration in pending_migrations(conn, target):
+            if log:
+                log(f'{"[dry-run] " if dry_run else ""}'
+                    f'Migration {migration.VERSION:04d}: {migration.DESCRIPTION}')
+            ctx = MigrationContext(conn, dry_run=dry_run, batch_size=batch_size,
+                                   pause=pause, log=log)
+            try:
+                if not dry_run:
+                    # Check under the write lock so a version another runner
+                    # has already recorded is not run again.
+                    conn.execute('BEGIN IMMEDIATE')
+                    if conn.execute('SELECT 1 FROM schema_version WHERE version = ?',
+                                    (migration.VERSION,)).fetchone():
+                        conn.rollback()
+                        continue
+                migration.upgrade(ctx)
+            except Exception as e:
+                conn.rollback()
+                raise MigrationError(
+                    f'Migration {migration.VERSION} ({migration.DESCRIPTION}) failed: {e}'
+                ) from e
+            if not dry_run:
+                try:
+                    conn.execute(
+                        'INSERT INTO schema_version (version, description, applied_at) '
+                        'VALUES (?, ?, ?)',
+                        (migration.VERSION, migration.DESCRIPTION, datetime.now().isoformat())
+                    )
+                except sqlite3.IntegrityError:
+                    # Another runner recorded this version while a backfill
+                    # batch had released the lock; migrations are idempotent
+                    # so the work it did is equivalent to ours.
+                    conn.rollback()
+                    continue
+                conn.commit()
+            applied.append(migration.VERSION)
+    finally:
+        conn.close()
+    return applied
@@ -0,0 +1,69 @@
+"""
+Command line interface for schema migrations.
+
+Usage:
+    python -m migrations status
+    python -m migrations upgrade [--target N] [--dry-run] [--batch-size N] [--pause S]
+"""
+
+import argparse
+import sys
+
+import database
+from migrations import (
+    DEFAULT_BATCH_SIZE, MigrationError, apply_migrations, discover_migrations,
+    get_schema_version
+)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m migrations',
+                                     description='Manage library database schema migrations.')
+    parser.add_argument('--database', default=database.DATABASE,
+                        help='Path to the SQLite database (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help='Show the current and latest schema version')
+
+    upgrade = subparsers.add_parser('upgrade', help='Apply pending migrations')
+    upgrade.add_argument('--target', type=int, default=None,
+                         help='Highest version to apply (default: latest)')
+    upgrade.add_argument('--dry-run', action='store_true',
+                         help='Print the planned changes without applying them')
+    upgrade.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                         help='Rows per backfill batch (default: %(default)s)')
+    upgrade.add_argument('--pause', type=float, default=0.0,
+                         help='Seconds to sleep between backfill batches')
+
+    args = parser.parse_args(argv)
+    database.DATABASE = args.database
+
+    if args.command == 'status':
+        current = get_schema_version()
+        migrations = discover_migrations()
+        latest = migrations[-1].VERSION if migrations else 0
+        print(f'Database: {args.database}')
+        print(f'Schema version: {current} (latest: {latest})')
+        for migration in migrations:
+            state = 'applied' if migration.VERSION <= current else 'pending'
+            print(f'  {migration.VERSION:04d} [{state}] {migration.DESCRIPTION}')
+        return 0
+
+    try:
+        applied = apply_migrations(target=args.target, dry_run=args.dry_run,
+                                   batch_size=args.batch_size, pause=args.pause, log=print)
+    except MigrationError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+    if not applied:
+        print('Database is up to date.')
+    elif args.dry_run:
+        print(f'Dry run: {len(applied)} migration(s) would be applied.')
+    else:
+        print(f'Applied {len(applied)} migration(s).')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Migration 0001 - Indexes for the hot loan and catalog lookups
+
+Open loans are always looked up by patron (borrow limit, returns, status
+reports) and the catalog is always listed by title; without these indexes
+both are full table scans.
+"""
+
+VERSION = 1
+DESCRIPTION = 'Add indexes for open-loan and catalog lookups'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_open
+        ON borrow_records (patron_id, return_date)
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book
+        ON borrow_records (book_id)
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_books_title
+        ON books (title)
+    ''')
@@ -0,0 +1,61 @@
+"""
+Migration 0002 - Integer epoch columns for loan dates
+
+``borrow_date``/``due_date``/``return_date`` stay as ISO text for existing
+readers; ``borrow_ts``/``due_ts``/``return_ts`` hold the same instants as
+whole seconds since 1970-01-01 (naive local time, like the ISO values) so
+overdue checks are integer comparisons that can use an index.
+
+Triggers fill the epoch columns for writers that only set the ISO columns.
+"""
+
+VERSION = 2
+DESCRIPTION = 'Add integer epoch columns for loan dates'
+
+# Truncate to whole seconds before converting so SQL and Python agree
+# (strftime would otherwise round the fractional part).
+_TO_EPOCH = "CAST(strftime('%s', substr({column}, 1, 19)) AS INTEGER)"
+
+
+def upgrade(ctx):
+    ctx.add_column('borrow_records', 'borrow_ts', 'INTEGER')
+    ctx.add_column('borrow_records', 'due_ts', 'INTEGER')
+    ctx.add_column('borrow_records', 'return_ts', 'INTEGER')
+
+    ctx.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_borrow_records_epoch_insert
+        AFTER INSERT ON borrow_records
+        WHEN NEW.borrow_ts IS NULL OR NEW.due_ts IS NULL
+        BEGIN
+            UPDATE borrow_records
+            SET borrow_ts = {_TO_EPOCH.format(column='NEW.borrow_date')},
+                due_ts = {_TO_EPOCH.format(column='NEW.due_date')}
+            WHERE id = NEW.id;
+        END
+    ''')
+    ctx.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_borrow_records_epoch_return
+        AFTER UPDATE OF return_date ON borrow_records
+        WHEN NEW.return_date IS NOT NULL AND NEW.return_ts IS NULL
+        BEGIN
+            UPDATE borrow_records
+            SET return_ts = {_TO_EPOCH.format(column='NEW.return_date')}
+            WHERE id = NEW.id;
+        END
+    ''')
+
+    ctx.backfill(
+        'borrow_records',
+        f"borrow_ts = {_TO_EPOCH.format(column='borrow_date')}, "
+        f"due_ts = {_TO_EPOCH.format(column='due_date')}, "
+        f"return_ts = {_TO_EPOCH.format(column='return_date')}",
+        where='borrow_ts IS NULL OR due_ts IS NULL '
+              'OR (return_date IS NOT NULL AND return_ts IS NULL)'
+    )
+
+    # Open loans ordered by due time: serves overdue scans without
+    # touching returned loans.
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due
+        ON borrow_records (due_ts) WHERE return_date IS NULL
+    ''')
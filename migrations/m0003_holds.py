@@ -0,0 +1,38 @@
+"""
+Migration 0003 - Hold (reservation) queue
+
+One row per hold. ``status`` moves from ``waiting`` to ``ready`` when a
+returned copy is set aside for the patron, then to ``fulfilled`` when they
+borrow it (or ``cancelled``/``expired``). The partial queue index makes
+finding the head of a book's queue a single index seek.
+"""
+
+VERSION = 3
+DESCRIPTION = 'Add holds table and queue indexes'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS holds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL,
+            patron_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'waiting',
+            created_ts INTEGER NOT NULL,
+            ready_ts INTEGER,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_queue
+        ON holds (book_id, id) WHERE status = 'waiting'
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_patron
+        ON holds (patron_id, status)
+    ''')
+    # A patron can only have one active hold per book
+    ctx.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_active
+        ON holds (patron_id, book_id) WHERE status IN ('waiting', 'ready')
+    ''')
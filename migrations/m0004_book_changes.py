@@ -0,0 +1,23 @@
+"""
+Migration 0004 - Append-only book change log
+
+Every catalog insert and availability change appends a row with the book's
+new counts. ``seq`` is the feed cursor: clients ask for everything after the
+last sequence number they saw, which is a rowid range scan.
+"""
+
+VERSION = 4
+DESCRIPTION = 'Add book_changes feed table'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS book_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL,
+            change_type TEXT NOT NULL,
+            available_copies INTEGER NOT NULL,
+            total_copies INTEGER NOT NULL,
+            changed_ts INTEGER NOT NULL
+        )
+    ''')
@@ -0,0 +1,46 @@
+"""
+Migration 0005 - Background job bookkeeping and materialized loan fees
+
+``job_locks`` holds time-limited leases used to elect the one worker that
+runs scheduled jobs, and ``job_runs`` records when each job last ran so a
+new leader picks up the same schedule. ``loan_fees`` holds the overdue
+state and fee of every open loan as computed by the nightly job; each row
+is only valid until ``valid_until_ts``, when the fee next changes.
+"""
+
+VERSION = 5
+DESCRIPTION = 'Add job lock/run tables and materialized loan fees'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS job_locks (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_ts INTEGER NOT NULL
+        )
+    ''')
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS job_runs (
+            name TEXT PRIMARY KEY,
+            last_run_ts INTEGER NOT NULL,
+            last_status TEXT NOT NULL,
+            last_duration_ms INTEGER NOT NULL
+        )
+    ''')
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS loan_fees (
+            loan_id INTEGER PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            is_overdue INTEGER NOT NULL,
+            days_overdue INTEGER NOT NULL,
+            fee_amount REAL NOT NULL,
+            computed_ts INTEGER NOT NULL,
+            valid_until_ts INTEGER NOT NULL
+        )
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_loan_fees_patron
+        ON loan_fees (patron_id, book_id)
+    ''')
@@ -0,0 +1,40 @@
+"""
+Migration 0006 - Materialized per-patron summary
+
+One row per patron with open loan count, overdue count, accrued fees, fees
+paid and last activity. Loan and payment writes keep the counters current;
+the time-dependent overdue figures are valid until ``valid_until_ts``
+(NULL when nothing can change), after which readers recompute them.
+``version`` increases on every write so a recompute based on an older read
+never overwrites newer counters. Existing patrons are seeded with stale rows
+so their first read recomputes.
+"""
+
+VERSION = 6
+DESCRIPTION = 'Add patron_summary table'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS patron_summary (
+            patron_id TEXT PRIMARY KEY,
+            open_loans INTEGER NOT NULL DEFAULT 0,
+            overdue_count INTEGER NOT NULL DEFAULT 0,
+            accrued_fees REAL NOT NULL DEFAULT 0,
+            fees_paid REAL NOT NULL DEFAULT 0,
+            last_activity_ts INTEGER,
+            refreshed_ts INTEGER,
+            valid_until_ts INTEGER,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_patron_summary_valid_until
+        ON patron_summary (valid_until_ts)
+    ''')
+    ctx.execute('''
+        INSERT OR IGNORE INTO patron_summary (patron_id, open_loans, last_activity_ts, valid_until_ts)
+        SELECT patron_id, SUM(return_date IS NULL), MAX(COALESCE(return_ts, borrow_ts)), 0
+        FROM borrow_records
+        GROUP BY patron_id
+    ''')
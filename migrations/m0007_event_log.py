@@ -0,0 +1,32 @@
+"""
+Migration 0007 - Append-only audit event log
+
+Every borrow, return, catalog addition and fee payment is recorded in
+``events``. Rows are only ever inserted; ``id`` gives the global order and
+serves as the paging cursor for queries by patron, book or event type.
+"""
+
+VERSION = 7
+DESCRIPTION = 'Add events audit log table'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            patron_id TEXT,
+            book_id INTEGER,
+            details TEXT NOT NULL DEFAULT '{}',
+            created_ts INTEGER NOT NULL
+        )
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_events_patron
+        ON events (patron_id, id) WHERE patron_id IS NOT NULL
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_events_book
+        ON events (book_id, id) WHERE book_id IS NOT NULL
+    ''')
+    ctx.execute('CREATE INDEX IF NOT EXISTS idx_events_type ON events (event_type, id)')
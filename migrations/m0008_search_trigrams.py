@@ -0,0 +1,87 @@
+"""
+Migration 0008 - Trigram index for fuzzy title and author search
+
+``book_trigrams`` maps each (field, trigram) to the books containing it,
+``book_trigram_stats`` counts those books per trigram so queries can probe
+their rarest trigrams first, and ``book_trigram_docs`` records which books
+are indexed. New books are indexed by ``insert_book``; existing ones are
+backfilled here in committed batches.
+
+The backfill splits text into trigrams with its own copy of the
+tokenizer, as it was when this index was introduced, so later changes to
+the application's indexing do not change what this migration writes.
+"""
+
+import re
+import time
+
+VERSION = 8
+DESCRIPTION = 'Add trigram search index for titles and authors'
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS book_trigrams (
+            field TEXT NOT NULL,
+            trigram TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            PRIMARY KEY (field, trigram, book_id)
+        ) WITHOUT ROWID
+    ''')
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS book_trigram_stats (
+            field TEXT NOT NULL,
+            trigram TEXT NOT NULL,
+            book_count INTEGER NOT NULL,
+            PRIMARY KEY (field, trigram)
+        ) WITHOUT ROWID
+    ''')
+    ctx.execute('CREATE TABLE IF NOT EXISTS book_trigram_docs (book_id INTEGER PRIMARY KEY)')
+
+    if ctx.dry_run:
+        count = ctx.conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+        ctx.log(f'  would index up to {count} book(s) in batches of {ctx.batch_size}')
+        return
+
+    indexed = 0
+    after_id = 0
+    while True:
+        rows = ctx.conn.execute('''
+            SELECT id, title, author,
+                   EXISTS (SELECT 1 FROM book_trigram_docs d WHERE d.book_id = books.id)
+            FROM books WHERE id > ? ORDER BY id LIMIT ?
+        ''', (after_id, ctx.batch_size)).fetchall()
+        if not rows:
+            break
+        for book_id, title, author, already_indexed in rows:
+            if not already_indexed:
+                _index_book(ctx.conn, book_id, title, author)
+                indexed += 1
+        ctx.conn.commit()
+        after_id = rows[-1][0]
+        if ctx.pause:
+            time.sleep(ctx.pause)
+    ctx.log(f'  indexed {indexed} book(s)')
+
+
+def _trigrams(text):
+    trigrams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f'  {word} '
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def _index_book(conn, book_id, title, author):
+    for field, text in (('title', title), ('author', author)):
+        trigrams = [(field, trigram, book_id) for trigram in _trigrams(text)]
+        conn.executemany('''
+            INSERT OR IGNORE INTO book_trigrams (field, trigram, book_id) VALUES (?, ?, ?)
+        ''', trigrams)
+        conn.executemany('''
+            INSERT INTO book_trigram_stats (field, trigram, book_count) VALUES (?, ?, 1)
+            ON CONFLICT (field, trigram) DO UPDATE SET book_count = book_count + 1
+        ''', [(field, trigram) for field, trigram, _ in trigrams])
+    conn.execute('INSERT INTO book_trigram_docs (book_id) VALUES (?)', (book_id,))
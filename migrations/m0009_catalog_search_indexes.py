@@ -0,0 +1,16 @@
+"""
+Migration 0009 - Indexes for filtered and sorted catalog search
+
+Case-insensitive indexes on title and author serve both sorting and prefix
+filters, and the availability index serves the available-only filter and
+availability sort.
+"""
+
+VERSION = 9
+DESCRIPTION = 'Add title, author and availability indexes on books'
+
+
+def upgrade(ctx):
+    ctx.execute('CREATE INDEX IF NOT EXISTS idx_books_title_nocase ON books (title COLLATE NOCASE)')
+    ctx.execute('CREATE INDEX IF NOT EXISTS idx_books_author_nocase ON books (author COLLATE NOCASE)')
+    ctx.execute('CREATE INDEX IF NOT EXISTS idx_books_available ON books (available_copies)')
@@ -0,0 +1,13 @@
+"""
+Migration 0010 - Index for walking the catalog in display order
+
+The catalog page streams books ordered by title in keyset-paged batches;
+this index serves each batch without sorting the whole table.
+"""
+
+VERSION = 10
+DESCRIPTION = 'Add (title, id) index on books'
+
+
+def upgrade(ctx):
+    ctx.execute('CREATE INDEX IF NOT EXISTS idx_books_title_id ON books (title, id)')
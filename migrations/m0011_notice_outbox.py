@@ -0,0 +1,46 @@
+"""
+Migration 0011 - Overdue notice outbox
+
+Notice runs select open loans that are overdue or due soon, grouped by
+patron. The partial index keeps open loans in (patron_id, id) order with
+their due time, so each batch of patrons is a range scan of the index.
+Rendered notices wait in ``notice_outbox`` until a sender delivers them,
+and ``notice_runs`` records how far each day's run got so an interrupted
+run resumes where it stopped.
+"""
+
+VERSION = 11
+DESCRIPTION = 'Add notice outbox, notice run checkpoints and open-loan due index'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_patron_due
+        ON borrow_records (patron_id, due_ts, id) WHERE return_date IS NULL
+    ''')
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS notice_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_date TEXT NOT NULL,
+            patron_id TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            created_ts INTEGER NOT NULL,
+            sent_ts INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            UNIQUE (run_date, patron_id)
+        )
+    ''')
+    ctx.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notice_outbox_pending
+        ON notice_outbox (id) WHERE sent_ts IS NULL
+    ''')
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS notice_runs (
+            run_date TEXT PRIMARY KEY,
+            last_patron_id TEXT NOT NULL DEFAULT '',
+            notices INTEGER NOT NULL DEFAULT 0,
+            completed_ts INTEGER
+        )
+    ''')
@@ -0,0 +1,70 @@
+"""
+Migration 0012 - Per-branch copy inventory
+
+``branches`` lists the library's branches; a branch with a ``shard`` keeps
+its inventory in that SQLite file instead of the main database.
+``branch_inventory`` holds each book's copies per branch, keyed by
+(book_id, branch_id) so a book's availability across branches is one range
+of the primary key. ``books.total_copies``/``available_copies`` remain the
+catalog-wide totals. Existing copies all start at the default branch,
+copied over in committed batches; a trigger does the same for books
+inserted by writers that do not know about branches. Loans remember the
+branch they were borrowed from.
+"""
+
+import time
+
+VERSION = 12
+DESCRIPTION = 'Add branches and per-branch copy inventory'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS branches (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            shard TEXT
+        )
+    ''')
+    ctx.execute("INSERT OR IGNORE INTO branches (id, name, shard) VALUES ('main', 'Main Library', NULL)")
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS branch_inventory (
+            book_id INTEGER NOT NULL,
+            branch_id TEXT NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL,
+            PRIMARY KEY (book_id, branch_id)
+        ) WITHOUT ROWID
+    ''')
+    ctx.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_books_default_branch_inventory
+        AFTER INSERT ON books
+        BEGIN
+            INSERT OR IGNORE INTO branch_inventory (book_id, branch_id, total_copies, available_copies)
+            VALUES (NEW.id, 'main', NEW.total_copies, NEW.available_copies);
+        END
+    ''')
+    ctx.add_column('borrow_records', 'branch_id', 'TEXT')
+
+    if ctx.dry_run:
+        count = ctx.conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+        ctx.log(f'  would add up to {count} book(s) to the default branch in batches of {ctx.batch_size}')
+        return
+
+    added = 0
+    after_id = 0
+    while True:
+        last = ctx.conn.execute('''
+            SELECT MAX(id) FROM (SELECT id FROM books WHERE id > ? ORDER BY id LIMIT ?)
+        ''', (after_id, ctx.batch_size)).fetchone()[0]
+        if last is None:
+            break
+        added += ctx.conn.execute('''
+            INSERT OR IGNORE INTO branch_inventory (book_id, branch_id, total_copies, available_copies)
+            SELECT id, 'main', total_copies, available_copies FROM books WHERE id > ? AND id <= ?
+        ''', (after_id, last)).rowcount
+        ctx.conn.commit()
+        after_id = last
+        if ctx.pause:
+            time.sleep(ctx.pause)
+    ctx.log(f'  added {added} book(s) to the default branch')
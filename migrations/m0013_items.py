@@ -0,0 +1,89 @@
+"""
+Migration 0013 - Per-copy items with barcodes
+
+Every physical copy becomes a row in ``items`` with a unique barcode, so a
+scanner can find a copy with one lookup of the barcode index, and loans
+reference the copy they lent (``borrow_records.item_id``). A partial
+unique index keeps a copy on at most one open loan. ``books`` keeps its
+copy counts; items only say which copy is where.
+
+Existing books get ``total_copies`` items each, numbered ``<book>-<n>``,
+and their open loans are matched to the copies not yet on loan, in loan
+order. Both happen in committed batches of books.
+"""
+
+import time
+
+VERSION = 13
+DESCRIPTION = 'Add per-copy items with barcodes'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            book_id INTEGER NOT NULL,
+            barcode TEXT NOT NULL UNIQUE,
+            branch_id TEXT NOT NULL DEFAULT 'main',
+            status TEXT NOT NULL DEFAULT 'available',
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    ctx.execute('CREATE INDEX IF NOT EXISTS idx_items_book_status ON items (book_id, status)')
+    ctx.add_column('borrow_records', 'item_id', 'INTEGER')
+    ctx.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_borrow_records_open_item
+        ON borrow_records (item_id) WHERE return_date IS NULL AND item_id IS NOT NULL
+    ''')
+
+    if ctx.dry_run:
+        count = ctx.conn.execute('SELECT COALESCE(SUM(total_copies), 0) FROM books').fetchone()[0]
+        ctx.log(f'  would add up to {count} item(s) in batches of {ctx.batch_size} books')
+        return
+
+    added = linked = 0
+    after_id = 0
+    while True:
+        last = ctx.conn.execute('''
+            SELECT MAX(id) FROM (SELECT id FROM books WHERE id > ? ORDER BY id LIMIT ?)
+        ''', (after_id, ctx.batch_size)).fetchone()[0]
+        if last is None:
+            break
+        added += ctx.conn.execute('''
+            WITH RECURSIVE copies (book_id, n, total) AS (
+                SELECT id, 1, total_copies FROM books WHERE id > ? AND id <= ? AND total_copies > 0
+                UNION ALL
+                SELECT book_id, n + 1, total FROM copies WHERE n < total
+            )
+            INSERT OR IGNORE INTO items (book_id, barcode, branch_id, status)
+            SELECT book_id, printf('%07d-%04d', book_id, n), 'main', 'available' FROM copies
+        ''', (after_id, last)).rowcount
+        linked += ctx.conn.execute('''
+            WITH loans AS (
+                SELECT id, book_id, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY id) AS n
+                FROM borrow_records
+                WHERE return_date IS NULL AND item_id IS NULL AND book_id > ? AND book_id <= ?
+            ), free_items AS (
+                SELECT id, book_id, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY id) AS n
+                FROM items
+                WHERE status = 'available' AND book_id > ? AND book_id <= ?
+            ), matches AS (
+                SELECT l.id AS loan_id, i.id AS item_id FROM loans l
+                JOIN free_items i ON i.book_id = l.book_id AND i.n = l.n
+            )
+            UPDATE borrow_records SET item_id = (
+                SELECT item_id FROM matches WHERE loan_id = borrow_records.id
+            )
+            WHERE id IN (SELECT loan_id FROM matches)
+        ''', (after_id, last, after_id, last)).rowcount
+        ctx.conn.execute('''
+            UPDATE items SET status = 'on_loan'
+            WHERE book_id > ? AND book_id <= ? AND id IN (
+                SELECT item_id FROM borrow_records WHERE return_date IS NULL AND item_id IS NOT NULL
+            )
+        ''', (after_id, last))
+        ctx.conn.commit()
+        after_id = last
+        if ctx.pause:
+            time.sleep(ctx.pause)
+    ctx.log(f'  added {added} item(s) and matched {linked} open loan(s) to them')
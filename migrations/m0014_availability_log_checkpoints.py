@@ -0,0 +1,21 @@
+"""
+Migration 0014 - Write-behind availability checkpoints
+
+With write-behind availability counters enabled, copy count changes are
+appended to intent logs and flushed to ``books`` in batches. Each flush
+records, in the same transaction, the last intent of each log it
+included, so replaying the logs after a crash applies every intent
+exactly once.
+"""
+
+VERSION = 14
+DESCRIPTION = 'Add availability intent log checkpoints'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS availability_log_checkpoints (
+            log TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL
+        )
+    ''')
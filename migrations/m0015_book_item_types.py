@@ -0,0 +1,14 @@
+"""
+Migration 0015 - Item types for fee rules
+
+Late fee rules can be set per item type, so ``books.item_type`` records the
+type of a title's copies (for example ``dvd``). Existing books keep NULL,
+which only the fee rules without an item type match.
+"""
+
+VERSION = 15
+DESCRIPTION = 'Add item types to books'
+
+
+def upgrade(ctx):
+    ctx.add_column('books', 'item_type', 'TEXT')
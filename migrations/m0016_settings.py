@@ -0,0 +1,19 @@
+"""
+Migration 0016 - Settings shared by every process
+
+``settings`` holds small named values that must agree across processes
+and restarts, such as the fingerprint of the fee policy the materialized
+fees were computed under.
+"""
+
+VERSION = 16
+DESCRIPTION = 'Add shared settings'
+
+
+def upgrade(ctx):
+    ctx.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
@@ -0,0 +1,63 @@
+"""
+Migration 0017 - Track books missing from the trigram index
+
+``book_trigram_pending`` lists the books not yet in ``book_trigram_docs``.
+Triggers add every new book and drop it again once it is indexed (or
+deleted), so catalog search can tell whether the index covers every book
+by checking that the table is empty instead of counting both tables.
+"""
+
+import time
+
+VERSION = 17
+DESCRIPTION = 'Track books missing from the trigram index'
+
+
+def upgrade(ctx):
+    ctx.execute('CREATE TABLE IF NOT EXISTS book_trigram_pending (book_id INTEGER PRIMARY KEY)')
+    ctx.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_books_trigram_pending
+        AFTER INSERT ON books
+        BEGIN
+            INSERT OR IGNORE INTO book_trigram_pending (book_id) VALUES (NEW.id);
+        END
+    ''')
+    ctx.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_books_trigram_pending_delete
+        AFTER DELETE ON books
+        BEGIN
+            DELETE FROM book_trigram_pending WHERE book_id = OLD.id;
+        END
+    ''')
+    ctx.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_book_trigram_docs_indexed
+        AFTER INSERT ON book_trigram_docs
+        BEGIN
+            DELETE FROM book_trigram_pending WHERE book_id = NEW.book_id;
+        END
+    ''')
+
+    if ctx.dry_run:
+        count = ctx.conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+        ctx.log(f'  would check up to {count} book(s) in batches of {ctx.batch_size}')
+        return
+
+    pending = 0
+    after_id = 0
+    while True:
+        last = ctx.conn.execute('''
+            SELECT MAX(id) FROM (SELECT id FROM books WHERE id > ? ORDER BY id LIMIT ?)
+        ''', (after_id, ctx.batch_size)).fetchone()[0]
+        if last is None:
+            break
+        pending += ctx.conn.execute('''
+            INSERT OR IGNORE INTO book_trigram_pending (book_id)
+            SELECT id FROM books
+            WHERE id > ? AND id <= ?
+              AND NOT EXISTS (SELECT 1 FROM book_trigram_docs d WHERE d.book_id = books.id)
+        ''', (after_id, last)).rowcount
+        ctx.conn.commit()
+        after_id = last
+        if ctx.pause:
+            time.sleep(ctx.pause)
+    ctx.log(f'  {pending} book(s) waiting for the trigram index')
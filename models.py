@@ -0,0 +1,130 @@
+"""
+Models Module - Lightweight record types returned by the data layer
+
+Records are slotted classes that also implement the read-only mapping
+protocol, so code written against plain dicts (``book['title']``,
+``book.get('author')``, ``'id' in book``, ``dict(book)``) and templates using
+``book.title`` keep working, while each row costs a fraction of a dict.
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class Record(Mapping):
+    """Base class for slotted, dict-compatible records."""
+
+    __slots__ = ()
+    _fields = ()
+    _field_set = frozenset()
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._field_set
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{type(self).__name__}({values})'
+
+    def to_dict(self) -> Dict:
+        """Return a plain dict copy (used for JSON serialization)."""
+        return {name: getattr(self, name) for name in self._fields}
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """sqlite3 row factory building records straight from result tuples."""
+        return cls(*row)
+
+
+class Book(Record):
+    """A catalog entry from the books table."""
+
+    __slots__ = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+    _fields = __slots__
+    _field_set = frozenset(__slots__)
+
+    def __init__(self, id: int, title: str, author: str, isbn: str,
+                 total_copies: int, available_copies: int):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.total_copies = total_copies
+        self.available_copies = available_copies
+
+
+class Loan(Record):
+    """
+    A borrow record joined with the borrowed book's title and author, plus
+    the branch it was lent from and the book's item type for fee rules.
+    """
+
+    __slots__ = ('id', 'book_id', 'title', 'author', 'borrow_date', 'due_date',
+                 'is_overdue', 'return_date', 'branch_id', 'item_type')
+    _fields = __slots__
+    _field_set = frozenset(__slots__)
+
+    def __init__(self, id: int, book_id: int, title: str, author: str,
+                 borrow_date: datetime, due_date: datetime, is_overdue: bool,
+                 return_date: Optional[datetime] = None, branch_id: Optional[str] = None,
+                 item_type: Optional[str] = None):
+        self.id = id
+        self.book_id = book_id
+        self.title = title
+        self.author = author
+        self.borrow_date = borrow_date
+        self.due_date = due_date
+        self.is_overdue = is_overdue
+        self.return_date = return_date
+        self.branch_id = branch_id
+        self.item_type = item_type
+
+
+class Hold(Record):
+    """A patron's place in a book's hold queue."""
+
+    __slots__ = ('id', 'book_id', 'patron_id', 'status', 'placed_date', 'ready_date',
+                 'title', 'queue_position')
+    _fields = __slots__
+    _field_set = frozenset(__slots__)
+
+    def __init__(self, id: int, book_id: int, patron_id: str, status: str,
+                 placed_date: datetime, ready_date: Optional[datetime], title: str,
+                 queue_position: int):
+        self.id = id
+        self.book_id = book_id
+        self.patron_id = patron_id
+        self.status = status
+        self.placed_date = placed_date
+        self.ready_date = ready_date
+        self.title = title
+        self.queue_position = queue_position
+
+
+class BookChange(Record):
+    """An entry in the book change feed."""
+
+    __slots__ = ('seq', 'book_id', 'change_type', 'available_copies', 'total_copies',
+                 'changed_date')
+    _fields = __slots__
+    _field_set = frozenset(__slots__)
+
+    def __init__(self, seq: int, book_id: int, change_type: str, available_copies: int,
+                 total_copies: int, changed_date: datetime):
+        self.seq = seq
+        self.book_id = book_id
+        self.change_type = change_type
+        self.available_copies = available_copies
+        self.total_copies = total_copies
+        self.changed_date = changed_date
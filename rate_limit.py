@@ -0,0 +1,197 @@
+"""
+Rate Limit Module - Token buckets and concurrency caps for expensive endpoints
+
+Each protected endpoint has a token bucket per client IP and, where the
+request names one, per patron ID. A request takes one token from every
+bucket it falls under and is refused with 429 when any is empty. Buckets
+live in process memory by default; ``SQLiteBucketStore`` shares them
+between workers through a small SQLite file. On top of that, each endpoint
+may run at most ``max_concurrent`` requests at once per process; requests
+beyond that get 503 straight away instead of queueing behind the others.
+"""
+
+import math
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from flask import Flask, Response, current_app, jsonify, request
+
+
+class Limit(NamedTuple):
+    """Refill rate (requests per second), bucket size and concurrency cap of an endpoint."""
+    rate: float
+    burst: int
+    max_concurrent: int
+
+
+RATE_LIMITS = {
+    'search': Limit(rate=5.0, burst=20, max_concurrent=8),
+    'late_fee': Limit(rate=5.0, burst=10, max_concurrent=8),
+}
+# Buckets untouched for this long are full again and can be forgotten
+BUCKET_IDLE_SECONDS = 3600
+# SQLite file shared by all workers; None keeps buckets in each process
+RATE_LIMIT_DATABASE = None
+
+
+class MemoryBucketStore:
+    """Token buckets kept in this process."""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        """
+        Take a token from the bucket for key.
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one is available
+        """
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if len(self._buckets) > 100000:
+                self._prune(now)
+            return wait
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - BUCKET_IDLE_SECONDS
+        self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= cutoff}
+
+
+class SQLiteBucketStore:
+    """Token buckets shared by every worker using the same SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        """Take a token from the shared bucket for key (see MemoryBucketStore.take)."""
+        conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated FROM rate_limits WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            conn.execute('''
+                INSERT INTO rate_limits (key, tokens, updated) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+            ''', (key, tokens - 1 if wait == 0 else tokens, now))
+            if random.random() < 0.001:
+                conn.execute('DELETE FROM rate_limits WHERE updated < ?', (now - BUCKET_IDLE_SECONDS,))
+            conn.execute('COMMIT')
+            return wait
+        except sqlite3.Error:
+            # Admission control must not take the app down with it
+            return 0.0
+        finally:
+            conn.close()
+
+
+class RateLimiter:
+    """Per-app rate limiting state: the bucket store and per-endpoint concurrency slots."""
+
+    def __init__(self, store=None, limits: Optional[Dict[str, Limit]] = None):
+        self.store = store or MemoryBucketStore()
+        self.limits = dict(limits or RATE_LIMITS)
+        self._slots = {name: threading.BoundedSemaphore(limit.max_concurrent)
+                       for name, limit in self.limits.items()}
+
+    def check(self, name: str, keys: Tuple[str, ...], now: Optional[float] = None) -> float:
+        """
+        Take a token for each key under endpoint name.
+
+        Returns:
+            float: 0 if the request may proceed, else seconds to wait
+        """
+        limit = self.limits[name]
+        now = time.time() if now is None else now
+        wait = 0.0
+        for key in keys:
+            wait = max(wait, self.store.take(f'{name}:{key}', limit.rate, limit.burst, now))
+        return wait
+
+    def try_enter(self, name: str) -> bool:
+        """Claim one of the endpoint's concurrency slots without waiting."""
+        return self._slots[name].acquire(blocking=False)
+
+    def leave(self, name: str) -> None:
+        """Release a slot claimed with try_enter."""
+        self._slots[name].release()
+
+
+def init_rate_limiting(app: Flask, store=None) -> RateLimiter:
+    """
+    Attach a RateLimiter to app.
+
+    Without an explicit store, buckets are shared through
+    ``RATE_LIMIT_DATABASE`` when it is set and kept in process otherwise.
+    """
+    if store is None and RATE_LIMIT_DATABASE:
+        store = SQLiteBucketStore(RATE_LIMIT_DATABASE)
+    limiter = RateLimiter(store)
+    app.extensions['rate_limiter'] = limiter
+    return limiter
+
+
+def _refuse(status: int, message: str, retry_after: float) -> Response:
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': message})
+    else:
+        response = Response(message, mimetype='text/plain')
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def rate_limited(name: str) -> Callable:
+    """
+    Apply endpoint name's rate limit and concurrency cap to a view.
+
+    Requests are keyed by client IP and by patron_id when the URL, query
+    string or form carries one.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is None:
+                return view(*args, **kwargs)
+
+            keys = (f'ip:{request.remote_addr}',)
+            patron_id = kwargs.get('patron_id') or request.values.get('patron_id')
+            if patron_id:
+                keys += (f'patron:{patron_id}',)
+            wait = limiter.check(name, keys)
+            if wait:
+                return _refuse(429, 'Too many requests. Please slow down.', wait)
+
+            if not limiter.try_enter(name):
+                return _refuse(503, 'Server is busy. Please try again shortly.', 1)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.leave(name)
+        return wrapper
+    return decorator
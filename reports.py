@@ -0,0 +1,149 @@
+"""
+Reports Module - Batch patron status reports
+
+Builds the status report of every patron with loans, e.g. for mailing
+overdue notices. Patron IDs are read in keyset pages and split into shards
+of ``shard_size`` patrons. Each shard is handled by a worker process, which
+loads the open loans of the whole shard with one query over a read-only
+connection and builds the reports from them. Reports are written as the
+shards complete, in patron ID order, as JSON Lines or CSV. The output goes
+to a temporary file that is renamed into place once the run succeeds.
+
+Usage:
+    python -m reports OUTPUT [--format jsonl|csv] [--workers N] [--shard-size 500]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import database
+from database import get_borrowed_books_for_patrons, get_patron_ids_batch, replica_reads
+from services.library_service import build_patron_status_report
+
+DEFAULT_SHARD_SIZE = 500
+REPORT_FORMATS = ('jsonl', 'csv')
+# Per-patron totals written to CSV; the borrowed books only appear in JSONL
+CSV_FIELDS = ('patron_id', 'total_books_borrowed', 'overdue_count', 'total_late_fees', 'status')
+
+
+def iter_patron_shards(shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[List[str]]:
+    """Yield the IDs of every patron with loans, in order, shard_size at a time."""
+    after = ''
+    while True:
+        patron_ids = get_patron_ids_batch(after, shard_size)
+        if not patron_ids:
+            return
+        yield patron_ids
+        if len(patron_ids) < shard_size:
+            return
+        after = patron_ids[-1]
+
+
+def build_shard_reports(patron_ids: List[str], as_of: datetime) -> List[Dict]:
+    """Build the status reports of one shard of patrons."""
+    with replica_reads():
+        loans = get_borrowed_books_for_patrons(patron_ids)
+    return [build_patron_status_report(patron_id, loans[patron_id], as_of) for patron_id in patron_ids]
+
+
+def _init_worker(database_path: str) -> None:
+    database.DATABASE = database_path
+    # Serve the worker's reads from a read-only connection to the same file
+    database.REPLICA_DATABASE = database_path
+    database.REPLICA_MAX_STALENESS = None
+
+
+def _map_shards(shards: Iterable[List[str]], as_of: datetime, workers: int) -> Iterator[List[Dict]]:
+    """Build the reports of each shard, yielding them in shard order."""
+    if workers <= 1:
+        for shard in shards:
+            yield build_shard_reports(shard, as_of)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(database.DATABASE,)) as pool:
+        # Keep a few shards queued per worker so none sit idle, without
+        # reading every patron ID up front
+        pending = deque()
+        for shard in shards:
+            pending.append(pool.submit(build_shard_reports, shard, as_of))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _report_writer(f, fmt: str) -> Callable[[Dict], None]:
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        return writer.writerow
+    return lambda report: f.write(json.dumps(report) + '\n')
+
+
+def run_patron_reports(output: str, fmt: str = 'jsonl', workers: Optional[int] = None,
+                       shard_size: int = DEFAULT_SHARD_SIZE,
+                       as_of: Optional[datetime] = None) -> int:
+    """
+    Write the status report of every patron with loans to output.
+
+    Args:
+        output: Path of the report file
+        fmt: 'jsonl' (full reports) or 'csv' (per-patron totals)
+        workers: Worker processes (defaults to the number of CPUs; 1 runs in process)
+        shard_size: Patrons per shard
+        as_of: Time fees are computed at (defaults to now)
+
+    Returns:
+        int: Number of reports written
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f'Unknown report format: {fmt}')
+    as_of = as_of or datetime.now()
+    workers = workers or os.cpu_count() or 1
+
+    temp_path = f'{output}.partial'
+    count = 0
+    try:
+        with open(temp_path, 'w', newline='') as f:
+            write = _report_writer(f, fmt)
+            for reports in _map_shards(iter_patron_shards(shard_size), as_of, workers):
+                for report in reports:
+                    write(report)
+                count += len(reports)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, output)
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m reports',
+                                     description='Write status reports for every patron with loans.')
+    parser.add_argument('output', help='Report file to write')
+    parser.add_argument('--database', default=database.DATABASE,
+                        help='Path to the SQLite database (default: %(default)s)')
+    parser.add_argument('--format', choices=REPORT_FORMATS, default='jsonl',
+                        help='Output format (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: number of CPUs)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help='Patrons per shard (default: %(default)s)')
+    args = parser.parse_args(argv)
+    database.DATABASE = args.database
+
+    count = run_patron_reports(args.output, args.format, args.workers, args.shard_size)
+    print(f'Wrote {count} patron reports to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,12 +2,34 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+from flask import Blueprint, Response, current_app, jsonify, request
+from database import (
+    get_book_availability, get_book_changes_since, get_item_by_barcode, get_latest_book_change_seq, get_oldest_book_change_seq,
+    get_statement_cache_stats, wait_for_book_changes
+)
+from services.library_service import (
+    calculate_late_fee_for_book, search_books_in_catalog, borrow_books_by_patron,
+    return_books_by_patron, filter_catalog, borrow_item_by_barcode, return_item_by_barcode,
+    CATALOG_PAGE_SIZE
+)
+from event_log import query_events
+from rate_limit import rate_limited
+from services.hold_service import place_hold, cancel_hold, get_holds_for_patron
+from services.patron_summary_service import get_patron_summary_report
+from services.suggest_service import suggest_books
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Longest a single long-poll request may wait for changes
+MAX_CHANGE_WAIT_SECONDS = 30
+# Interval between keep-alive comments on an idle event stream
+STREAM_KEEPALIVE_SECONDS = 15
+# Query parameters that select filtered (faceted) search on /api/search;
+# field projection is only available there since it happens in SQL
+FILTER_PARAMS = ('title', 'author', 'isbn', 'available', 'sort', 'fields')
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
+@rate_limited('late_fee')
 def get_late_fee(patron_id, book_id):
     """
     Calculate late fee for a specific book borrowed by a patron.
@@ -16,7 +38,118 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/patron/<patron_id>/summary')
+def get_patron_summary_api(patron_id):
+    """
+    Get a patron's loan and fee totals.
+    Served from the materialized patron summary.
+    """
+    summary = get_patron_summary_report(patron_id)
+    return jsonify(summary), 400 if summary['status'] == 'Invalid patron ID.' else 200
+
+def _batch_response(result):
+    success, message, results = result
+    status = 200 if results else 400
+    return jsonify({'success': success, 'message': message, 'results': results}), status
+
+@api_bp.route('/books/<int:book_id>/availability')
+def get_book_availability_api(book_id):
+    """Get a book's available copies overall and at each branch."""
+    availability = get_book_availability(book_id)
+    if availability is None:
+        return jsonify({'error': 'Book not found.'}), 404
+    return jsonify(availability)
+
+@api_bp.route('/items/<barcode>')
+def get_item_api(barcode):
+    """Look up a copy by its barcode."""
+    item = get_item_by_barcode(barcode)
+    if item is None:
+        return jsonify({'error': 'No copy has this barcode.'}), 404
+    return jsonify(item)
+
+@api_bp.route('/items/<barcode>/borrow', methods=['POST'])
+def borrow_item_api(barcode):
+    """
+    Lend a scanned copy.
+    Accepts patron_id as JSON or form field.
+    """
+    data = request.get_json(silent=True) or request.form
+    success, message = borrow_item_by_barcode(str(data.get('patron_id', '')).strip(), barcode)
+    return jsonify({'success': success, 'message': message}), 200 if success else 400
+
+@api_bp.route('/items/<barcode>/return', methods=['POST'])
+def return_item_api(barcode):
+    """
+    Return a scanned copy.
+    Accepts an optional branch_id as JSON or form field.
+    """
+    data = request.get_json(silent=True) or request.form
+    branch_id = str(data.get('branch_id', '')).strip() or None
+    success, message = return_item_by_barcode(barcode, branch_id)
+    return jsonify({'success': success, 'message': message}), 200 if success else 400
+
+@api_bp.route('/borrow/batch', methods=['POST'])
+def borrow_batch_api():
+    """
+    Borrow several books for one patron in one request.
+    Body: {"patron_id": "123456", "book_ids": [1, 2, 3]}
+    """
+    data = request.get_json(silent=True) or {}
+    book_ids = data.get('book_ids')
+    if not isinstance(book_ids, list):
+        return jsonify({'success': False, 'message': 'book_ids must be a list.', 'results': []}), 400
+    return _batch_response(borrow_books_by_patron(str(data.get('patron_id', '')), book_ids))
+
+@api_bp.route('/return/batch', methods=['POST'])
+def return_batch_api():
+    """
+    Return several books for one patron in one request.
+    Body: {"patron_id": "123456", "book_ids": [1, 2, 3]}
+    """
+    data = request.get_json(silent=True) or {}
+    book_ids = data.get('book_ids')
+    if not isinstance(book_ids, list):
+        return jsonify({'success': False, 'message': 'book_ids must be a list.', 'results': []}), 400
+    return _batch_response(return_books_by_patron(str(data.get('patron_id', '')), book_ids))
+
+@api_bp.route('/events')
+def get_events_api():
+    """
+    Query the audit event log, oldest first.
+    Optional filters: patron_id, book_id, type; page with after=<last id>.
+    """
+    try:
+        book_id = request.args.get('book_id', type=int)
+        after_id = int(request.args.get('after', 0))
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({'error': 'after and limit must be integers'}), 400
+
+    events = query_events(request.args.get('patron_id'), book_id,
+                          request.args.get('type'), after_id, limit)
+    return jsonify({
+        'events': events,
+        'next_after': events[-1]['id'] if events else after_id
+    })
+
+@api_bp.route('/stats/statements')
+def get_statement_stats_api():
+    """Report prepared-statement cache hit rates since startup."""
+    return jsonify(get_statement_cache_stats())
+
+@api_bp.route('/suggest')
+def suggest_books_api():
+    """
+    Typeahead suggestions for titles, authors and ISBNs starting with q.
+    Optional k sets the number of suggestions.
+    """
+    prefix = request.args.get('q', '')
+    k = request.args.get('k', type=int)
+    return jsonify({'query': prefix, 'suggestions': suggest_books(prefix, k)})
+
 @api_bp.route('/search')
+@rate_limited('search')
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -25,15 +158,162 @@ def search_books_api():
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
     
+    # Any field filter, availability or sort switches to filtered search
+    if any(name in request.args for name in FILTER_PARAMS):
+        return _filtered_search(search_term, search_type)
+    
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
+    # Optional similarity threshold for typo-tolerant matching
+    threshold = request.args.get('threshold', type=float)
+    if 'threshold' in request.args and (threshold is None or not 0 < threshold <= 1):
+        return jsonify({'error': 'threshold must be a number between 0 and 1'}), 400
+    
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    books = search_books_in_catalog(search_term, search_type, threshold)
     
     return jsonify({
         'search_term': search_term,
         'search_type': search_type,
+        'threshold': threshold,
         'results': books,
         'count': len(books)
     })
+
+@api_bp.route('/holds', methods=['POST'])
+def place_hold_api():
+    """
+    Place a hold on a book with no available copies.
+    Accepts patron_id and book_id as JSON or form fields.
+    """
+    data = request.get_json(silent=True) or request.form
+    patron_id = str(data.get('patron_id', '')).strip()
+
+    try:
+        book_id = int(data.get('book_id', ''))
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'Invalid book ID.'}), 400
+
+    success, message = place_hold(patron_id, book_id)
+    return jsonify({'success': success, 'message': message}), 201 if success else 400
+
+@api_bp.route('/holds/<patron_id>')
+def get_holds_api(patron_id):
+    """
+    List a patron's active holds and their queue positions.
+    Patrons check this instead of polling the catalog for availability.
+    """
+    holds = get_holds_for_patron(patron_id)
+    return jsonify({
+        'patron_id': patron_id,
+        'holds': holds,
+        'ready_count': sum(1 for h in holds if h['status'] == 'ready'),
+        'count': len(holds)
+    })
+
+@api_bp.route('/holds/<patron_id>/<int:hold_id>', methods=['DELETE'])
+def cancel_hold_api(patron_id, hold_id):
+    """Cancel one of a patron's active holds."""
+    success, message = cancel_hold(patron_id, hold_id)
+    return jsonify({'success': success, 'message': message}), 200 if success else 404
+
+def _parse_change_cursor(value):
+    """Parse a feed cursor; a missing cursor means "from now on"."""
+    if value is None or value == '':
+        return get_latest_book_change_seq()
+    try:
+        return max(int(value), 0)
+    except (ValueError, TypeError):
+        return None
+
+@api_bp.route('/changes')
+def get_book_changes_api():
+    """
+    Availability change feed (long-poll).
+    Returns catalog changes after the `since` cursor, waiting up to `timeout`
+    seconds for new ones, so clients no longer re-fetch the whole catalog.
+    """
+    since = _parse_change_cursor(request.args.get('since'))
+    if since is None:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+
+    try:
+        timeout = min(max(float(request.args.get('timeout', 0)), 0.0), MAX_CHANGE_WAIT_SECONDS)
+        limit = min(max(int(request.args.get('limit', 500)), 1), 500)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid timeout or limit.'}), 400
+
+    # Changes older than the retained log were pruned; the client must
+    # reload the catalog before following the feed again
+    oldest = get_oldest_book_change_seq()
+    if oldest and since < oldest - 1:
+        return jsonify({'changes': [], 'cursor': get_latest_book_change_seq(), 'resync': True})
+
+    if timeout:
+        changes = wait_for_book_changes(since, timeout, limit)
+    else:
+        changes = get_book_changes_since(since, limit)
+
+    return jsonify({
+        'changes': changes,
+        'cursor': changes[-1]['seq'] if changes else since,
+        'resync': False
+    })
+
+@api_bp.route('/changes/stream')
+def stream_book_changes_api():
+    """
+    Availability change feed (server-sent events).
+    Resumes from the Last-Event-ID header or `since` parameter.
+    """
+    since = _parse_change_cursor(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    if since is None:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+
+    json_dumps = current_app.json.dumps
+
+    def generate(cursor):
+        yield 'retry: 3000\n\n'
+        while True:
+            changes = wait_for_book_changes(cursor, STREAM_KEEPALIVE_SECONDS)
+            if not changes:
+                yield ': keep-alive\n\n'
+                continue
+            for change in changes:
+                cursor = change['seq']
+                yield f"id: {cursor}\nevent: {change['change_type']}\ndata: {json_dumps(change)}\n\n"
+
+    return Response(generate(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _filtered_search(search_term, search_type):
+    filters = {name: request.args.get(name, '').strip() or None for name in ('title', 'author', 'isbn')}
+    # q/type still work alongside the field filters
+    if search_term and search_type in filters and not filters[search_type]:
+        filters[search_type] = search_term
+    available_only = request.args.get('available', '').lower() in ('1', 'true', 'yes')
+    sort = request.args.get('sort', 'title')
+    try:
+        limit = int(request.args.get('limit', CATALOG_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+
+    fields = request.args.get('fields')
+    fields = [name.strip() for name in fields.split(',') if name.strip()] if fields is not None else None
+
+    result = filter_catalog(filters['title'], filters['author'], filters['isbn'],
+                            available_only, sort, limit, offset, fields)
+    if result['status'] != 'Search completed successfully.':
+        return jsonify({'error': result['status']}), 400
+
+    return jsonify({
+        'filters': filters,
+        'available_only': available_only,
+        'sort': sort,
+        'results': result['books'],
+        'count': len(result['books']),
+        'total': result['total'],
+        'facets': result['facets']
+    })
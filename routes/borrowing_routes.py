@@ -22,7 +22,8 @@ def borrow_book():
         return redirect(url_for('catalog.catalog'))
     
     # Use business logic function
-    success, message = borrow_book_by_patron(patron_id, book_id)
+    branch_id = request.form.get('branch_id', '').strip() or None
+    success, message = borrow_book_by_patron(patron_id, book_id, branch_id)
     
     flash(message, 'success' if success else 'error')
     return redirect(url_for('catalog.catalog'))
@@ -45,7 +46,8 @@ def return_book():
         return render_template('return_book.html')
     
     # Use business logic function
-    success, message = return_book_by_patron(patron_id, book_id)
+    branch_id = request.form.get('branch_id', '').strip() or None
+    success, message = return_book_by_patron(patron_id, book_id, branch_id)
     
     flash(message, 'success' if success else 'error')
     return render_template('return_book.html')
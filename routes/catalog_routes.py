@@ -2,12 +2,54 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+from itertools import chain
+
+from flask import (
+    Blueprint, Response, current_app, flash, get_flashed_messages, redirect,
+    render_template, request, stream_template, url_for
+)
+import database
+from database import iter_all_books
 from services.library_service import add_book_to_catalog
 
 catalog_bp = Blueprint('catalog', __name__)
 
+# Rendered catalog rows keyed on (database, borrow URL, book id, available
+# copies, total copies). Titles, authors and ISBNs never change, so a row
+# only needs re-rendering when its copy counts do.
+_row_cache = {}
+MAX_CACHED_ROWS = 50000
+# Bytes of rendered HTML collected before each write to the client
+STREAM_CHUNK_SIZE = 16384
+
+def _row_renderer(borrow_url):
+    macro = current_app.jinja_env.get_template('_catalog_row.html').module.catalog_row
+    path = database.DATABASE
+
+    def render_row(book):
+        key = (path, borrow_url, book.id, book.available_copies, book.total_copies)
+        row = _row_cache.get(key)
+        if row is None:
+            if len(_row_cache) >= MAX_CACHED_ROWS:
+                _row_cache.clear()
+            row = _row_cache[key] = macro(book, borrow_url)
+        return row
+    return render_row
+
+def _buffered(chunks, size=STREAM_CHUNK_SIZE):
+    """Join the template's many small chunks into fewer, larger writes."""
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
 @catalog_bp.route('/')
 def index():
     """Home page redirects to catalog."""
@@ -19,8 +61,17 @@ def catalog():
     Display all books in the catalog.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    # Books are read in batches while the page streams out, so the first
+    # bytes go out before the whole catalog has been loaded
+    books = iter_all_books()
+    first = next(books, None)
+    books = chain([first], books) if first is not None else ()
+    # Flash messages must be taken from the session before the response
+    # headers (and session cookie) are sent
+    get_flashed_messages()
+    page = stream_template('catalog.html', books=books,
+                           render_row=_row_renderer(url_for('borrowing.borrow_book')))
+    return Response(_buffered(page), mimetype='text/html')
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
@@ -35,6 +86,7 @@ def add_book():
     title = request.form.get('title', '').strip()
     author = request.form.get('author', '').strip()
     isbn = request.form.get('isbn', '').strip()
+    item_type = request.form.get('item_type', '').strip().lower() or None
     
     try:
         total_copies = int(request.form.get('total_copies', ''))
@@ -43,7 +95,7 @@ def add_book():
         return render_template('add_book.html')
     
     # Use business logic function
-    success, message = add_book_to_catalog(title, author, isbn, total_copies)
+    success, message = add_book_to_catalog(title, author, isbn, total_copies, item_type)
     
     if success:
         flash(message, 'success')
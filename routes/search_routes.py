@@ -3,11 +3,13 @@ Search Routes - Book search functionality
 """
 
 from flask import Blueprint, render_template, request, flash
+from rate_limit import rate_limited
 from services.library_service import search_books_in_catalog
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@rate_limited('search')
 def search_books():
     """
     Search for books in the catalog.
@@ -15,12 +17,14 @@ def search_books():
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    # Optional similarity threshold (0-1) for typo-tolerant matching
+    threshold = request.args.get('threshold', type=float)
     
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    books = search_books_in_catalog(search_term, search_type, threshold)
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
@@ -0,0 +1,176 @@
+"""
+Scheduler Module - In-process background job scheduler
+
+Jobs run on a daemon thread inside the app process. When several workers
+each start a scheduler they elect a leader through a lease in the
+``job_locks`` table, and only the leader runs jobs. Last-run times are kept
+in ``job_runs``, so if the leader dies another worker takes over the same
+schedule instead of starting from scratch.
+
+While a job runs, a heartbeat thread keeps renewing the lease. If renewal
+fails, another worker may already be leader, so the job is asked to stop:
+long jobs call ``check_lease()`` between batches, which raises
+``LeaseLost`` once the lease is gone.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from datetime import time as time_of_day
+from typing import Callable, List, Optional
+
+from database import acquire_lock, release_lock, get_job_last_run, record_job_run
+
+logger = logging.getLogger(__name__)
+
+# Set while a scheduled job runs on this thread; signalled once its
+# scheduler has lost the lease
+_job_state = threading.local()
+
+
+class LeaseLost(Exception):
+    """Raised inside a scheduled job once its scheduler has lost the leader lease."""
+
+
+def check_lease() -> None:
+    """
+    Stop the current scheduled job if its scheduler has lost the lease.
+
+    Call between batches of long jobs; outside a scheduled job it does nothing.
+
+    Raises:
+        LeaseLost: If the lease could not be renewed while the job ran
+    """
+    lost = getattr(_job_state, 'lease_lost', None)
+    if lost is not None and lost.is_set():
+        raise LeaseLost('Scheduler lease lost while the job was running')
+
+
+class Job:
+    """A named callable with either a fixed interval or a daily run time."""
+
+    def __init__(self, name: str, func: Callable, interval: Optional[timedelta] = None,
+                 daily_at: Optional[time_of_day] = None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.daily_at = daily_at
+
+    def is_due(self, last_run: Optional[datetime], now: datetime) -> bool:
+        """Check whether the job should run now given when it last ran."""
+        if self.daily_at is not None:
+            scheduled = datetime.combine(now.date(), self.daily_at)
+            if scheduled > now:
+                scheduled -= timedelta(days=1)
+            return last_run is None or last_run < scheduled
+        return last_run is None or now - last_run >= self.interval
+
+
+class JobScheduler:
+    """
+    Runs registered jobs on a background thread while holding the leader lease.
+
+    Args:
+        lease_name: Name of the lease row shared by all schedulers
+        lease_seconds: How long a lease lasts without renewal
+        tick_seconds: How often the thread checks for due jobs
+    """
+
+    def __init__(self, lease_name: str = 'scheduler', lease_seconds: int = 300,
+                 tick_seconds: float = 30.0):
+        self.lease_name = lease_name
+        self.lease_seconds = lease_seconds
+        self.tick_seconds = tick_seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.jobs = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_interval_job(self, name: str, func: Callable, interval: timedelta) -> None:
+        """Register a job that runs every interval."""
+        self.jobs.append(Job(name, func, interval=interval))
+
+    def add_daily_job(self, name: str, func: Callable, at: time_of_day) -> None:
+        """Register a job that runs once a day at the given local time."""
+        self.jobs.append(Job(name, func, daily_at=at))
+
+    def is_leader(self) -> bool:
+        """Acquire or renew the leader lease."""
+        return acquire_lock(self.lease_name, self.owner, self.lease_seconds)
+
+    def run_pending(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Run every due job if this scheduler is the leader.
+
+        Returns:
+            List[str]: Names of the jobs that ran
+        """
+        ran = []
+        for job in self.jobs:
+            if not self.is_leader():
+                break
+            current = now or datetime.now()
+            if not job.is_due(get_job_last_run(job.name), current):
+                continue
+
+            lease_lost = threading.Event()
+            finished = threading.Event()
+            heartbeat = threading.Thread(target=self._renew_lease, args=(finished, lease_lost),
+                                         name='job-scheduler-lease', daemon=True)
+            heartbeat.start()
+            _job_state.lease_lost = lease_lost
+            start = time.perf_counter()
+            status = 'ok'
+            try:
+                job.func()
+            except LeaseLost:
+                status = None
+            except Exception as e:
+                status = f'error: {e}'
+                logger.exception('Scheduled job %s failed', job.name)
+            finally:
+                _job_state.lease_lost = None
+                finished.set()
+                heartbeat.join()
+            if status is None:
+                # The new leader runs the job again, so this run is not recorded
+                logger.warning('Scheduler lease lost during job %s; stopping', job.name)
+                break
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            record_job_run(job.name, current, status, duration_ms)
+            ran.append(job.name)
+        return ran
+
+    def _renew_lease(self, finished: threading.Event, lease_lost: threading.Event) -> None:
+        # Renew well within the lease so one slow renewal cannot let it expire
+        while not finished.wait(self.lease_seconds / 3):
+            if not self.is_leader():
+                lease_lost.set()
+                return
+
+    def start(self) -> None:
+        """Start the scheduler thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the scheduler thread and give up the lease."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        release_lock(self.lease_name, self.owner)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception('Scheduler tick failed')
+            self._stop.wait(self.tick_seconds)
@@ -0,0 +1,189 @@
+"""
+Fee Policy Service Module - Configurable late fee rules
+
+Late fees follow a policy of rules, each for a branch and/or item type (or
+neither, for the fallback rule). A rule has grace days that are never
+charged, tiers of daily rates by charged day, and an optional cap per loan.
+The most specific rule wins: branch and item type, then branch, then item
+type, then the fallback.
+
+Policies are loaded from a JSON file (``FEE_POLICY_FILE``) such as::
+
+    {
+        "version": "2025-09",
+        "rules": [
+            {"item_type": "dvd", "grace_days": 1, "cap": 10.0,
+             "tiers": [{"from_day": 1, "rate": 1.0}, {"from_day": 8, "rate": 2.0}]},
+            {"tiers": [{"from_day": 1, "rate": 0.5}]}
+        ]
+    }
+
+Loading compiles every rule into tier start days with the fee already
+accrued at each start, so a fee is a binary search plus one multiply, and
+fees are cached per rule and day count for as long as the policy version
+is in use. Without a file the default policy applies: 0.50 per day, no
+grace days and no cap.
+
+Fees materialized in ``loan_fees`` and ``patron_summary`` were computed
+under some policy. A fingerprint of that policy is stored in the database,
+so loading a policy other than the stored one clears them, whichever
+process or restart loads it; reloading the same policy keeps them.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import record_fee_policy
+
+logger = logging.getLogger(__name__)
+
+# Path of the JSON policy file; None uses DEFAULT_POLICY
+FEE_POLICY_FILE = None
+
+DEFAULT_POLICY = {
+    'version': 'default',
+    'rules': [{'grace_days': 0, 'tiers': [{'from_day': 1, 'rate': 0.50}], 'cap': None}]
+}
+
+# Fees cached per rule; past a rule's cap every day count has the same fee
+MAX_CACHED_DAYS = 3650
+
+
+class FeeRule:
+    """A compiled fee rule: grace days, tiered daily rates and an optional cap."""
+
+    def __init__(self, grace_days: int, tiers: List[Tuple[int, float]], cap: Optional[float]):
+        self.grace_days = grace_days
+        self.cap = cap
+        self._starts = [start for start, _ in tiers]
+        self._rates = [rate for _, rate in tiers]
+        # Fee accrued before each tier starts
+        self._accrued = [0.0]
+        for i in range(1, len(tiers)):
+            self._accrued.append(self._accrued[-1] + (self._starts[i] - self._starts[i - 1]) * self._rates[i - 1])
+        self._cache: Dict[int, float] = {}
+
+    def fee(self, days_overdue: int) -> float:
+        """Get the fee for a loan returned (or still out) days_overdue days late."""
+        charged = days_overdue - self.grace_days
+        if charged <= 0:
+            return 0.0
+        fee = self._cache.get(charged)
+        if fee is None:
+            i = bisect_right(self._starts, charged) - 1
+            fee = 0.0 if i < 0 else self._accrued[i] + (charged - self._starts[i] + 1) * self._rates[i]
+            if self.cap is not None:
+                fee = min(fee, self.cap)
+            fee = round(fee, 2)
+            if len(self._cache) < MAX_CACHED_DAYS:
+                self._cache[charged] = fee
+        return fee
+
+
+class FeePolicy:
+    """A loaded fee policy, compiled for lookup by branch and item type."""
+
+    def __init__(self, config: Dict):
+        self.version = str(config.get('version', ''))
+        self._rules: Dict[Tuple[Optional[str], Optional[str]], FeeRule] = {}
+        for rule in config.get('rules', []):
+            key = (rule.get('branch'), rule.get('item_type'))
+            if key in self._rules:
+                raise ValueError(f'Duplicate fee rule for branch={key[0]} item_type={key[1]}')
+            self._rules[key] = _compile_rule(rule)
+        if (None, None) not in self._rules:
+            raise ValueError('Fee policy needs a fallback rule without branch or item_type')
+
+    def rule_for(self, branch: Optional[str] = None, item_type: Optional[str] = None) -> FeeRule:
+        """Get the most specific rule for a branch and item type."""
+        rules = self._rules
+        return (rules.get((branch, item_type)) or rules.get((branch, None))
+                or rules.get((None, item_type)) or rules[(None, None)])
+
+    def fee(self, days_overdue: int, branch: Optional[str] = None,
+            item_type: Optional[str] = None) -> float:
+        """Get the fee for one loan."""
+        return self.rule_for(branch, item_type).fee(days_overdue)
+
+    def fees(self, loans: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> List[float]:
+        """
+        Get the fees for a batch of loans.
+
+        Args:
+            loans: (days_overdue, branch, item_type) tuples
+
+        Returns:
+            List[float]: Fees in the same order
+        """
+        rules = {}
+        result = []
+        for days_overdue, branch, item_type in loans:
+            key = (branch, item_type)
+            rule = rules.get(key)
+            if rule is None:
+                rule = rules[key] = self.rule_for(branch, item_type)
+            result.append(rule.fee(days_overdue))
+        return result
+
+
+def _compile_rule(rule: Dict) -> FeeRule:
+    try:
+        grace_days = int(rule.get('grace_days', 0))
+        tiers = sorted((int(tier['from_day']), float(tier['rate'])) for tier in rule['tiers'])
+        cap = rule.get('cap')
+        cap = float(cap) if cap is not None else None
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid fee rule {rule!r}: {e}') from e
+    if grace_days < 0 or not tiers or tiers[0][0] != 1 or any(rate < 0 for _, rate in tiers):
+        raise ValueError(f'Invalid fee rule {rule!r}: tiers must start at day 1 with non-negative rates')
+    if cap is not None and cap < 0:
+        raise ValueError(f'Invalid fee rule {rule!r}: cap must not be negative')
+    return FeeRule(grace_days, tiers, cap)
+
+
+_policy_lock = threading.Lock()
+_policy: Optional[FeePolicy] = None
+_policy_fingerprint: Optional[str] = None
+
+
+def load_fee_policy(path: Optional[str] = None) -> FeePolicy:
+    """
+    Load and compile a fee policy and make it the current one, clearing
+    the materialized fees unless they were computed under the same policy.
+
+    Args:
+        path: JSON policy file (defaults to FEE_POLICY_FILE, or DEFAULT_POLICY if unset)
+
+    Raises:
+        ValueError: If the policy is invalid; the current policy is kept
+    """
+    global _policy, _policy_fingerprint
+    path = path or FEE_POLICY_FILE
+    if path:
+        with open(path) as f:
+            config = json.load(f)
+    else:
+        config = DEFAULT_POLICY
+    policy = FeePolicy(config)
+    fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+    with _policy_lock:
+        changed = fingerprint != _policy_fingerprint
+        _policy, _policy_fingerprint = policy, fingerprint
+    if changed and not record_fee_policy(fingerprint):
+        logger.error('Fee policy %s loaded but materialized fees could not be cleared', policy.version)
+    return policy
+
+
+def get_fee_policy() -> FeePolicy:
+    """Get the current fee policy, loading it on first use."""
+    policy = _policy
+    if policy is None:
+        with _policy_lock:
+            policy = _policy
+        if policy is None:
+            policy = load_fee_policy()
+    return policy
@@ -0,0 +1,114 @@
+"""
+Hold Service Module - Business logic for the hold (reservation) queue
+
+When every copy of a book is out, patrons join a per-book FIFO queue instead
+of repeatedly checking the catalog. Returned copies are handed straight to
+the head of the queue and set aside until that patron borrows them.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from database import (
+    get_book_by_id, insert_hold, get_hold_by_id, get_patron_holds,
+    get_expired_ready_holds, update_hold_status, assign_next_hold,
+    update_book_availability
+)
+from models import Hold
+
+# Days a patron has to pick up a copy set aside for them
+HOLD_PICKUP_DAYS = 3
+
+def place_hold(patron_id: str, book_id: int) -> Tuple[bool, str]:
+    """
+    Place a hold on a book that currently has no available copies.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book to reserve
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+
+    book = get_book_by_id(book_id)
+    if not book:
+        return False, "Book not found."
+
+    if book['available_copies'] > 0:
+        return False, "This book is available. Please borrow it instead of placing a hold."
+
+    if any(h['book_id'] == book_id for h in get_patron_holds(patron_id)):
+        return False, "You already have a hold on this book."
+
+    hold_id = insert_hold(patron_id, book_id, datetime.now())
+    if hold_id is None:
+        return False, "Database error occurred while placing the hold."
+
+    hold = get_hold_by_id(hold_id)
+    return True, f'Hold placed on "{book["title"]}". Your position in the queue: {hold["queue_position"]}.'
+
+def cancel_hold(patron_id: str, hold_id: int) -> Tuple[bool, str]:
+    """
+    Cancel one of a patron's active holds.
+
+    A copy already set aside for the hold is passed on to the next patron
+    in the queue, or returned to the shelf.
+
+    Args:
+        patron_id: 6-digit library card ID
+        hold_id: ID of the hold to cancel
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+
+    hold = get_hold_by_id(hold_id)
+    if not hold or hold['patron_id'] != patron_id or hold['status'] not in ('waiting', 'ready'):
+        return False, "Active hold not found."
+
+    if not update_hold_status(hold_id, 'cancelled'):
+        return False, "Database error occurred while cancelling the hold."
+
+    if hold['status'] == 'ready':
+        release_copy(hold['book_id'])
+
+    return True, f'Hold on "{hold["title"]}" has been cancelled.'
+
+def get_holds_for_patron(patron_id: str) -> List[Hold]:
+    """Get a patron's active holds with their queue positions."""
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return []
+    return get_patron_holds(patron_id)
+
+def release_copy(book_id: int) -> Optional[int]:
+    """
+    Hand a freed copy of a book to the next waiting hold, if any.
+
+    Otherwise the copy goes back on the shelf.
+
+    Returns:
+        Optional[int]: ID of the hold the copy was assigned to, or None
+    """
+    hold_id = assign_next_hold(book_id, datetime.now())
+    if hold_id is None:
+        update_book_availability(book_id, +1)
+    return hold_id
+
+def expire_ready_holds(now: Optional[datetime] = None) -> int:
+    """
+    Expire ready holds that were not picked up in time and pass the copies on.
+
+    Returns:
+        int: Number of holds expired
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=HOLD_PICKUP_DAYS)
+    expired = 0
+    for hold in get_expired_ready_holds(cutoff):
+        if update_hold_status(hold['id'], 'expired'):
+            release_copy(hold['book_id'])
+            expired += 1
+    return expired
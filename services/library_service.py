@@ -3,16 +3,35 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books
+    return_loan, get_all_books, get_patron_borrowed_books,
+    get_ready_hold, update_hold_status, get_materialized_late_fee,
+    record_patron_payment, borrow_books_batch, return_books_batch, replica_reads,
+    get_trigram_candidates, text_trigrams, query_similarity, search_catalog, CATALOG_SORTS,
+    get_branches, get_item_by_barcode, DEFAULT_BRANCH
 )
+from event_log import record_event
+from models import Book
+from services.fee_policy_service import get_fee_policy
 from services.payment_service import PaymentGateway
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+# Most books a patron may have on loan at once
+MAX_BORROWED_BOOKS = 5
+# Most books a self-checkout station may submit in one batch
+MAX_BATCH_SIZE = 20
+# Search types supporting typo-tolerant matching
+FUZZY_SEARCH_TYPES = ('title', 'author')
+# Results per page of a filtered catalog search, by default and at most
+CATALOG_PAGE_SIZE = 20
+MAX_CATALOG_PAGE_SIZE = 100
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int,
+                        item_type: Optional[str] = None) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
     Implements R1: Book Catalog Management
@@ -22,6 +41,7 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         author: Book author (max 100 chars)
         isbn: 13-digit ISBN
         total_copies: Number of copies (positive integer)
+        item_type: Type of the copies for late fee rules (e.g. 'dvd'), if any
         
     Returns:
         tuple: (success: bool, message: str)
@@ -51,13 +71,15 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         return False, "A book with this ISBN already exists."
     
     # Insert new book
-    success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
+    success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies, item_type)
     if success:
+        record_event('book_added', isbn=isbn, title=title.strip(), total_copies=total_copies)
         return True, f'Book "{title.strip()}" has been successfully added to the catalog.'
     else:
         return False, "Database error occurred while adding the book."
 
-def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
+def borrow_book_by_patron(patron_id: str, book_id: int, branch_id: Optional[str] = None,
+                          item_id: Optional[int] = None) -> Tuple[bool, str]:
     """
     Allow a patron to borrow a book.
     Implements R3 as per requirements  
@@ -65,6 +87,8 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     Args:
         patron_id: 6-digit library card ID
         book_id: ID of the book to borrow
+        branch_id: Branch the copy is taken from (optional)
+        item_id: Copy being lent, e.g. from a barcode scan (optional)
         
     Returns:
         tuple: (success: bool, message: str)
@@ -78,7 +102,13 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not book:
         return False, "Book not found."
     
-    if book['available_copies'] <= 0:
+    if branch_id is not None and branch_id not in {branch['id'] for branch in get_branches()}:
+        return False, "Unknown branch."
+    
+    # A copy set aside for this patron's hold can be borrowed even when
+    # no copies are on the shelf
+    ready_hold = get_ready_hold(patron_id, book_id)
+    if book['available_copies'] <= 0 and not ready_hold:
         return False, "This book is currently not available."
     
     # Check patron's current borrowed books count
@@ -91,18 +121,30 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error occurred while creating borrow record."
-    
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
-    
+    if ready_hold:
+        borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date, branch_id, item_id)
+        if not borrow_success:
+            return False, "Database error occurred while creating borrow record."
+        # The held copy was already taken off the shelf when it was set aside
+        if not update_hold_status(ready_hold['id'], 'fulfilled'):
+            return False, "Database error occurred while updating the hold."
+    else:
+        # Take the copy off the shelf first, so two patrons cannot both
+        # borrow its last copy
+        if not update_book_availability(book_id, -1, branch_id):
+            if branch_id is not None:
+                return False, "This book is currently not available at this branch."
+            return False, "This book is currently not available."
+        borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date, branch_id, item_id)
+        if not borrow_success:
+            update_book_availability(book_id, +1, branch_id)
+            return False, "Database error occurred while creating borrow record."
+    
+    record_event('borrow', patron_id, book_id, due_date=due_date, from_hold=bool(ready_hold))
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
-def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
+def return_book_by_patron(patron_id: str, book_id: int, branch_id: Optional[str] = None,
+                          loan_id: Optional[int] = None) -> Tuple[bool, str]:
     """
     Process book return by a patron.
     Implements R4: Return Management
@@ -110,6 +152,8 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     Args:
         patron_id: 6-digit library card ID
         book_id: ID of the borrowed book
+        branch_id: Branch the copy is returned to (optional)
+        loan_id: Loan being closed, when the patron has several copies of the book (optional)
         
     Returns:
         tuple: (success: bool, message: str)
@@ -125,29 +169,149 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         return False, "This book was not borrowed by the patron."
     
     # Find borrow record
-    borrow_record = next((b for b in borrowed_books if b['book_id'] == book_id), None)
+    borrow_record = next((b for b in borrowed_books
+                          if b['book_id'] == book_id and loan_id in (None, b['id'])), None)
     if not borrow_record:
         return False, "Borrow record not found."
     
-    # Update return date
+    if branch_id is not None and branch_id not in {branch['id'] for branch in get_branches()}:
+        return False, "Unknown branch."
+    
+    # Close the loan and hand the copy to the next patron in the hold
+    # queue, or put it back on the shelf, all or nothing
     return_date = datetime.now()
-    updated = update_borrow_record_return_date(patron_id, book_id, return_date)
-    if not updated:
+    if not return_loan(patron_id, book_id, return_date, borrow_record['id'], branch_id):
         return False, "Failed to update return record."
     
-    # Increment available copies
-    updated_copies = update_book_availability(book_id, +1)
-    if not updated_copies:
-        return False, "Failed to update book availability."
-    
     # Check for lateness
     due_date = borrow_record['due_date']
+    record_event('return', patron_id, book_id, due_date=due_date,
+                 days_late=max((return_date - due_date).days, 0))
     if return_date > due_date:
         overdue_days = (return_date - due_date).days
         return True, f'Book returned late by {overdue_days} days. Please check for late fees.'
     
     return True, f'Book returned successfully on {return_date.strftime("%Y-%m-%d")}.'
 
+def borrow_item_by_barcode(patron_id: str, barcode: str) -> Tuple[bool, str]:
+    """
+    Lend the copy with the given barcode, e.g. scanned at a checkout station.
+    
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    item = get_item_by_barcode(barcode.strip())
+    if not item:
+        return False, "No copy has this barcode."
+    if item['status'] != 'available':
+        return False, "This copy is already on loan."
+    return borrow_book_by_patron(patron_id, item['book_id'], item['branch_id'], item['id'])
+
+def return_item_by_barcode(barcode: str, branch_id: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Return the copy with the given barcode for whichever patron borrowed it.
+    
+    Args:
+        branch_id: Branch the copy is returned to (optional)
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    item = get_item_by_barcode(barcode.strip())
+    if not item:
+        return False, "No copy has this barcode."
+    if item['loan_id'] is None:
+        return False, "This copy is not on loan."
+    return return_book_by_patron(item['patron_id'], item['book_id'], branch_id, item['loan_id'])
+
+def _validate_batch(patron_id: str, book_ids: List[int]) -> Optional[str]:
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits."
+    if not book_ids:
+        return "No books were provided."
+    if len(book_ids) > MAX_BATCH_SIZE:
+        return f"At most {MAX_BATCH_SIZE} books can be processed at once."
+    if not all(isinstance(book_id, int) and not isinstance(book_id, bool) for book_id in book_ids):
+        return "Book IDs must be integers."
+    return None
+
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Borrow a stack of books for one patron, e.g. from a self-checkout station.
+
+    The patron ID and borrowing limit are checked once and all loans are
+    written in a single transaction. Books that cannot be borrowed are
+    reported individually without affecting the rest of the batch.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow
+
+    Returns:
+        tuple: (success: bool, message: str, results: list of dicts with
+               book_id, success and message per book)
+    """
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return False, error, []
+
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=14)
+    outcomes = borrow_books_batch(patron_id, book_ids, borrow_date, due_date, MAX_BORROWED_BOOKS)
+    if outcomes is None:
+        return False, "Database error occurred while creating borrow records.", []
+
+    messages = {
+        'borrowed': f'Borrowed. Due date: {due_date.strftime("%Y-%m-%d")}.',
+        'not_found': "Book not found.",
+        'not_available': "This book is currently not available.",
+        'limit_reached': f"You have reached the maximum borrowing limit of {MAX_BORROWED_BOOKS} books."
+    }
+    results = []
+    for book_id, outcome in outcomes:
+        if outcome == 'borrowed':
+            record_event('borrow', patron_id, book_id, due_date=due_date, batch=True)
+        results.append({'book_id': book_id, 'success': outcome == 'borrowed', 'message': messages[outcome]})
+    borrowed = sum(1 for r in results if r['success'])
+    return borrowed > 0, f'Borrowed {borrowed} of {len(results)} books.', results
+
+def return_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Return a stack of books for one patron in a single transaction.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books being returned
+
+    Returns:
+        tuple: (success: bool, message: str, results: list of dicts with
+               book_id, success and message per book)
+    """
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return False, error, []
+
+    return_date = datetime.now()
+    outcomes = return_books_batch(patron_id, book_ids, return_date)
+    if outcomes is None:
+        return False, "Failed to update return records.", []
+
+    results = []
+    for book_id, outcome, due_date in outcomes:
+        if outcome != 'returned':
+            results.append({'book_id': book_id, 'success': False,
+                            'message': "This book was not borrowed by the patron."})
+            continue
+        record_event('return', patron_id, book_id, due_date=due_date,
+                     days_late=max((return_date - due_date).days, 0), batch=True)
+        if return_date > due_date:
+            message = f'Returned late by {(return_date - due_date).days} days. Please check for late fees.'
+        else:
+            message = "Returned successfully."
+        results.append({'book_id': book_id, 'success': True, 'message': message})
+    returned = sum(1 for r in results if r['success'])
+    return returned > 0, f'Returned {returned} of {len(results)} books.', results
+
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """
     Calculate late fees for a specific book.
@@ -161,6 +325,18 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
         'status': 'Late fee calculation not implemented'
     }
     """
+    now = datetime.now()
+
+    # Use the fee materialized by the background job while it is still
+    # current; it changes at most once a day per loan
+    materialized = get_materialized_late_fee(patron_id, book_id, now)
+    if materialized:
+        return {
+            'fee_amount': materialized['fee_amount'],
+            'days_overdue': materialized['days_overdue'],
+            'status': 'Late fee applied.' if materialized['is_overdue'] else 'No late fee.'
+        }
+
     # Retrieve all books borrowed by this patron
     borrowed_books = get_patron_borrowed_books(patron_id)
     record = next((b for b in borrowed_books if b['book_id'] == book_id), None)
@@ -173,29 +349,50 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             'status': 'Borrow record not found.'
         }
 
-    due_date = record['due_date']
-    # If returned, use recorded return date; else, assume not yet returned (use current time)
-    return_date = record.get('return_date') or datetime.now()
+    return late_fee_for_record(record, now)
 
-    # No late fee if returned before or on due date
-    if return_date <= due_date:
-        return {
-            'fee_amount': 0.00,
-            'days_overdue': 0,
-            'status': 'No late fee.'
-        }
+def late_fee_for_record(record: Dict, now: datetime) -> Dict:
+    """
+    Compute the late fee for an already-loaded borrow record as of now.
 
-    # Calculate overdue
-    days_overdue = (return_date - due_date).days
-    fee = round(days_overdue * 0.50, 2)
+    The fee comes from the current fee policy, using the record's
+    'branch_id' (loans without one were lent by the default branch) and
+    'item_type' when it has them.
 
-    return {
-        'fee_amount': fee,
-        'days_overdue': days_overdue,
-        'status': 'Late fee applied.'
-    }
+    Args:
+        record: Borrow record with 'due_date' (and optionally 'return_date')
+        now: Time to compute the fee at
+
+    Returns:
+        dict: fee_amount, days_overdue and status
+    """
+    return late_fees_for_records([record], now)[0]
+
+def late_fees_for_records(records: List, now: datetime) -> List[Dict]:
+    """Compute late fees for a batch of already-loaded borrow records (see late_fee_for_record)."""
+    days = []
+    for record in records:
+        # If returned, use recorded return date; else, assume not yet returned (use current time)
+        return_date = record.get('return_date') or now
+        # No late fee if returned before or on due date
+        days.append((return_date - record['due_date']).days if return_date > record['due_date'] else None)
+
+    fees = get_fee_policy().fees(
+        (days_overdue, record.get('branch_id') or DEFAULT_BRANCH, record.get('item_type'))
+        for record, days_overdue in zip(records, days) if days_overdue is not None
+    )
+    results = []
+    fee_iter = iter(fees)
+    for days_overdue in days:
+        if days_overdue is None:
+            results.append({'fee_amount': 0.00, 'days_overdue': 0, 'status': 'No late fee.'})
+        else:
+            results.append({'fee_amount': next(fee_iter), 'days_overdue': days_overdue,
+                            'status': 'Late fee applied.'})
+    return results
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str,
+                            threshold: Optional[float] = None) -> List[Book]:
     """
     Search for books in the catalog.
     Implements R6: Catalog Search
@@ -203,12 +400,19 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     Args:
         search_term (str): The keyword to search for.
         search_type (str): One of ['title', 'author', 'isbn'].
+        threshold (float, optional): Enables typo-tolerant matching on titles
+            and authors; results scoring at least this similarity (0-1) are
+            returned, best match first.
     
     Returns:
-        List[Dict]: A list of matching books.
+        List[Book]: A list of matching books.
     """
-    # Retrieve all books from the database
-    books = get_all_books()
+    if threshold is not None and search_term and search_term.strip() and search_type in FUZZY_SEARCH_TYPES:
+        return _fuzzy_search(search_term.strip(), search_type, threshold)
+
+    # Retrieve all books from the database (the read replica if configured)
+    with replica_reads():
+        books = get_all_books()
 
     # Validate inputs
     if not search_term or not search_term.strip():
@@ -221,7 +425,7 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
 
     for book in books:
         # Defensive: skip malformed records
-        if not isinstance(book, dict):
+        if not isinstance(book, Mapping):
             continue
 
         if search_type == 'title' and search_term in book.get('title', '').lower():
@@ -233,6 +437,57 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
 
     return results
 
+def _fuzzy_search(search_term: str, search_type: str, threshold: float) -> List[Book]:
+    if not 0 < threshold <= 1:
+        return []
+    with replica_reads():
+        candidates = get_trigram_candidates(search_type, search_term, threshold)
+    query_trigrams = text_trigrams(search_term)
+    scored = []
+    for book in candidates:
+        score = query_similarity(query_trigrams, book[search_type])
+        if score >= threshold:
+            scored.append((score, book))
+    scored.sort(key=lambda pair: (-pair[0], pair[1]['title']))
+    return [book for _, book in scored]
+
+def filter_catalog(title: Optional[str] = None, author: Optional[str] = None,
+                   isbn: Optional[str] = None, available_only: bool = False,
+                   sort: str = 'title', limit: int = CATALOG_PAGE_SIZE, offset: int = 0,
+                   fields: Optional[List[str]] = None) -> Dict:
+    """
+    Search the catalog by any combination of title, author, ISBN and availability.
+
+    Args:
+        title: Part of the title (case-insensitive)
+        author: Part of the author's name (case-insensitive)
+        isbn: Exact ISBN
+        available_only: Only books with a copy on the shelf
+        sort: One of 'title', 'author' or 'availability'
+        limit: Results per page (at most MAX_CATALOG_PAGE_SIZE)
+        offset: Results to skip
+        fields: Book fields to return (default: all)
+
+    Returns:
+        Dict containing:
+            - books (list of Book, one page)
+            - total (int, all matches)
+            - facets (availability counts and top authors)
+            - status (str)
+    """
+    if sort not in CATALOG_SORTS:
+        return {"books": [], "total": 0, "facets": {}, "status": "Invalid sort option."}
+    if limit < 1 or offset < 0:
+        return {"books": [], "total": 0, "facets": {}, "status": "Invalid page."}
+    if fields is not None and (not fields or not set(fields) <= Book._field_set):
+        return {"books": [], "total": 0, "facets": {}, "status": "Invalid fields."}
+
+    result = search_catalog(title.strip() if title else None, author.strip() if author else None,
+                            isbn.strip() if isbn else None, available_only, sort,
+                            min(limit, MAX_CATALOG_PAGE_SIZE), offset, fields)
+    result["status"] = "Search completed successfully."
+    return result
+
 def get_patron_status_report(patron_id: str) -> Dict:
     """
     Generate a status report for a patron.
@@ -260,7 +515,17 @@ def get_patron_status_report(patron_id: str) -> Dict:
             "status": "Invalid patron ID."
         }
 
-    borrowed_books = get_patron_borrowed_books(patron_id)
+    with replica_reads():
+        borrowed_books = get_patron_borrowed_books(patron_id)
+    return build_patron_status_report(patron_id, borrowed_books, datetime.now())
+
+def build_patron_status_report(patron_id: str, borrowed_books: List, now: datetime) -> Dict:
+    """
+    Build a patron's status report from their already loaded open loans.
+
+    Shared by get_patron_status_report and the batch report runner, which
+    loads the loans of many patrons at once.
+    """
     if not borrowed_books:
         return {
             "patron_id": patron_id,
@@ -275,8 +540,9 @@ def get_patron_status_report(patron_id: str) -> Dict:
     overdue_count = 0
     detailed_books = []
 
-    for record in borrowed_books:
-        fee_info = calculate_late_fee_for_book(patron_id, record['book_id'])
+    # Fees come from the loans passed in rather than re-querying the
+    # patron's loans once per book
+    for record, fee_info in zip(borrowed_books, late_fees_for_records(borrowed_books, now)):
         fee = fee_info['fee_amount']
         total_late_fees += fee
         if fee_info['days_overdue'] > 0:
@@ -354,6 +620,9 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         )
         
         if success:
+            record_patron_payment(patron_id, fee_amount, datetime.now())
+            record_event('fee_paid', patron_id, book_id, amount=fee_amount,
+                         transaction_id=transaction_id)
             return True, f"Payment successful! {message}", transaction_id
         else:
             return False, f"Payment failed: {message}", None
@@ -0,0 +1,173 @@
+"""
+Notice Service Module - Overdue and due-soon notices
+
+A daily run walks patrons with open loans that are overdue or due within
+``DUE_SOON_DAYS``, in patron ID order and ``batch_size`` patrons at a time.
+Each patron gets one notice rendered from ``templates/notices``, and every
+batch of notices is queued in the outbox together with the run's
+checkpoint, so a run over millions of loans can stop at any point and pick
+up where it left off. Delivery is separate: ``deliver_notices`` hands
+pending notices to a sender and records the outcome, retrying failures on
+later calls up to ``MAX_SEND_ATTEMPTS`` times.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader
+
+from database import (
+    get_notice_patrons_batch, get_notice_loans, get_notice_run, save_notice_batch,
+    get_pending_notices, mark_notice_sent, mark_notice_failed
+)
+from services.library_service import late_fee_for_record
+from scheduler import check_lease
+
+# Loans due within this many days get a reminder
+DUE_SOON_DAYS = 2
+# Patrons per outbox transaction
+NOTICE_BATCH_SIZE = 500
+# Failed deliveries are retried until a notice has been tried this often
+MAX_SEND_ATTEMPTS = 5
+DEFAULT_SPOOL_DIR = 'notices'
+
+_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'templates', 'notices')
+_templates = Environment(loader=FileSystemLoader(_TEMPLATE_DIR), trim_blocks=True, lstrip_blocks=True)
+
+
+class NoticeSender:
+    """
+    Delivers notices from the outbox.
+
+    Subclasses implement send() for a delivery channel (email, SMS, ...).
+    """
+
+    def send(self, notice: Dict) -> None:
+        """
+        Deliver one notice.
+
+        Args:
+            notice: Outbox entry with id, run_date, patron_id, subject and body
+
+        Raises:
+            Exception: If delivery failed; the notice is retried later
+        """
+        raise NotImplementedError
+
+
+class FileSender(NoticeSender):
+    """Writes each notice to its own file in a spool directory."""
+
+    def __init__(self, spool_dir: str = DEFAULT_SPOOL_DIR):
+        self.spool_dir = spool_dir
+
+    def send(self, notice: Dict) -> None:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{notice['run_date']}-{notice['patron_id']}-{notice['id']}.txt")
+        temp_path = f'{path}.partial'
+        with open(temp_path, 'w') as f:
+            f.write(f"Subject: {notice['subject']}\n\n{notice['body']}")
+        os.replace(temp_path, path)
+
+
+def render_notice(patron_id: str, loans: List[Dict], as_of: datetime) -> Tuple[str, str]:
+    """
+    Render a patron's notice for the given overdue and due-soon loans.
+
+    Returns:
+        Tuple of (subject, body)
+    """
+    overdue = []
+    due_soon = []
+    for loan in loans:
+        if loan['due_date'] < as_of:
+            overdue.append(dict(loan, **late_fee_for_record(loan, as_of)))
+        else:
+            due_soon.append(loan)
+
+    parts = []
+    if overdue:
+        parts.append(f'{len(overdue)} overdue')
+    if due_soon:
+        parts.append(f'{len(due_soon)} due soon')
+    subject = f"Library notice: {' and '.join(parts)}"
+    body = _templates.get_template('overdue_notice.txt').render(
+        patron_id=patron_id, as_of=as_of, overdue=overdue, due_soon=due_soon,
+        total_fees=sum(loan['fee_amount'] for loan in overdue)
+    )
+    return subject, body
+
+
+def queue_overdue_notices(as_of: Optional[datetime] = None,
+                          batch_size: int = NOTICE_BATCH_SIZE) -> int:
+    """
+    Queue the day's notices for every patron with overdue or due-soon loans.
+
+    Runs are keyed by date: calling this again on the same day resumes an
+    interrupted run and does nothing once the run has completed.
+
+    Returns:
+        int: Number of notices queued by this call
+    """
+    as_of = as_of or datetime.now()
+    run_date = as_of.date().isoformat()
+    due_before = as_of + timedelta(days=DUE_SOON_DAYS)
+
+    run = get_notice_run(run_date)
+    if run and run['completed']:
+        return 0
+    after = run['last_patron_id'] if run else ''
+    queued = 0
+
+    while True:
+        check_lease()
+        patron_ids = get_notice_patrons_batch(after, due_before, batch_size)
+        done = len(patron_ids) < batch_size
+        loans_by_patron = {patron_id: [] for patron_id in patron_ids}
+        for loan in get_notice_loans(patron_ids, due_before):
+            loans_by_patron[loan['patron_id']].append(loan)
+
+        notices = [(patron_id, *render_notice(patron_id, loans, as_of))
+                   for patron_id, loans in loans_by_patron.items()]
+        if patron_ids:
+            after = patron_ids[-1]
+        if not save_notice_batch(run_date, notices, after, as_of, completed=done):
+            raise RuntimeError(f'Failed to queue notices for run {run_date}')
+        queued += len(notices)
+        if done:
+            return queued
+
+
+def deliver_notices(sender: Optional[NoticeSender] = None, batch_size: int = 100,
+                    now: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Hand pending notices to a sender until the outbox is drained.
+
+    Notices failing in this call are not retried until the next one.
+
+    Args:
+        sender: Delivery channel (defaults to a FileSender on DEFAULT_SPOOL_DIR)
+
+    Returns:
+        Tuple of (sent, failed) counts
+    """
+    sender = sender or FileSender()
+    sent = failed = 0
+    after_id = 0
+    while True:
+        check_lease()
+        notices = get_pending_notices(after_id, batch_size, MAX_SEND_ATTEMPTS)
+        if not notices:
+            return sent, failed
+        for notice in notices:
+            try:
+                sender.send(notice)
+            except Exception as e:
+                mark_notice_failed(notice['id'], str(e))
+                failed += 1
+                continue
+            mark_notice_sent(notice['id'], now or datetime.now())
+            sent += 1
+        after_id = notices[-1]['id']
@@ -0,0 +1,71 @@
+"""
+Overdue Service Module - Materialized overdue state and fee accrual
+
+A scheduled job computes the overdue status and late fee of every open loan
+once and stores them in ``loan_fees``, so fee lookups become a single
+indexed read instead of loading and evaluating a patron's loans each time.
+"""
+
+from datetime import datetime
+from typing import Optional
+from database import (
+    get_open_loans_batch, save_loan_fees, delete_stale_loan_fees, to_epoch, from_epoch
+)
+from services.library_service import late_fees_for_records
+from scheduler import check_lease
+
+SECONDS_PER_DAY = 86400
+
+def fee_valid_until(due_date: datetime, as_of: datetime, days_overdue: int) -> datetime:
+    """
+    Get the moment a fee computed as_of stops being correct.
+
+    Before the due date that is the due date itself; afterwards the fee
+    changes each time another full day has passed.
+    """
+    due_ts = to_epoch(due_date)
+    if to_epoch(as_of) < due_ts:
+        return from_epoch(due_ts)
+    return from_epoch(due_ts + (days_overdue + 1) * SECONDS_PER_DAY)
+
+def refresh_loan_fees(as_of: Optional[datetime] = None, batch_size: int = 500) -> int:
+    """
+    Materialize overdue state and fees for every open loan.
+
+    Loans are processed in ID order, one transaction per batch, and
+    entries for loans that are no longer open are removed afterwards.
+
+    Args:
+        as_of: Time to compute fees at (defaults to now)
+        batch_size: Loans per transaction
+
+    Returns:
+        int: Number of loans refreshed
+    """
+    as_of = as_of or datetime.now()
+    refreshed = 0
+    after_id = 0
+
+    while True:
+        check_lease()
+        loans = get_open_loans_batch(after_id, batch_size)
+        if not loans:
+            break
+
+        rows = []
+        for loan, fee_info in zip(loans, late_fees_for_records(loans, as_of)):
+            is_overdue = as_of > loan['due_date']
+            rows.append((
+                loan['id'], loan['patron_id'], loan['book_id'], is_overdue,
+                fee_info['days_overdue'], fee_info['fee_amount'],
+                fee_valid_until(loan['due_date'], as_of, fee_info['days_overdue'])
+            ))
+
+        if not save_loan_fees(rows, as_of):
+            raise RuntimeError(f'Failed to save loan fees after loan {after_id}')
+        refreshed += len(rows)
+        after_id = loans[-1]['id']
+
+    # Anything not touched by this run belongs to a loan that was closed
+    delete_stale_loan_fees(as_of)
+    return refreshed
@@ -0,0 +1,174 @@
+"""
+Patron Summary Service Module - Materialized per-patron status
+
+Serves a patron's loan and fee totals from the ``patron_summary`` table in
+one primary-key read. Loan and payment writes keep the counters current;
+overdue figures are recomputed from the patron's loans only once they
+expire, either on read or by the periodic refresher.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from database import (
+    get_patron_borrowed_books, get_patron_summary, save_patron_summary,
+    get_stale_patron_ids, get_patron_ids_batch
+)
+from services.library_service import late_fee_for_record
+from services.overdue_service import fee_valid_until
+from scheduler import check_lease
+
+def compute_patron_summary(patron_id: str, now: datetime) -> Dict:
+    """
+    Compute a patron's summary figures from their open loans.
+
+    Returns:
+        dict: open_loans, overdue_count, accrued_fees and valid_until
+              (None if no figure can change over time)
+    """
+    loans = get_patron_borrowed_books(patron_id)
+    overdue_count = 0
+    accrued_fees = 0.0
+    valid_until = None
+
+    for loan in loans:
+        fee_info = late_fee_for_record(loan, now)
+        accrued_fees += fee_info['fee_amount']
+        if fee_info['days_overdue'] > 0:
+            overdue_count += 1
+        loan_valid_until = fee_valid_until(loan['due_date'], now, fee_info['days_overdue'])
+        if valid_until is None or loan_valid_until < valid_until:
+            valid_until = loan_valid_until
+
+    return {
+        'open_loans': len(loans),
+        'overdue_count': overdue_count,
+        'accrued_fees': round(accrued_fees, 2),
+        'valid_until': valid_until
+    }
+
+def refresh_patron_summary(patron_id: str, now: Optional[datetime] = None) -> Dict:
+    """
+    Recompute and store a patron's summary.
+
+    Returns:
+        dict: The recomputed summary row
+    """
+    now = now or datetime.now()
+    current = get_patron_summary(patron_id)
+    computed = compute_patron_summary(patron_id, now)
+    # If a borrow/return/payment landed meanwhile the save is skipped and
+    # the row stays stale, so the next read recomputes again
+    save_patron_summary(patron_id, computed['open_loans'], computed['overdue_count'],
+                        computed['accrued_fees'], computed['valid_until'], now,
+                        current['version'] if current else 0)
+    return get_patron_summary(patron_id) or {
+        'patron_id': patron_id, 'fees_paid': 0.0, 'last_activity': None,
+        'refreshed_at': now, **computed
+    }
+
+def _is_current(summary: Dict, now: datetime) -> bool:
+    return summary['valid_until'] is None or summary['valid_until'] > now
+
+def get_patron_summary_report(patron_id: str) -> Dict:
+    """
+    Get a patron's status totals from the materialized summary.
+
+    Args:
+        patron_id (str): 6-digit library card ID.
+
+    Returns:
+        Dict containing:
+            - patron_id
+            - open_loans (int)
+            - overdue_count (int)
+            - accrued_fees (float)
+            - fees_paid (float)
+            - last_activity (datetime or None)
+            - refreshed_at (datetime or None)
+            - status (str)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return {
+            "patron_id": patron_id,
+            "open_loans": 0,
+            "overdue_count": 0,
+            "accrued_fees": 0.0,
+            "fees_paid": 0.0,
+            "last_activity": None,
+            "refreshed_at": None,
+            "status": "Invalid patron ID."
+        }
+
+    now = datetime.now()
+    summary = get_patron_summary(patron_id)
+    if summary is None or not _is_current(summary, now):
+        summary = refresh_patron_summary(patron_id, now)
+
+    return {
+        "patron_id": patron_id,
+        "open_loans": summary['open_loans'],
+        "overdue_count": summary['overdue_count'],
+        "accrued_fees": summary['accrued_fees'],
+        "fees_paid": summary['fees_paid'],
+        "last_activity": summary['last_activity'],
+        "refreshed_at": summary['refreshed_at'],
+        "status": "Summary generated successfully."
+    }
+
+def refresh_stale_patron_summaries(horizon: timedelta = timedelta(hours=1),
+                                   batch_size: int = 500) -> int:
+    """
+    Recompute every summary that is stale or will expire within horizon.
+
+    Run periodically so status reads rarely have to recompute.
+
+    Returns:
+        int: Number of patrons refreshed
+    """
+    now = datetime.now()
+    refreshed = 0
+    after = ''
+    while True:
+        check_lease()
+        patron_ids = get_stale_patron_ids(now + horizon, after, batch_size)
+        if not patron_ids:
+            break
+        for patron_id in patron_ids:
+            refresh_patron_summary(patron_id, now)
+        refreshed += len(patron_ids)
+        after = patron_ids[-1]
+    return refreshed
+
+def check_patron_summaries(batch_size: int = 500) -> List[Dict]:
+    """
+    Compare every current summary row against a full recompute from loans.
+
+    Stale rows are skipped since readers recompute them anyway.
+
+    Returns:
+        List[Dict]: One entry per mismatching patron with the stored and
+                    expected figures
+    """
+    now = datetime.now()
+    mismatches = []
+    after = ''
+    while True:
+        patron_ids = get_patron_ids_batch(after, batch_size)
+        if not patron_ids:
+            break
+        for patron_id in patron_ids:
+            stored = get_patron_summary(patron_id)
+            expected = compute_patron_summary(patron_id, now)
+            if stored is None:
+                if expected['open_loans']:
+                    mismatches.append({'patron_id': patron_id, 'stored': None, 'expected': expected})
+                continue
+            if stored['open_loans'] != expected['open_loans'] or (
+                _is_current(stored, now) and (
+                    stored['overdue_count'] != expected['overdue_count']
+                    or abs(stored['accrued_fees'] - expected['accrued_fees']) > 0.005
+                )
+            ):
+                mismatches.append({'patron_id': patron_id, 'stored': stored, 'expected': expected})
+        after = patron_ids[-1]
+    return mismatches
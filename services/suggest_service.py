@@ -0,0 +1,134 @@
+"""
+Suggest Service Module - Typeahead suggestions from an in-memory prefix index
+
+Normalized titles, authors and ISBNs are kept in a sorted list, together
+with every word-start suffix so "gats" finds "The Great Gatsby". A lookup is
+a bisect followed by a short scan of the matching range. The index is built
+once per database and rebuilt lazily when the catalog version changes,
+which is checked at most once every VERSION_CHECK_INTERVAL seconds.
+"""
+
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+import database
+from database import get_all_books, get_catalog_version
+
+# Suggestions returned by default and at most
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+# Seconds between catalog version checks; new books appear after at most this long
+VERSION_CHECK_INTERVAL = 1.0
+# Index entries examined per lookup, relative to the number requested
+SCAN_FACTOR = 20
+
+_NON_WORD_RE = re.compile(r'[^\w]+|_')
+_ISBN_PREFIX_RE = re.compile(r'[\d\- ]+')
+_ISBN_SEPARATORS_RE = re.compile(r'[\- ]')
+_FIELDS = (None, 'title', 'author', 'isbn')
+
+
+def normalize(text: str) -> str:
+    """Lower-case text and reduce punctuation and whitespace runs to single spaces."""
+    return _NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+class PrefixIndex:
+    """
+    Sorted keys with their books, searchable by prefix.
+
+    Each key is a normalized value or one of its word-start suffixes; keys
+    starting at the beginning of a value rank ahead of mid-value matches.
+    Entries are packed into ints (book position, field, mid-value flag) so
+    a large catalog costs little more than the key strings themselves.
+    """
+
+    def __init__(self, books: List):
+        self.books = [(book['id'], book['title'], book['author'], book['isbn']) for book in books]
+        entries = []
+        for pos, (_, title, author, isbn) in enumerate(self.books):
+            for field, value in ((1, title), (2, author)):
+                key = normalize(value)
+                ref = pos << 3 | field << 1
+                entries.append((key, ref))
+                for match in re.finditer(' ', key):
+                    entries.append((key[match.end():], ref | 1))
+            entries.append((_ISBN_SEPARATORS_RE.sub('', isbn), pos << 3 | 3 << 1))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.refs = array('q', (ref for _, ref in entries))
+
+    def search(self, prefix: str, k: int) -> List[Dict]:
+        """Get up to k suggestions whose value (or a word in it) starts with prefix."""
+        if _ISBN_PREFIX_RE.fullmatch(prefix):
+            prefix = _ISBN_SEPARATORS_RE.sub('', prefix)
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        end = min(start + k * SCAN_FACTOR, len(self.keys))
+        matches = []
+        for i in range(start, end):
+            if not self.keys[i].startswith(prefix):
+                break
+            matches.append((self.refs[i] & 1, i))
+        # Whole-value matches first, then alphabetical by key
+        matches.sort()
+
+        suggestions = []
+        seen = set()
+        for _, i in matches:
+            ref = self.refs[i] >> 1
+            if ref in seen:
+                continue
+            seen.add(ref)
+            book = self.books[ref >> 2]
+            field = ref & 3
+            suggestions.append({'book_id': book[0], 'field': _FIELDS[field], 'text': book[field]})
+            if len(suggestions) == k:
+                break
+        return suggestions
+
+
+# Index, catalog version and last check time per database path
+_indexes: Dict[str, Tuple[PrefixIndex, int, float]] = {}
+_index_lock = threading.Lock()
+
+
+def _get_index() -> PrefixIndex:
+    path = database.DATABASE
+    cached = _indexes.get(path)
+    now = time.monotonic()
+    if cached and now - cached[2] < VERSION_CHECK_INTERVAL:
+        return cached[0]
+
+    with _index_lock:
+        cached = _indexes.get(path)
+        version = get_catalog_version()
+        if cached and cached[1] == version:
+            _indexes[path] = (cached[0], version, now)
+            return cached[0]
+        index = PrefixIndex(get_all_books())
+        _indexes[path] = (index, version, now)
+        return index
+
+
+def suggest_books(prefix: str, k: Optional[int] = None) -> List[Dict]:
+    """
+    Get typeahead suggestions for a partly typed title, author or ISBN.
+
+    Args:
+        prefix: Text typed so far
+        k: Number of suggestions (default DEFAULT_SUGGESTIONS, at most MAX_SUGGESTIONS)
+
+    Returns:
+        List[Dict]: book_id, field ('title', 'author' or 'isbn') and text
+    """
+    if not prefix or not prefix.strip():
+        return []
+    k = min(max(k or DEFAULT_SUGGESTIONS, 1), MAX_SUGGESTIONS)
+    return _get_index().search(prefix, k)
@@ -0,0 +1,88 @@
+import os
+import shutil
+import threading
+import pytest
+import database
+from database import (
+    init_database, insert_book, get_book_by_isbn, get_book_availability, update_book_availability,
+    get_patron_borrow_count
+)
+from availability_counters import AvailabilityCounters, start_write_behind, stop_write_behind
+from services.library_service import borrow_book_by_patron
+
+@pytest.fixture
+def book_id(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Launch Title", "Author", "9780000000001", 10, 10)
+    yield get_book_by_isbn("9780000000001").id
+    stop_write_behind()
+
+def _run_concurrently(count, func):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        results[i] = func(i)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+# verify concurrent borrows never take more copies than exist, with flushes running alongside
+def test_no_overselling_under_contention(book_id, tmp_path):
+    counters = start_write_behind(str(tmp_path / "intents"), stripes=4, flush_interval=0.001)
+    results = _run_concurrently(40, lambda i: update_book_availability(book_id, -1))
+    assert results.count(True) == 10
+    assert counters.available(book_id) == 0
+
+    # returns free copies for later borrows
+    assert update_book_availability(book_id, +1)
+    assert update_book_availability(book_id, -1)
+    assert not update_book_availability(book_id, -1)
+
+    stop_write_behind()
+    availability = get_book_availability(book_id)
+    assert availability["available_copies"] == 0
+    assert availability["branches"][0]["available_copies"] == 0
+    assert os.listdir(tmp_path / "intents") == []
+
+# verify patrons racing for a hot title get exactly one loan per copy
+def test_concurrent_patron_borrows(book_id, tmp_path):
+    start_write_behind(str(tmp_path / "intents"), flush_interval=0.001)
+    results = _run_concurrently(25, lambda i: borrow_book_by_patron(f"{100000 + i}", book_id)[0])
+    stop_write_behind()
+    assert results.count(True) == 10
+    assert sum(get_patron_borrow_count(f"{100000 + i}") for i in range(25)) == 10
+    assert get_book_by_isbn("9780000000001").available_copies == 0
+
+# verify changes logged but never flushed are replayed exactly once after a crash
+def test_intents_replayed_after_crash(book_id, tmp_path):
+    log_dir = str(tmp_path / "intents")
+    crashed = AvailabilityCounters(log_dir)
+    assert crashed.adjust(book_id, -1) and crashed.adjust(book_id, -1) and crashed.adjust(book_id, +1)
+    assert get_book_by_isbn("9780000000001").available_copies == 10
+
+    AvailabilityCounters(log_dir)
+    assert get_book_by_isbn("9780000000001").available_copies == 9
+    AvailabilityCounters(log_dir)
+    assert get_book_by_isbn("9780000000001").available_copies == 9
+
+# verify a log left behind after its flush committed is not applied again
+def test_flushed_intents_not_replayed(book_id, tmp_path):
+    log_dir = tmp_path / "intents"
+    counters = AvailabilityCounters(str(log_dir))
+    assert counters.adjust(book_id, -3)
+    kept = tmp_path / "kept"
+    shutil.copytree(log_dir, kept)
+    assert counters.flush() == 1
+    assert get_book_by_isbn("9780000000001").available_copies == 7
+
+    shutil.rmtree(log_dir)
+    shutil.copytree(kept, log_dir)
+    AvailabilityCounters(str(log_dir))
+    assert get_book_by_isbn("9780000000001").available_copies == 7
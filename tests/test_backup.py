@@ -0,0 +1,87 @@
+import pytest
+import sqlite3
+import threading
+import time
+from database import init_database, get_db_connection, get_all_books, insert_book
+from backup import BackupError, create_backup, list_backups, restore_backup, rotate_backups, verify_backup
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+def _setup_db(tmp_path, monkeypatch, books=1):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    conn = get_db_connection()
+    conn.executemany(
+        "INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 5, 5)",
+        [(f"Book {i} " + "x" * 150, "Author K", f"{9780000000000 + i}") for i in range(books)]
+    )
+    conn.commit()
+    conn.close()
+
+# verify a throttled backup taken under borrow/return load is intact and does not stall requests
+def test_backup_during_concurrent_load(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch, books=3000)
+    stop = threading.Event()
+    latencies = []
+    failures = []
+
+    def patron_loop(patron_id, book_id):
+        while not stop.is_set():
+            for action in (borrow_book_by_patron, return_book_by_patron):
+                start = time.perf_counter()
+                success, message = action(patron_id, book_id)
+                latencies.append(time.perf_counter() - start)
+                if not success:
+                    failures.append(message)
+
+    workers = [threading.Thread(target=patron_loop, args=(f"{100000 + i}", i + 1)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    try:
+        time.sleep(0.2)
+        path = create_backup(str(tmp_path / "backups"), pages=20, pause=0.002)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    assert verify_backup(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 3000
+    conn.close()
+    assert failures == []
+    assert latencies
+    # nothing waited anywhere near sqlite's 5 second lock timeout
+    assert max(latencies) < 1.0
+
+# verify rotation keeps only the newest snapshots
+def test_rotation_keeps_newest(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    backup_dir = str(tmp_path / "backups")
+    paths = [create_backup(backup_dir, keep=None) for _ in range(4)]
+
+    assert rotate_backups(backup_dir, keep=2) == paths[:2]
+    assert list_backups(backup_dir) == paths[2:]
+    create_backup(backup_dir, keep=2)
+    assert len(list_backups(backup_dir)) == 2
+
+# verify a snapshot can be restored into the live database
+def test_restore_backup(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch, books=2)
+    path = create_backup(str(tmp_path / "backups"))
+    insert_book("After Backup", "Author K", "9781111111111", 1, 1)
+    assert len(get_all_books()) == 3
+
+    restore_backup(path)
+    assert len(get_all_books()) == 2
+
+# verify damaged snapshots are rejected
+def test_restore_rejects_corrupt_backup(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    corrupt = tmp_path / "library-corrupt.db"
+    corrupt.write_bytes(b"not a database" * 100)
+
+    assert verify_backup(str(corrupt)) is False
+    with pytest.raises(BackupError):
+        restore_backup(str(corrupt))
+    assert len(get_all_books()) == 1
@@ -58,3 +58,29 @@ def test_borrow_book_not_found(tmp_path, monkeypatch):
     assert success is False
     assert "not found" in message.lower()
 
+
+# verify concurrent borrows of a book's last copy lend it only once
+def test_concurrent_borrows_do_not_oversell(tmp_path, monkeypatch):
+    import threading
+    from database import insert_book, get_book_by_id, update_book_availability
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Last Copy", "Author Z", str(random.randint(1000000000000, 9999999999999)), 1, 1)
+
+    barrier = threading.Barrier(10)
+    results = []
+
+    def borrow(i):
+        barrier.wait()
+        results.append(borrow_book_by_patron(f"{200000 + i}", 1)[0])
+    threads = [threading.Thread(target=borrow, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+    assert get_book_by_id(1)["available_copies"] == 0
+    assert update_book_availability(1, -1) is False
+    assert get_book_by_id(1)["available_copies"] == 0
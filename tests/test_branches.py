@@ -0,0 +1,124 @@
+import sqlite3
+import pytest
+import database
+from database import (
+    init_database, insert_book, get_book_by_isbn, add_branch, add_branch_copies,
+    get_book_availability, update_book_availability
+)
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+from app import create_app
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Branch Book", "Author", "9780000000001", 2, 2)
+    return get_book_by_isbn("9780000000001").id
+
+def _copies(availability):
+    return {b["branch_id"]: (b["total_copies"], b["available_copies"]) for b in availability["branches"]}
+
+# verify new books are stocked at the default branch and copies added elsewhere roll up
+def test_branch_copies_roll_up(fresh_db):
+    assert add_branch("east", "East Branch")
+    assert add_branch_copies(fresh_db, "east", 3)
+    availability = get_book_availability(fresh_db)
+    assert (availability["total_copies"], availability["available_copies"]) == (5, 5)
+    assert _copies(availability) == {"main": (2, 2), "east": (3, 3)}
+    assert not add_branch_copies(fresh_db, "nowhere", 1)
+    assert get_book_availability(999) is None
+
+# verify a branch's last copy can only be borrowed once and returns go back to the branch
+def test_borrow_and_return_at_branch(fresh_db):
+    add_branch("east", "East Branch")
+    add_branch_copies(fresh_db, "east", 1)
+    assert borrow_book_by_patron("123456", fresh_db, "east")[0]
+    success, message = borrow_book_by_patron("654321", fresh_db, "east")
+    assert not success and "at this branch" in message
+    assert _copies(get_book_availability(fresh_db))["east"] == (1, 0)
+    assert get_book_availability(fresh_db)["available_copies"] == 2
+
+    assert not borrow_book_by_patron("654321", fresh_db, "west")[0]
+    assert return_book_by_patron("123456", fresh_db, "east")[0]
+    assert _copies(get_book_availability(fresh_db))["east"] == (1, 1)
+
+# verify borrowing without a branch keeps the default branch in step
+def test_unbranched_borrow_uses_default_branch(fresh_db):
+    assert borrow_book_by_patron("123456", fresh_db)[0]
+    availability = get_book_availability(fresh_db)
+    assert availability["available_copies"] == 1
+    assert _copies(availability)["main"] == (2, 1)
+
+# verify a sharded branch keeps its inventory in its own file and still rolls up
+def test_sharded_branch(fresh_db, tmp_path):
+    assert add_branch("north", "North Branch", shard="branch_north.db")
+    assert add_branch_copies(fresh_db, "north", 2)
+    assert update_book_availability(fresh_db, -1, "north")
+    availability = get_book_availability(fresh_db)
+    assert _copies(availability)["north"] == (2, 1)
+    assert availability["available_copies"] == 3
+
+    shard = sqlite3.connect(str(tmp_path / "branch_north.db"))
+    assert shard.execute("SELECT available_copies FROM branch_inventory").fetchall() == [(1,)]
+    shard.close()
+    main = sqlite3.connect(database.DATABASE)
+    assert main.execute("SELECT COUNT(*) FROM branch_inventory WHERE branch_id = 'north'").fetchone()[0] == 0
+    main.close()
+
+    assert update_book_availability(fresh_db, -1, "north")
+    assert not update_book_availability(fresh_db, -1, "north")
+    assert get_book_availability(fresh_db)["available_copies"] == 2
+
+# verify the availability endpoint reports the per-branch breakdown
+def test_availability_api(fresh_db, monkeypatch):
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    client = create_app().test_client()
+    response = client.get(f"/api/books/{fresh_db}/availability")
+    assert response.status_code == 200
+    assert response.get_json()["branches"] == [{"branch_id": "main", "total_copies": 2, "available_copies": 2}]
+    assert client.get("/api/books/999/availability").status_code == 404
+
+# verify a change the default branches cannot take leaves the catalog-wide count alone
+def test_unbranched_change_fails_without_branch_room(fresh_db):
+    assert not update_book_availability(fresh_db, +1)
+    availability = get_book_availability(fresh_db)
+    assert availability["available_copies"] == 2
+    assert _copies(availability)["main"] == (2, 2)
+
+# verify borrowing at a sharded branch works inside a request's unit of work
+def test_sharded_branch_in_unit_of_work(fresh_db, monkeypatch):
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    monkeypatch.setattr("database.REQUEST_UNIT_OF_WORK", True)
+    add_branch("east", "East Branch", shard="branch_east.db")
+    add_branch_copies(fresh_db, "east", 1)
+    app = create_app()
+    client = app.test_client()
+    response = client.post("/borrow", data={"patron_id": "123456", "book_id": fresh_db, "branch_id": "east"})
+    assert response.status_code == 302
+    availability = get_book_availability(fresh_db)
+    assert _copies(availability)["east"] == (1, 0)
+    assert availability["available_copies"] == 2
+
+# verify a return to a branch that does not stock the book goes back to the loan's branch
+def test_return_to_unstocked_branch_falls_back(fresh_db):
+    add_branch("east", "East Branch")
+    assert borrow_book_by_patron("123456", fresh_db)[0]
+    assert return_book_by_patron("123456", fresh_db, "east")[0]
+    availability = get_book_availability(fresh_db)
+    assert availability["available_copies"] == 2
+    assert _copies(availability) == {"main": (2, 2)}
+    assert borrow_book_by_patron("654321", fresh_db)[0]
+
+# verify a return no branch can take leaves the loan open and the counts untouched
+def test_failed_return_changes_nothing(fresh_db):
+    assert borrow_book_by_patron("123456", fresh_db)[0]
+    conn = sqlite3.connect(database.DATABASE)
+    conn.execute("UPDATE branch_inventory SET available_copies = total_copies")
+    conn.commit()
+    conn.close()
+    success, message = return_book_by_patron("123456", fresh_db)
+    assert not success and "Failed" in message
+    assert [loan["book_id"] for loan in database.get_patron_borrowed_books("123456")] == [fresh_db]
+    assert get_book_availability(fresh_db)["available_copies"] == 1
+    assert database.get_item_by_barcode(f"{fresh_db:07d}-0001")["status"] == "on_loan"
@@ -0,0 +1,72 @@
+import pytest
+import random
+from datetime import datetime, timedelta
+from database import (
+    init_database, get_book_by_id, insert_book, insert_borrow_record, get_patron_borrow_count,
+    get_patron_summary
+)
+from services.hold_service import place_hold, get_holds_for_patron
+from services.library_service import borrow_books_by_patron, return_books_by_patron
+
+def _setup_catalog(tmp_path, monkeypatch, copies):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    for i, available in enumerate(copies):
+        insert_book(f"Book {i + 1}", "Author B", str(random.randint(1000000000000, 9999999999999)),
+                    max(available, 1), available)
+
+# verify a batch borrows what it can and reports each book separately
+def test_borrow_batch_per_item_results(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch, [2, 0, 1])
+
+    success, message, results = borrow_books_by_patron("123456", [1, 2, 3, 99])
+    assert success is True
+    assert message == "Borrowed 2 of 4 books."
+    assert [r["success"] for r in results] == [True, False, True, False]
+    assert "not available" in results[1]["message"].lower()
+    assert "not found" in results[3]["message"].lower()
+    assert get_book_by_id(1)["available_copies"] == 1
+    assert get_book_by_id(3)["available_copies"] == 0
+    assert get_patron_borrow_count("123456") == 2
+    assert get_patron_summary("123456")["open_loans"] == 2
+
+# verify the borrowing limit applies across the whole batch
+def test_borrow_batch_enforces_limit(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch, [3] * 6)
+    insert_borrow_record("123456", 1, datetime.now(), datetime.now() + timedelta(days=14))
+    insert_borrow_record("123456", 2, datetime.now(), datetime.now() + timedelta(days=14))
+
+    success, _, results = borrow_books_by_patron("123456", [3, 4, 5, 6])
+    assert success is True
+    assert [r["success"] for r in results] == [True, True, True, False]
+    assert "maximum borrowing limit" in results[3]["message"].lower()
+    assert get_book_by_id(6)["available_copies"] == 3
+
+# verify invalid input is rejected before touching the database
+def test_batch_rejects_invalid_input(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch, [1])
+
+    assert borrow_books_by_patron("12ab56", [1])[:2] == (False, "Invalid patron ID. Must be exactly 6 digits.")
+    assert borrow_books_by_patron("123456", [])[0] is False
+    assert "at most" in borrow_books_by_patron("123456", list(range(1, 30)))[1].lower()
+    assert return_books_by_patron("123456", ["1"])[1] == "Book IDs must be integers."
+    assert get_book_by_id(1)["available_copies"] == 1
+
+# verify a batch return reshelves copies, serves holds and flags late returns
+def test_return_batch(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch, [0, 0])
+    insert_borrow_record("123456", 1, datetime.now() - timedelta(days=20), datetime.now() - timedelta(days=6))
+    insert_borrow_record("123456", 2, datetime.now() - timedelta(days=2), datetime.now() + timedelta(days=12))
+    place_hold("222222", 2)
+
+    success, message, results = return_books_by_patron("123456", [1, 2, 1])
+    assert success is True
+    assert message == "Returned 2 of 3 books."
+    assert "late by 6 days" in results[0]["message"].lower()
+    assert results[1]["message"] == "Returned successfully."
+    assert results[2]["success"] is False
+    assert get_book_by_id(1)["available_copies"] == 1
+    assert get_book_by_id(2)["available_copies"] == 0
+    assert get_holds_for_patron("222222")[0]["status"] == "ready"
+    assert get_patron_summary("123456")["open_loans"] == 0
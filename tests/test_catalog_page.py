@@ -0,0 +1,52 @@
+import pytest
+from database import insert_book, iter_all_books, update_book_availability
+from app import create_app
+import routes.catalog_routes as catalog_routes
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    monkeypatch.setattr(catalog_routes, "_row_cache", {})
+    app = create_app()
+    return app.test_client()
+
+# verify the streamed catalog lists every book in title order with borrow forms
+def test_catalog_streams_all_books(client, monkeypatch):
+    monkeypatch.setattr("routes.catalog_routes.iter_all_books", lambda: iter_all_books(batch_size=2))
+    for i, title in enumerate(["Delta", "Alpha", "Charlie", "Bravo", "<Echo>"]):
+        insert_book(title, "Author C", f"978000000000{i}", 1, 1)
+
+    response = client.get("/catalog")
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    positions = [html.index(f"<td>{t}</td>") for t in ["&lt;Echo&gt;", "Alpha", "Bravo", "Charlie", "Delta"]]
+    assert positions == sorted(positions)
+    assert html.count('name="patron_id"') == 5
+    assert html.count('action="/borrow"') == 5
+
+# verify rows are cached and re-rendered when copy counts change
+def test_row_cache_keyed_on_copies(client):
+    insert_book("Cached Book", "Author C", "9780000000001", 2, 2)
+    client.get("/catalog")
+    assert len(catalog_routes._row_cache) == 1
+    client.get("/catalog")
+    assert len(catalog_routes._row_cache) == 1
+
+    update_book_availability(1, -2)
+    html = client.get("/catalog").get_data(as_text=True)
+    assert len(catalog_routes._row_cache) == 2
+    assert "Not Available" in html
+    assert 'name="patron_id"' not in html
+
+# verify flash messages from a redirect show once and the empty state renders
+def test_flash_and_empty_catalog(client):
+    html = client.get("/catalog").get_data(as_text=True)
+    assert "No books in catalog" in html
+
+    response = client.post("/add_book", data={"title": "Flash Book", "author": "Author C",
+                                              "isbn": "9780000000002", "total_copies": "1"},
+                           follow_redirects=True)
+    assert "successfully added" in response.get_data(as_text=True)
+    assert "successfully added" not in client.get("/catalog").get_data(as_text=True)
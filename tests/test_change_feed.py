@@ -0,0 +1,95 @@
+import pytest
+import random
+import threading
+import time
+from app import create_app, create_scheduler
+from database import (
+    init_database, insert_book, update_book_availability, get_book_changes_since,
+    get_latest_book_change_seq, wait_for_book_changes, get_db_connection, prune_book_changes,
+    BOOK_CHANGE_RETENTION_DAYS
+)
+
+# verify inserts and availability updates append ordered changes with new counts
+def test_changes_logged_by_writes(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    insert_book("Feed Book", "Author F", str(random.randint(1000000000000, 9999999999999)), 2, 2)
+    update_book_availability(1, -1)
+    update_book_availability(1, -1)
+
+    changes = get_book_changes_since(0)
+    assert [c["change_type"] for c in changes] == ["added", "availability", "availability"]
+    assert [c["available_copies"] for c in changes] == [2, 1, 0]
+    assert get_book_changes_since(changes[0]["seq"])[0]["seq"] == changes[1]["seq"]
+    assert get_latest_book_change_seq() == changes[-1]["seq"]
+
+# verify long-poll returns as soon as another thread commits a change
+def test_wait_for_changes_wakes_on_write(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Feed Book", "Author F", str(random.randint(1000000000000, 9999999999999)), 2, 2)
+    cursor = get_latest_book_change_seq()
+
+    writer = threading.Timer(0.2, update_book_availability, args=(1, -1))
+    writer.start()
+    start = time.monotonic()
+    changes = wait_for_book_changes(cursor, timeout=5, poll_interval=5)
+    writer.join()
+
+    assert time.monotonic() - start < 2
+    assert len(changes) == 1
+    assert changes[0]["available_copies"] == 1
+    assert wait_for_book_changes(changes[0]["seq"], timeout=0.1) == []
+
+# verify the API returns only changes after the cursor
+def test_changes_api_cursor(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    client = create_app().test_client()
+
+    cursor = client.get("/api/changes").get_json()["cursor"]
+    update_book_availability(1, -1)
+
+    data = client.get(f"/api/changes?since={cursor}").get_json()
+    assert data["resync"] is False
+    assert len(data["changes"]) == 1
+    assert data["changes"][0]["book_id"] == 1
+    assert client.get(f"/api/changes?since={data['cursor']}").get_json()["changes"] == []
+    assert client.get("/api/changes?since=abc").status_code == 400
+
+# verify the event stream delivers changes after Last-Event-ID
+def test_changes_event_stream(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    client = create_app().test_client()
+    cursor = get_latest_book_change_seq()
+    update_book_availability(2, -1)
+
+    response = client.get("/api/changes/stream", headers={"Last-Event-ID": str(cursor)}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b"retry:")
+    event = next(chunks).decode()
+    response.close()
+    assert event.startswith(f"id: {cursor + 1}\nevent: availability\n")
+    assert '"book_id": 2' in event or '"book_id":2' in event
+
+# verify the daily job prunes only changes older than the retention period
+def test_prune_old_changes(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Feed Book", "Author F", str(random.randint(1000000000000, 9999999999999)), 2, 2)
+    update_book_availability(1, -1)
+    conn = get_db_connection()
+    conn.execute("UPDATE book_changes SET changed_ts = changed_ts - ? WHERE change_type = 'added'",
+                 ((BOOK_CHANGE_RETENTION_DAYS + 1) * 86400,))
+    conn.commit()
+    conn.close()
+
+    assert "prune_book_changes" in [job.name for job in create_scheduler().jobs]
+    assert prune_book_changes() == 1
+    assert [c["change_type"] for c in get_book_changes_since(0)] == ["availability"]
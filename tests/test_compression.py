@@ -0,0 +1,59 @@
+import gzip
+import json
+import pytest
+from datetime import datetime
+from database import insert_book
+from compression import choose_encoding
+from app import create_app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    app = create_app()
+    for i in range(40):
+        insert_book(f"Compressible Title {i:02d}", "Author Z", f"{9780000000000 + i}", 2, 1)
+    return app.test_client()
+
+# verify Accept-Encoding negotiation honours q-values
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("") is None
+
+# verify large JSON responses are gzipped and small ones are not
+def test_api_responses_compressed_above_threshold(client):
+    plain = client.get("/api/search?q=compressible")
+    response = client.get("/api/search?q=compressible", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(response.data) < len(plain.data) / 3
+    assert json.loads(gzip.decompress(response.data)) == plain.get_json()
+
+    small = client.get("/api/search?q=title 01", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    assert small.get_json()["count"] == 1
+
+# verify the streamed catalog page is compressed chunk by chunk
+def test_streamed_catalog_compressed(client):
+    response = client.get("/catalog", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Compressible Title 39" in gzip.decompress(response.data).decode()
+
+# verify field projection returns only the requested fields
+def test_field_projection(client):
+    data = client.get("/api/search?q=compressible&type=title&fields=title,isbn&limit=100").get_json()
+    assert data["total"] == 40
+    assert data["results"][0] == {"title": "Compressible Title 00", "isbn": "9780000000000"}
+    assert client.get("/api/search?fields=title,price").status_code == 400
+
+# verify the JSON encoder keeps Flask's formats for records and datetimes
+def test_json_encoding(client):
+    app = client.application
+    payload = {"when": datetime(2024, 1, 2, 3, 4, 5), "name": "Café"}
+    assert json.loads(app.json.dumps(payload)) == {"when": "Tue, 02 Jan 2024 03:04:05 GMT", "name": "Café"}
+    book = client.get("/api/search?q=title 05").get_json()["results"][0]
+    assert book["title"] == "Compressible Title 05"
+    assert set(book) == {"id", "title", "author", "isbn", "total_copies", "available_copies"}
@@ -0,0 +1,107 @@
+import pytest
+import random
+import time
+from app import create_app
+from database import init_database, get_events
+from event_log import EventLog, query_events
+from services.library_service import add_book_to_catalog, borrow_book_by_patron, return_book_by_patron
+
+def _setup_db(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+# verify service calls are recorded and can be queried by patron and type
+def test_services_record_events(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    isbn = str(random.randint(1000000000000, 9999999999999))
+    add_book_to_catalog("Audited Book", "Author E", isbn, 2)
+    borrow_book_by_patron("123456", 1)
+    return_book_by_patron("123456", 1)
+    borrow_book_by_patron("654321", 1)
+
+    events = query_events()
+    assert [e["event_type"] for e in events] == ["book_added", "borrow", "return", "borrow"]
+    assert events[0]["details"]["isbn"] == isbn
+
+    patron_events = query_events(patron_id="123456")
+    assert [e["event_type"] for e in patron_events] == ["borrow", "return"]
+    assert patron_events[1]["details"]["days_late"] == 0
+    assert query_events(event_type="borrow", after_id=events[1]["id"])[0]["patron_id"] == "654321"
+
+# verify the writer groups events into batches and flush waits for them
+def test_group_commit_and_flush(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    batches = []
+    import event_log
+    original = event_log.insert_events
+    monkeypatch.setattr(event_log, "insert_events",
+                        lambda events, path: batches.append(len(events)) or original(events, path))
+
+    log = EventLog(batch_size=50, flush_interval=5.0)
+    for i in range(120):
+        log.record("test", "123456", i)
+    assert log.flush(timeout=5) is True
+    assert sum(batches) == 120
+    assert max(batches) == 50
+    assert len(get_events(event_type="test", limit=500)) == 120
+    log.close()
+
+# verify a full queue holds callers back and still never loses events
+def test_full_queue_falls_back_to_direct_write(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    log = EventLog(max_pending=5, enqueue_timeout=0.01)
+    # no writer thread, so the queue fills up
+    monkeypatch.setattr(log, "_ensure_started", lambda: None)
+    for i in range(8):
+        log.record("overflow", None, i)
+    assert len(get_events(event_type="overflow")) == 3
+    log.close()
+    assert sorted(e["book_id"] for e in get_events(event_type="overflow")) == list(range(8))
+
+# verify events go to the database configured when they were recorded
+def test_events_keep_their_database(tmp_path, monkeypatch):
+    first = tmp_path / "first.db"
+    second = tmp_path / "second.db"
+    log = EventLog(flush_interval=5.0)
+    for path in (first, second):
+        monkeypatch.setattr("database.DATABASE", str(path))
+        init_database()
+        log.record("checkout", "111111", 1)
+    log.close()
+
+    monkeypatch.setattr("database.DATABASE", str(first))
+    assert len(get_events()) == 1
+
+# verify flush gives up after its timeout when a stalled writer leaves the queue full
+def test_flush_times_out_on_full_queue(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    log = EventLog(max_pending=2, enqueue_timeout=0.01)
+    monkeypatch.setattr(log, "_run", lambda: time.sleep(1))
+    for i in range(2):
+        log.record("stalled", None, i)
+    start = time.monotonic()
+    assert log.flush(timeout=0.1) is False
+    assert time.monotonic() - start < 0.5
+    log.close(timeout=0.1)
+    assert len(get_events(event_type="stalled")) == 2
+
+# verify a request's unit of work records events only when it commits
+def test_unit_of_work_events_follow_commit(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    monkeypatch.setattr("database.REQUEST_UNIT_OF_WORK", True)
+    app = create_app()
+
+    @app.route("/borrow_then_fail")
+    def borrow_then_fail():
+        borrow_book_by_patron("123456", 1)
+        raise RuntimeError("request failed after the borrow")
+
+    add_book_to_catalog("Audited Book", "Author E", str(random.randint(1000000000000, 9999999999999)), 2)
+    client = app.test_client()
+    assert client.get("/borrow_then_fail").status_code == 500
+    assert query_events(event_type="borrow") == []
+
+    assert client.post("/borrow", data={"patron_id": "123456", "book_id": 1}).status_code == 302
+    assert [e["patron_id"] for e in query_events(event_type="borrow")] == ["123456"]
@@ -0,0 +1,82 @@
+import pytest
+from database import init_database, insert_book, get_db_connection, index_unindexed_books
+from services.library_service import filter_catalog
+from app import create_app
+
+def _setup_catalog(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565", 2, 0)
+    insert_book("Tender Is the Night", "F. Scott Fitzgerald", "9780684801544", 1, 1)
+    insert_book("Great Expectations", "Charles Dickens", "9780141439563", 3, 2)
+    insert_book("Oliver Twist", "Charles Dickens", "9780141439747", 1, 0)
+
+# verify title and author filters combine and facets are counted
+def test_combined_filters_and_facets(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+
+    result = filter_catalog(title="great", author="dickens")
+    assert [b["title"] for b in result["books"]] == ["Great Expectations"]
+    assert result["total"] == 1
+
+    result = filter_catalog(title="great")
+    assert result["facets"]["availability"] == {"available": 1, "unavailable": 1}
+    assert {a["author"] for a in result["facets"]["authors"]} == {"Charles Dickens", "F. Scott Fitzgerald"}
+
+# verify the availability filter and facet counts ignore their own filter
+def test_available_only(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+
+    result = filter_catalog(available_only=True, sort="availability")
+    assert [b["title"] for b in result["books"]] == ["Great Expectations", "Tender Is the Night"]
+    assert result["facets"]["availability"] == {"available": 2, "unavailable": 2}
+    assert filter_catalog(isbn="9780141439747", available_only=True)["total"] == 0
+
+# verify sorting, paging and substring matches inside words
+def test_sort_and_paging(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+
+    result = filter_catalog(sort="author", limit=2, offset=1)
+    assert [b["title"] for b in result["books"]] == ["Oliver Twist", "Tender Is the Night"]
+    assert result["total"] == 4
+    assert [b["title"] for b in filter_catalog(title="ender is t")["books"]] == ["Tender Is the Night"]
+    assert filter_catalog(title="zzz")["books"] == []
+    assert filter_catalog(sort="price")["status"] == "Invalid sort option."
+
+# verify /api/search accepts field filters alongside q/type
+def test_api_filtered_search(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    client = create_app().test_client()
+
+    data = client.get("/api/search?q=great&type=title&available=1").get_json()
+    assert [b["title"] for b in data["results"]] == ["Great Expectations"]
+    assert data["facets"]["availability"]["unavailable"] == 1
+    assert client.get("/api/search?author=dickens&sort=bogus").status_code == 400
+    assert client.get("/api/search?q=gatsby").get_json()["count"] == 1
+
+# verify books missing from the trigram index are still found by substring
+def test_unindexed_books_still_match(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    conn = get_db_connection()
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Animal Farm', 'George Orwell', '9780451526342', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    assert [b["title"] for b in filter_catalog(author="orwell")["books"]] == ["Animal Farm"]
+    assert filter_catalog(title="great")["total"] == 2
+
+    conn = get_db_connection()
+    index_unindexed_books(conn)
+    assert conn.execute("SELECT COUNT(*) FROM book_trigram_pending").fetchone()[0] == 0
+    conn.close()
+    assert filter_catalog(title="farm")["total"] == 1
+
+# verify accented titles match regardless of case, as in the legacy search
+def test_non_ascii_case_insensitive(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    insert_book("Émile, or On Education", "Jean-Jacques Rousseau", "9780465019311", 1, 1)
+
+    assert [b["title"] for b in filter_catalog(title="émile")["books"]] == ["Émile, or On Education"]
+    assert filter_catalog(title="ÉMILE")["total"] == 1
@@ -0,0 +1,136 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from database import (
+    init_database, insert_book, insert_borrow_record, get_materialized_late_fee, get_patron_summary
+)
+from services.fee_policy_service import FeePolicy, load_fee_policy, get_fee_policy
+from services.library_service import (
+    late_fee_for_record, late_fees_for_records, get_patron_status_report, calculate_late_fee_for_book
+)
+from services.overdue_service import refresh_loan_fees
+from services.patron_summary_service import get_patron_summary_report
+
+POLICY = {
+    "version": "test-1",
+    "rules": [
+        {"tiers": [{"from_day": 1, "rate": 0.5}]},
+        {"item_type": "dvd", "grace_days": 2, "cap": 10.0,
+         "tiers": [{"from_day": 1, "rate": 1.0}, {"from_day": 4, "rate": 2.0}]},
+        {"branch": "east", "tiers": [{"from_day": 1, "rate": 0.25}], "cap": 5.0},
+        {"branch": "east", "item_type": "dvd", "tiers": [{"from_day": 1, "rate": 3.0}]},
+    ]
+}
+
+@pytest.fixture(autouse=True)
+def default_policy(tmp_path, monkeypatch):
+    # Loading a policy clears the materialized fees in the database
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "test_library.db"))
+    init_database()
+    yield
+    load_fee_policy()
+
+# verify the default policy keeps the flat 0.50 per day rule without a cap
+def test_default_policy_flat_rate():
+    policy = get_fee_policy()
+    assert policy.version == "default"
+    assert policy.fee(0) == 0.0
+    assert policy.fee(7) == 3.5
+    assert policy.fee(100) == 50.0
+
+# verify grace days, tiers, caps and rule specificity
+def test_tiered_policy_rules():
+    policy = FeePolicy(POLICY)
+    # dvd: days 1-2 free, charged days 1-3 at 1.00, then 2.00, capped at 10.00
+    assert [policy.fee(d, item_type="dvd") for d in (2, 3, 5, 6, 7, 20)] == [0.0, 1.0, 3.0, 5.0, 7.0, 10.0]
+    assert policy.fee(30, branch="east") == 5.0
+    assert policy.fee(2, branch="east", item_type="dvd") == 6.0
+    assert policy.fee(4, branch="west", item_type="book") == 2.0
+    assert policy.fees([(3, None, "dvd"), (30, "east", None), (4, None, None)]) == [1.0, 5.0, 2.0]
+
+# verify invalid policies are rejected and the current policy stays in place
+@pytest.mark.parametrize("config", [
+    {"rules": [{"item_type": "dvd", "tiers": [{"from_day": 1, "rate": 1.0}]}]},
+    {"rules": [{"tiers": [{"from_day": 2, "rate": 1.0}]}]},
+    {"rules": [{"tiers": [{"from_day": 1, "rate": -1.0}]}]},
+    {"rules": [{"tiers": []}, {"tiers": [{"from_day": 1, "rate": 1.0}]}]},
+])
+def test_invalid_policy_rejected(tmp_path, config):
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(config))
+    with pytest.raises(ValueError):
+        load_fee_policy(str(path))
+    assert get_fee_policy().version == "default"
+
+# verify loan fees follow the loaded policy, one at a time or in batches
+def test_late_fees_use_loaded_policy(tmp_path):
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(POLICY))
+    load_fee_policy(str(path))
+    now = datetime(2025, 5, 20, 12, 0)
+    records = [
+        {"due_date": now - timedelta(days=6), "item_type": "dvd"},
+        {"due_date": now - timedelta(days=6)},
+        {"due_date": now + timedelta(days=1)},
+        {"due_date": now - timedelta(days=40), "return_date": now - timedelta(days=30), "branch_id": "east"},
+    ]
+    batch = late_fees_for_records(records, now)
+    assert batch == [late_fee_for_record(record, now) for record in records]
+    assert [result["fee_amount"] for result in batch] == [5.0, 3.0, 0.0, 2.5]
+    assert batch[2]["status"] == "No late fee."
+    assert batch[3]["days_overdue"] == 10
+
+def _load_policy(tmp_path, config):
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(config))
+    load_fee_policy(str(path))
+
+# verify stored loans reach the policy with their branch and the book's item type
+def test_loans_carry_branch_and_item_type(tmp_path):
+    insert_book("Film", "Director", "9780000000001", 1, 1, item_type="dvd")
+    insert_book("Novel", "Author", "9780000000002", 1, 1)
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6), branch_id="east")
+    insert_borrow_record("123456", 2, now - timedelta(days=20), now - timedelta(days=6))
+    _load_policy(tmp_path, POLICY)
+
+    report = get_patron_status_report("123456")
+    assert [b["fee_amount"] for b in report["borrowed_books"]] == [18.0, 3.0]
+    refresh_loan_fees()
+    assert get_materialized_late_fee("123456", 1, now)["fee_amount"] == 18.0
+
+# verify a policy change clears fees and summaries computed under the old policy
+def test_policy_change_clears_materialized_fees(tmp_path):
+    insert_book("Film", "Director", "9780000000001", 1, 1, item_type="dvd")
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    refresh_loan_fees()
+    assert get_patron_summary_report("123456")["accrued_fees"] == 3.0
+
+    _load_policy(tmp_path, POLICY)
+    assert get_materialized_late_fee("123456", 1, now) is None
+    assert get_patron_summary("123456")["valid_until"] < now
+    assert calculate_late_fee_for_book("123456", 1)["fee_amount"] == 5.0
+    assert get_patron_summary_report("123456")["accrued_fees"] == 5.0
+
+    refresh_loan_fees()
+    _load_policy(tmp_path, POLICY)
+    assert get_materialized_late_fee("123456", 1, now)["fee_amount"] == 5.0
+
+# verify a new process loading the same policy keeps fees materialized under it
+def test_same_policy_in_new_process_keeps_materialized_fees(tmp_path, monkeypatch):
+    insert_book("Film", "Director", "9780000000001", 1, 1, item_type="dvd")
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    _load_policy(tmp_path, POLICY)
+    refresh_loan_fees()
+
+    monkeypatch.setattr("services.fee_policy_service._policy", None)
+    monkeypatch.setattr("services.fee_policy_service._policy_fingerprint", None)
+    _load_policy(tmp_path, POLICY)
+    assert get_materialized_late_fee("123456", 1, now)["fee_amount"] == 5.0
+
+    monkeypatch.setattr("services.fee_policy_service._policy", None)
+    monkeypatch.setattr("services.fee_policy_service._policy_fingerprint", None)
+    load_fee_policy()
+    assert get_materialized_late_fee("123456", 1, now) is None
@@ -0,0 +1,72 @@
+import pytest
+import random
+from database import init_database, insert_book, get_db_connection, trigram_similarity
+from migrations import apply_migrations
+from services.library_service import search_books_in_catalog
+from app import create_app
+
+def _setup_catalog(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    for title, author in [("The Great Gatsby", "F. Scott Fitzgerald"),
+                          ("Tender Is the Night", "F. Scott Fitzgerald"),
+                          ("To Kill a Mockingbird", "Harper Lee"),
+                          ("Great Expectations", "Charles Dickens")]:
+        insert_book(title, author, str(random.randint(1000000000000, 9999999999999)), 1, 1)
+
+# verify misspelled authors and titles still match, best match first
+def test_fuzzy_search_tolerates_typos(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+
+    assert search_books_in_catalog("Fitzgerlad", "author") == []
+    results = search_books_in_catalog("Fitzgerlad", "author", threshold=0.3)
+    assert {b["title"] for b in results} == {"The Great Gatsby", "Tender Is the Night"}
+
+    results = search_books_in_catalog("great gatsbi", "title", threshold=0.3)
+    assert results[0]["title"] == "The Great Gatsby"
+    assert "To Kill a Mockingbird" not in [b["title"] for b in results]
+
+# verify the threshold controls how loose a match may be
+def test_fuzzy_threshold(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    assert trigram_similarity("mockingbird", "To Kill a Mockingbird") == 1.0
+    assert trigram_similarity("mokingbrd", "To Kill a Mockingbird") < 0.5
+
+    assert len(search_books_in_catalog("mokingbrd", "title", threshold=0.3)) == 1
+    assert search_books_in_catalog("mokingbrd", "title", threshold=0.9) == []
+    assert search_books_in_catalog("mockingbird", "title", threshold=1.5) == []
+
+# verify books that predate the index are picked up by the migration backfill
+def test_backfill_indexes_existing_books(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    conn = get_db_connection()
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Bleak House', 'Charles Dickens', '9780000000001', 1, 1)")
+    conn.execute("DELETE FROM schema_version WHERE version >= 8")
+    conn.commit()
+    conn.close()
+    assert search_books_in_catalog("blaek house", "title", threshold=0.3) == []
+
+    apply_migrations()
+    assert [b["title"] for b in search_books_in_catalog("blaek house", "title", threshold=0.3)] == ["Bleak House"]
+    assert len(search_books_in_catalog("dickens", "author", threshold=0.5)) == 2
+
+# verify the API validates and applies the threshold parameter
+def test_api_search_threshold(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    client = create_app().test_client()
+
+    response = client.get("/api/search?q=Fitzgerlad&type=author&threshold=0.3")
+    assert response.status_code == 200
+    assert response.get_json()["count"] == 2
+    assert client.get("/api/search?q=x&threshold=abc").status_code == 400
+
+# verify the sample books a fresh app starts with can be found by fuzzy search
+def test_fuzzy_search_on_sample_data(tmp_path, monkeypatch):
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "test_library.db"))
+    client = create_app().test_client()
+
+    response = client.get("/api/search?q=Fitzgerlad&type=author&threshold=0.3")
+    assert [b["title"] for b in response.get_json()["results"]] == ["The Great Gatsby"]
+    assert search_books_in_catalog("mokingbrd", "title", threshold=0.3)[0]["title"] == "To Kill a Mockingbird"
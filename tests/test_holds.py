@@ -0,0 +1,82 @@
+import pytest
+import random
+from datetime import datetime, timedelta
+from database import init_database, get_book_by_id, insert_book, insert_borrow_record
+from services.hold_service import place_hold, cancel_hold, get_holds_for_patron, expire_ready_holds
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+def _setup_checked_out_book(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Popular Book", "Author H", str(random.randint(1000000000000, 9999999999999)), 1, 0)
+    insert_borrow_record("111111", 1, datetime.now() - timedelta(days=3), datetime.now() + timedelta(days=11))
+
+# verify holds can only be placed on unavailable books
+def test_place_hold_requires_unavailable_book(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("On Shelf", "Author A", str(random.randint(1000000000000, 9999999999999)), 2, 2)
+
+    success, message = place_hold("222222", 1)
+    assert success is False
+    assert "borrow it instead" in message.lower()
+
+# verify holds queue in FIFO order and duplicates are rejected
+def test_place_hold_queue_positions(tmp_path, monkeypatch):
+    _setup_checked_out_book(tmp_path, monkeypatch)
+
+    success, message = place_hold("222222", 1)
+    assert success is True
+    assert "position in the queue: 1" in message.lower()
+    success, message = place_hold("333333", 1)
+    assert "position in the queue: 2" in message.lower()
+
+    success, message = place_hold("222222", 1)
+    assert success is False
+    assert "already have a hold" in message.lower()
+
+# verify a returned copy goes to the head of the queue instead of the shelf
+def test_return_assigns_copy_to_first_hold(tmp_path, monkeypatch):
+    _setup_checked_out_book(tmp_path, monkeypatch)
+    place_hold("222222", 1)
+    place_hold("333333", 1)
+
+    success, _ = return_book_by_patron("111111", 1)
+    assert success is True
+    assert get_book_by_id(1)["available_copies"] == 0
+    assert get_holds_for_patron("222222")[0]["status"] == "ready"
+    assert get_holds_for_patron("333333")[0]["queue_position"] == 1
+
+    # only the patron the copy is held for can borrow it
+    success, message = borrow_book_by_patron("333333", 1)
+    assert success is False
+    success, message = borrow_book_by_patron("222222", 1)
+    assert success is True
+    assert get_holds_for_patron("222222") == []
+
+# verify cancelling a ready hold passes the copy to the next patron
+def test_cancel_ready_hold_passes_copy_on(tmp_path, monkeypatch):
+    _setup_checked_out_book(tmp_path, monkeypatch)
+    place_hold("222222", 1)
+    place_hold("333333", 1)
+    return_book_by_patron("111111", 1)
+    hold_id = get_holds_for_patron("222222")[0]["id"]
+
+    success, message = cancel_hold("222222", hold_id)
+    assert success is True
+    assert get_holds_for_patron("333333")[0]["status"] == "ready"
+
+    success, message = cancel_hold("222222", hold_id)
+    assert success is False
+
+# verify uncollected ready holds expire and the copy returns to the shelf
+def test_expire_ready_holds(tmp_path, monkeypatch):
+    _setup_checked_out_book(tmp_path, monkeypatch)
+    place_hold("222222", 1)
+    return_book_by_patron("111111", 1)
+
+    assert expire_ready_holds(datetime.now()) == 0
+    assert expire_ready_holds(datetime.now() + timedelta(days=4)) == 1
+    assert get_book_by_id(1)["available_copies"] == 1
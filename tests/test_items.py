@@ -0,0 +1,105 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+from database import (
+    init_database, get_db_connection, insert_book, insert_borrow_record, get_book_by_isbn,
+    get_item_by_barcode, get_patron_borrowed_books, update_borrow_record_return_date
+)
+from migrations import apply_migrations
+from services.library_service import borrow_item_by_barcode, return_item_by_barcode
+from app import create_app
+
+@pytest.fixture
+def book_id(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Scanned", "Author", "9780000000001", 2, 2)
+    return get_book_by_isbn("9780000000001").id
+
+def _barcode(book_id, n):
+    return f"{book_id:07d}-{n:04d}"
+
+# verify every copy of a new book gets an item with its own barcode
+def test_new_book_gets_items(book_id):
+    first, second = get_item_by_barcode(_barcode(book_id, 1)), get_item_by_barcode(_barcode(book_id, 2))
+    assert first["book_id"] == second["book_id"] == book_id
+    assert first["id"] != second["id"]
+    assert first["status"] == "available" and first["loan_id"] is None
+    assert first["title"] == "Scanned"
+    assert get_item_by_barcode(_barcode(book_id, 3)) is None
+
+# verify a patron with two copies of a book returns exactly the scanned one
+def test_borrow_and_return_by_barcode(book_id):
+    assert borrow_item_by_barcode("123456", _barcode(book_id, 2))[0]
+    assert borrow_item_by_barcode("123456", _barcode(book_id, 1))[0]
+    success, message = borrow_item_by_barcode("654321", _barcode(book_id, 1))
+    assert not success and "already on loan" in message
+    assert get_book_by_isbn("9780000000001").available_copies == 0
+
+    second = get_item_by_barcode(_barcode(book_id, 2))
+    assert second["status"] == "on_loan" and second["patron_id"] == "123456"
+    assert return_item_by_barcode(_barcode(book_id, 1))[0]
+    assert get_item_by_barcode(_barcode(book_id, 1))["status"] == "available"
+    assert get_item_by_barcode(_barcode(book_id, 2))["loan_id"] == second["loan_id"]
+    assert [loan["id"] for loan in get_patron_borrowed_books("123456")] == [second["loan_id"]]
+
+    assert not return_item_by_barcode(_barcode(book_id, 1))[0]
+    assert not borrow_item_by_barcode("123456", "nope")[0]
+
+# verify a return without a loan ID closes only the oldest open loan of the book
+def test_return_date_closes_one_loan(book_id):
+    now = datetime.now()
+    insert_borrow_record("123456", book_id, now - timedelta(days=2), now + timedelta(days=12))
+    insert_borrow_record("123456", book_id, now - timedelta(days=1), now + timedelta(days=13))
+    first, second = get_patron_borrowed_books("123456")
+    assert update_borrow_record_return_date("123456", book_id, now)
+    assert [loan["id"] for loan in get_patron_borrowed_books("123456")] == [second["id"]]
+    assert get_item_by_barcode(_barcode(book_id, 1))["status"] == "available"
+
+# verify the migration expands legacy copy counts into items in batches and matches open loans
+def test_migration_expands_counts(tmp_path, monkeypatch):
+    test_db = tmp_path / "legacy.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    conn = sqlite3.connect(str(test_db))
+    conn.execute("""
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, available_copies INTEGER NOT NULL)
+    """)
+    conn.execute("""
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL, book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT)
+    """)
+    conn.executemany("INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)",
+                     [(f"Book {i}", "Author", f"97800000000{i:02d}", i, i) for i in range(1, 6)])
+    conn.executemany("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)",
+                     [("111111", 3, "2025-01-01T10:00:00", "2025-01-15T10:00:00"),
+                      ("222222", 3, "2025-01-02T10:00:00", "2025-01-16T10:00:00")])
+    conn.commit()
+    conn.close()
+
+    apply_migrations(batch_size=2)
+    conn = get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 15
+    loans = conn.execute("SELECT item_id FROM borrow_records ORDER BY id").fetchall()
+    assert [row["item_id"] for row in loans] == [
+        conn.execute("SELECT id FROM items WHERE barcode = ?", (_barcode(3, n),)).fetchone()["id"] for n in (1, 2)
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM items WHERE status = 'on_loan'").fetchone()[0] == 2
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, item_id) "
+                     "VALUES ('333333', 3, '2025-01-03', '2025-01-17', ?)", (loans[0]["item_id"],))
+    conn.close()
+
+# verify the scanner endpoints look up, lend and return a copy
+def test_item_api(book_id, monkeypatch):
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    client = create_app().test_client()
+    barcode = _barcode(book_id, 1)
+    assert client.get(f"/api/items/{barcode}").get_json()["status"] == "available"
+    assert client.get("/api/items/missing").status_code == 404
+    assert client.post(f"/api/items/{barcode}/borrow", json={"patron_id": "123456"}).status_code == 200
+    assert client.post(f"/api/items/{barcode}/borrow", json={"patron_id": "123456"}).status_code == 400
+    assert client.post(f"/api/items/{barcode}/return", json={}).get_json()["success"]
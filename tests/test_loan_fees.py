@@ -0,0 +1,67 @@
+import pytest
+import random
+from datetime import datetime, timedelta
+from database import (
+    init_database, get_db_connection, insert_book, insert_borrow_record, get_materialized_late_fee
+)
+from services.library_service import calculate_late_fee_for_book, return_book_by_patron
+from services.overdue_service import refresh_loan_fees
+
+def _setup_loans(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Late Book", "Author L", str(random.randint(1000000000000, 9999999999999)), 1, 0)
+    insert_book("On Time Book", "Author O", str(random.randint(1000000000000, 9999999999999)), 1, 0)
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    insert_borrow_record("123456", 2, now - timedelta(days=2), now + timedelta(days=12))
+
+# verify the job materializes state for every open loan in batches
+def test_refresh_materializes_all_open_loans(tmp_path, monkeypatch):
+    _setup_loans(tmp_path, monkeypatch)
+
+    assert refresh_loan_fees(batch_size=1) == 2
+    now = datetime.now()
+    late = get_materialized_late_fee("123456", 1, now)
+    assert late["is_overdue"] is True
+    assert late["days_overdue"] == 6
+    assert abs(late["fee_amount"] - 3.0) < 0.01
+    on_time = get_materialized_late_fee("123456", 2, now)
+    assert on_time["is_overdue"] is False
+    assert on_time["fee_amount"] == 0.0
+
+# verify materialized fees stop being served once the fee would change
+def test_materialized_fee_expires(tmp_path, monkeypatch):
+    _setup_loans(tmp_path, monkeypatch)
+    refresh_loan_fees()
+
+    assert get_materialized_late_fee("123456", 1, datetime.now() + timedelta(days=1)) is None
+    assert get_materialized_late_fee("123456", 2, datetime.now() + timedelta(days=13)) is None
+
+# verify fee lookups use the materialized value and match on-demand results
+def test_calculate_late_fee_uses_materialized_value(tmp_path, monkeypatch):
+    _setup_loans(tmp_path, monkeypatch)
+    on_demand = calculate_late_fee_for_book("123456", 1)
+    refresh_loan_fees()
+
+    conn = get_db_connection()
+    conn.execute("UPDATE loan_fees SET fee_amount = 99.0 WHERE book_id = 1")
+    conn.commit()
+    conn.close()
+    assert calculate_late_fee_for_book("123456", 1)["fee_amount"] == 99.0
+
+    conn = get_db_connection()
+    conn.execute("UPDATE loan_fees SET fee_amount = ? WHERE book_id = 1", (on_demand["fee_amount"],))
+    conn.commit()
+    conn.close()
+    assert calculate_late_fee_for_book("123456", 1) == on_demand
+
+# verify returning a book removes its materialized fee
+def test_return_clears_materialized_fee(tmp_path, monkeypatch):
+    _setup_loans(tmp_path, monkeypatch)
+    refresh_loan_fees()
+
+    return_book_by_patron("123456", 1)
+    assert get_materialized_late_fee("123456", 1, datetime.now()) is None
+    assert calculate_late_fee_for_book("123456", 1)["status"] == "Borrow record not found."
@@ -0,0 +1,127 @@
+import pytest
+import sqlite3
+from datetime import datetime
+from types import SimpleNamespace
+from database import init_database, get_db_connection, to_epoch
+from migrations import (
+    MigrationContext, MigrationError, apply_migrations, discover_migrations, get_schema_version
+)
+
+def _create_legacy_database(path):
+    conn = sqlite3.connect(str(path))
+    conn.execute("""
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, available_copies INTEGER NOT NULL)
+    """)
+    conn.execute("""
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL, book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT)
+    """)
+    conn.commit()
+    conn.close()
+
+def _index_names(conn):
+    return {r["name"] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+# verify a freshly initialized database is at the latest schema version
+def test_init_database_applies_all_migrations(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    assert get_schema_version() == discover_migrations()[-1].VERSION
+    conn = get_db_connection()
+    assert "idx_borrow_records_patron_open" in _index_names(conn)
+    conn.close()
+
+# verify an existing unversioned database is upgraded in place
+def test_upgrade_legacy_database(tmp_path, monkeypatch):
+    test_db = tmp_path / "legacy.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    _create_legacy_database(test_db)
+    assert get_schema_version() == 0
+
+    applied = apply_migrations()
+    assert applied == [m.VERSION for m in discover_migrations()]
+    assert apply_migrations() == []
+
+# verify dry run reports pending migrations without changing the schema
+def test_dry_run_makes_no_changes(tmp_path, monkeypatch):
+    test_db = tmp_path / "legacy.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    _create_legacy_database(test_db)
+
+    messages = []
+    applied = apply_migrations(dry_run=True, log=messages.append)
+    assert applied
+    assert any("CREATE INDEX" in m for m in messages)
+    assert get_schema_version() == 0
+    conn = get_db_connection()
+    assert "idx_borrow_records_patron_open" not in _index_names(conn)
+    conn.close()
+
+# verify backfills process every matching row across multiple batches
+def test_backfill_runs_in_batches(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    conn = get_db_connection()
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, value INTEGER)")
+    conn.executemany("INSERT INTO items (value) VALUES (?)", [(i,) for i in range(1050)])
+    conn.commit()
+
+    ctx = MigrationContext(conn, batch_size=100)
+    ctx.add_column("items", "doubled", "INTEGER")
+    updated = ctx.backfill("items", "doubled = value * 2", where="doubled IS NULL")
+
+    assert updated == 1050
+    remaining = conn.execute("SELECT COUNT(*) FROM items WHERE doubled != value * 2 OR doubled IS NULL").fetchone()[0]
+    assert remaining == 0
+    assert ctx.backfill("items", "doubled = value * 2", where="doubled IS NULL") == 0
+    conn.close()
+
+# verify loan dates written by legacy code are converted to epoch columns
+def test_epoch_columns_backfilled_for_legacy_rows(tmp_path, monkeypatch):
+    test_db = tmp_path / "legacy.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    _create_legacy_database(test_db)
+    conn = sqlite3.connect(str(test_db))
+    conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)",
+                 ("123456", 1, "2024-01-01T10:00:00.999999", "2024-01-15T10:00:00", "2024-01-20T09:30:00"))
+    conn.commit()
+    conn.close()
+
+    apply_migrations()
+    conn = get_db_connection()
+    row = conn.execute("SELECT borrow_ts, due_ts, return_ts FROM borrow_records").fetchone()
+    conn.close()
+    assert row["borrow_ts"] == to_epoch(datetime(2024, 1, 1, 10, 0, 0))
+    assert row["due_ts"] == to_epoch(datetime(2024, 1, 15, 10, 0, 0))
+    assert row["return_ts"] == to_epoch(datetime(2024, 1, 20, 9, 30, 0))
+
+# verify a migration failing on a constraint stops the run and is retried, not skipped
+def test_failed_migration_is_not_skipped(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    fail = [True]
+
+    def backfill(ctx):
+        ctx.execute("CREATE TABLE IF NOT EXISTS codes (code TEXT UNIQUE)")
+        if fail[0]:
+            ctx.execute("INSERT INTO codes VALUES ('a'), ('a')")
+
+    monkeypatch.setattr("migrations._migrations", [
+        SimpleNamespace(VERSION=1, DESCRIPTION="first", upgrade=lambda ctx: None),
+        SimpleNamespace(VERSION=2, DESCRIPTION="backfill", upgrade=backfill),
+        SimpleNamespace(VERSION=3, DESCRIPTION="third", upgrade=lambda ctx: None),
+    ])
+    with pytest.raises(MigrationError):
+        apply_migrations()
+    assert get_schema_version() == 1
+
+    fail[0] = False
+    assert apply_migrations() == [2, 3]
+    conn = get_db_connection()
+    assert [r[0] for r in conn.execute("SELECT version FROM schema_version ORDER BY version")] == [1, 2, 3]
+    conn.close()
@@ -0,0 +1,56 @@
+import pytest
+import random
+from datetime import datetime, timedelta
+from app import create_app
+from database import init_database, insert_book, insert_borrow_record, get_book_by_id, get_patron_borrowed_books
+from models import Book, Loan
+
+# verify book records behave like read-only dicts
+def test_book_record_mapping_interface():
+    book = Book(1, "Title", "Author", "1234567890123", 3, 2)
+    assert book["title"] == book.title == "Title"
+    assert book.get("isbn") == "1234567890123"
+    assert book.get("missing") is None
+    assert "available_copies" in book
+    assert "missing" not in book
+    assert dict(book) == {"id": 1, "title": "Title", "author": "Author", "isbn": "1234567890123",
+                          "total_copies": 3, "available_copies": 2}
+    assert book == dict(book)
+    with pytest.raises(KeyError):
+        book["get"]
+
+# verify records use slots instead of a per-instance dict
+def test_records_are_slotted():
+    book = Book(1, "Title", "Author", "1234567890123", 3, 2)
+    assert not hasattr(book, "__dict__")
+    with pytest.raises(AttributeError):
+        book.extra = 1
+
+# verify the data layer returns records for books and loans
+def test_data_layer_returns_records(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    insert_book("Record Book", "Author R", str(random.randint(1000000000000, 9999999999999)), 1, 0)
+    insert_borrow_record("123456", 1, datetime.now() - timedelta(days=1), datetime.now() + timedelta(days=13))
+
+    book = get_book_by_id(1)
+    assert isinstance(book, Book)
+    assert book["title"] == "Record Book"
+    loans = get_patron_borrowed_books("123456")
+    assert isinstance(loans[0], Loan)
+    assert loans[0]["title"] == "Record Book"
+    assert loans[0].get("return_date") is None
+
+# verify records serialize as JSON objects through the API
+def test_records_serialize_with_jsonify(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    app = create_app()
+
+    response = app.test_client().get("/api/search?q=gatsby&type=title")
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert results[0]["title"] == "The Great Gatsby"
+    assert results[0]["available_copies"] == 3
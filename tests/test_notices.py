@@ -0,0 +1,99 @@
+import pytest
+from datetime import datetime, timedelta
+import database
+from database import init_database, insert_book, insert_borrow_record, get_db_connection
+from services import notice_service
+from services.notice_service import (
+    queue_overdue_notices, deliver_notices, FileSender, NoticeSender, MAX_SEND_ATTEMPTS
+)
+
+AS_OF = datetime(2025, 3, 10, 9, 0)
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    insert_book("Overdue Book", "Author A", "9780000000001", 5, 5)
+    insert_book("Due Soon Book", "Author B", "9780000000002", 5, 5)
+    insert_book("Later Book", "Author C", "9780000000003", 5, 5)
+    # 111111: overdue by 4 days and one due tomorrow; 222222: due soon only;
+    # 333333: nothing due yet; 444444: overdue by 10 days
+    insert_borrow_record("111111", 1, AS_OF - timedelta(days=18), AS_OF - timedelta(days=4))
+    insert_borrow_record("111111", 2, AS_OF - timedelta(days=13), AS_OF + timedelta(days=1))
+    insert_borrow_record("222222", 2, AS_OF - timedelta(days=12), AS_OF + timedelta(days=1, hours=12))
+    insert_borrow_record("333333", 3, AS_OF, AS_OF + timedelta(days=14))
+    insert_borrow_record("444444", 1, AS_OF - timedelta(days=24), AS_OF - timedelta(days=10))
+    return tmp_path
+
+def _outbox():
+    conn = get_db_connection()
+    rows = conn.execute("SELECT patron_id, subject, body, sent_ts, attempts FROM notice_outbox ORDER BY patron_id").fetchall()
+    conn.close()
+    return rows
+
+# verify one notice per patron with overdue or due-soon loans, rendered from the template
+def test_queue_notices_groups_by_patron(library):
+    assert queue_overdue_notices(AS_OF) == 3
+    rows = _outbox()
+    assert [row["patron_id"] for row in rows] == ["111111", "222222", "444444"]
+
+    first = rows[0]
+    assert first["subject"] == "Library notice: 1 overdue and 1 due soon"
+    assert "Overdue Book by Author A: due 2025-03-06, 4 day(s) late, fee $2.00" in first["body"]
+    assert "Due Soon Book by Author B: due 2025-03-11" in first["body"]
+    assert "Late fees so far: $2.00" in first["body"]
+    assert rows[1]["subject"] == "Library notice: 1 due soon"
+    assert "overdue" not in rows[1]["body"]
+
+    # the day's run is complete; running again queues nothing
+    assert queue_overdue_notices(AS_OF) == 0
+    assert len(_outbox()) == 3
+
+# verify an interrupted run resumes from its checkpoint without duplicates
+def test_interrupted_run_resumes(library, monkeypatch):
+    saved = []
+    original = notice_service.save_notice_batch
+
+    def failing_after_one(*args, **kwargs):
+        if saved:
+            return False
+        saved.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(notice_service, "save_notice_batch", failing_after_one)
+    with pytest.raises(RuntimeError):
+        queue_overdue_notices(AS_OF, batch_size=1)
+    assert [row["patron_id"] for row in _outbox()] == ["111111"]
+
+    monkeypatch.setattr(notice_service, "save_notice_batch", original)
+    assert queue_overdue_notices(AS_OF, batch_size=1) == 2
+    assert [row["patron_id"] for row in _outbox()] == ["111111", "222222", "444444"]
+    assert database.get_notice_run(AS_OF.date().isoformat())["notices"] == 3
+
+# verify the file sender spools each notice once and marks it sent
+def test_deliver_notices_to_spool(library):
+    queue_overdue_notices(AS_OF)
+    spool = library / "spool"
+    assert deliver_notices(FileSender(str(spool)), batch_size=2) == (3, 0)
+
+    files = sorted(path.name for path in spool.iterdir())
+    assert files == ["2025-03-10-111111-1.txt", "2025-03-10-222222-2.txt", "2025-03-10-444444-3.txt"]
+    assert (spool / files[0]).read_text().startswith("Subject: Library notice: 1 overdue and 1 due soon")
+    assert all(row["sent_ts"] is not None for row in _outbox())
+    assert deliver_notices(FileSender(str(spool))) == (0, 0)
+
+# verify failed deliveries are recorded and retried until the attempt limit
+def test_failed_deliveries_retried(library):
+    class Flaky(NoticeSender):
+        def send(self, notice):
+            if notice["patron_id"] == "222222":
+                raise ConnectionError("mail server unavailable")
+
+    queue_overdue_notices(AS_OF)
+    assert deliver_notices(Flaky()) == (2, 1)
+    failed = [row for row in _outbox() if row["sent_ts"] is None]
+    assert [(row["patron_id"], row["attempts"]) for row in failed] == [("222222", 1)]
+
+    for _ in range(MAX_SEND_ATTEMPTS - 1):
+        deliver_notices(Flaky())
+    assert deliver_notices(Flaky()) == (0, 0)
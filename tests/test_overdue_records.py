@@ -0,0 +1,61 @@
+import pytest
+import random
+from datetime import datetime, timedelta
+from database import (
+    init_database, get_db_connection, insert_book, insert_borrow_record,
+    update_borrow_record_return_date, get_overdue_borrow_records, get_patron_borrowed_books
+)
+
+# verify only open loans past their due date are returned, oldest due first
+def test_overdue_records_filtered_in_sql(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    for i in range(3):
+        insert_book(f"Book {i}", "Author", str(random.randint(1000000000000, 9999999999999)), 1, 0)
+    now = datetime.now()
+    insert_borrow_record("111111", 1, now - timedelta(days=20), now - timedelta(days=6))
+    insert_borrow_record("222222", 2, now - timedelta(days=30), now - timedelta(days=16))
+    insert_borrow_record("333333", 3, now - timedelta(days=2), now + timedelta(days=12))
+    insert_borrow_record("444444", 1, now - timedelta(days=40), now - timedelta(days=26))
+    update_borrow_record_return_date("444444", 1, now - timedelta(days=1))
+
+    overdue = get_overdue_borrow_records()
+    assert [r["patron_id"] for r in overdue] == ["222222", "111111"]
+    assert overdue[0]["days_overdue"] == 16
+    assert overdue[1]["days_overdue"] == 6
+
+# verify overdue flag is computed by the query for borrowed books
+def test_patron_borrowed_books_overdue_flag(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    insert_book("Late", "Author", str(random.randint(1000000000000, 9999999999999)), 2, 0)
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    insert_borrow_record("123456", 1, now - timedelta(days=1), now + timedelta(days=13))
+
+    books = get_patron_borrowed_books("123456")
+    assert [b["is_overdue"] for b in books] == [True, False]
+    assert isinstance(books[0]["due_date"], datetime)
+
+# verify rows inserted without epoch values are filled in by the compatibility trigger
+def test_legacy_insert_gets_epoch_columns(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    insert_book("Legacy", "Author", str(random.randint(1000000000000, 9999999999999)), 1, 0)
+    due_date = datetime.now() - timedelta(days=3)
+    conn = get_db_connection()
+    conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)",
+                 ("123456", 1, (due_date - timedelta(days=14)).isoformat(), due_date.isoformat()))
+    conn.commit()
+    conn.close()
+
+    books = get_patron_borrowed_books("123456")
+    assert len(books) == 1
+    assert books[0]["is_overdue"] is True
+    assert books[0]["due_date"] == due_date.replace(microsecond=0)
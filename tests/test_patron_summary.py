@@ -0,0 +1,73 @@
+import pytest
+import random
+from datetime import datetime, timedelta
+from database import (
+    init_database, get_db_connection, insert_book, insert_borrow_record, get_patron_summary,
+    record_patron_payment
+)
+from services.library_service import borrow_book_by_patron, return_book_by_patron, get_patron_status_report
+from services.patron_summary_service import (
+    get_patron_summary_report, refresh_stale_patron_summaries, check_patron_summaries
+)
+
+def _setup_books(tmp_path, monkeypatch, count=2):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    for i in range(count):
+        insert_book(f"Book {i}", "Author S", str(random.randint(1000000000000, 9999999999999)), 2, 2)
+
+# verify invalid patron IDs are rejected
+def test_summary_invalid_patron_id(tmp_path, monkeypatch):
+    _setup_books(tmp_path, monkeypatch)
+    result = get_patron_summary_report("12")
+    assert result["status"].lower() == "invalid patron id."
+    assert result["open_loans"] == 0
+
+# verify the summary matches the full status report
+def test_summary_matches_status_report(tmp_path, monkeypatch):
+    _setup_books(tmp_path, monkeypatch)
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    insert_borrow_record("123456", 2, now - timedelta(days=2), now + timedelta(days=12))
+
+    summary = get_patron_summary_report("123456")
+    report = get_patron_status_report("123456")
+    assert summary["open_loans"] == report["total_books_borrowed"] == 2
+    assert summary["overdue_count"] == report["overdue_count"] == 1
+    assert abs(summary["accrued_fees"] - report["total_late_fees"]) < 0.01
+
+# verify borrow, return and payment keep the summary up to date
+def test_summary_updated_incrementally(tmp_path, monkeypatch):
+    _setup_books(tmp_path, monkeypatch)
+    borrow_book_by_patron("123456", 1)
+    get_patron_summary_report("123456")
+    borrow_book_by_patron("123456", 2)
+
+    row = get_patron_summary("123456")
+    assert row["open_loans"] == 2
+    assert row["valid_until"] > datetime.now()
+    assert get_patron_summary_report("123456")["open_loans"] == 2
+
+    return_book_by_patron("123456", 1)
+    assert get_patron_summary_report("123456")["open_loans"] == 1
+
+    record_patron_payment("123456", 2.5, datetime.now())
+    assert get_patron_summary_report("123456")["fees_paid"] == 2.5
+
+# verify the consistency checker detects drift and the refresher repairs stale rows
+def test_summary_consistency_check(tmp_path, monkeypatch):
+    _setup_books(tmp_path, monkeypatch)
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    insert_borrow_record("654321", 2, now - timedelta(days=2), now + timedelta(days=12))
+    assert refresh_stale_patron_summaries() == 2
+    assert check_patron_summaries() == []
+
+    conn = get_db_connection()
+    conn.execute("UPDATE patron_summary SET open_loans = 5 WHERE patron_id = '654321'")
+    conn.commit()
+    conn.close()
+    mismatches = check_patron_summaries()
+    assert [m["patron_id"] for m in mismatches] == ["654321"]
+    assert mismatches[0]["expected"]["open_loans"] == 1
@@ -0,0 +1,67 @@
+import threading
+import pytest
+from app import create_app
+from rate_limit import Limit, MemoryBucketStore, RateLimiter, SQLiteBucketStore
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    return create_app()
+
+# verify a bucket allows its burst, refuses the next request and refills over time
+@pytest.mark.parametrize("make_store", [MemoryBucketStore, lambda: None])
+def test_token_bucket_burst_and_refill(make_store, tmp_path):
+    store = make_store() or SQLiteBucketStore(str(tmp_path / "limits.db"))
+    assert [store.take("k", 2.0, 3, 100.0) for _ in range(3)] == [0, 0, 0]
+    assert store.take("k", 2.0, 3, 100.0) == pytest.approx(0.5)
+    assert store.take("other", 2.0, 3, 100.0) == 0
+    assert store.take("k", 2.0, 3, 100.5) == 0
+
+# verify workers sharing a SQLite file share their buckets
+def test_sqlite_store_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "limits.db")
+    limits = {"search": Limit(rate=1.0, burst=2, max_concurrent=4)}
+    first = RateLimiter(SQLiteBucketStore(path), limits)
+    second = RateLimiter(SQLiteBucketStore(path), limits)
+    assert first.check("search", ("ip:1",), now=10.0) == 0
+    assert second.check("search", ("ip:1",), now=10.0) == 0
+    assert first.check("search", ("ip:1",), now=10.0) > 0
+
+# verify /api/search returns 429 with Retry-After once a client's burst is spent
+def test_search_rate_limited_per_ip(app):
+    app.extensions["rate_limiter"].limits["search"] = Limit(rate=0.1, burst=3, max_concurrent=8)
+    client = app.test_client()
+    statuses = [client.get("/api/search?q=x").status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    refused = client.get("/api/search?q=x")
+    assert refused.get_json()["error"]
+    assert int(refused.headers["Retry-After"]) >= 1
+
+    other = client.get("/api/search?q=x", environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert other.status_code == 200
+
+# verify late fee lookups are also limited per patron across client addresses
+def test_late_fee_rate_limited_per_patron(app):
+    app.extensions["rate_limiter"].limits["late_fee"] = Limit(rate=0.1, burst=2, max_concurrent=8)
+    client = app.test_client()
+    for i in range(2):
+        assert client.get("/api/late_fee/123456/1",
+                          environ_base={"REMOTE_ADDR": f"10.0.0.{i}"}).status_code != 429
+    assert client.get("/api/late_fee/123456/1",
+                      environ_base={"REMOTE_ADDR": "10.0.0.9"}).status_code == 429
+    assert client.get("/api/late_fee/654321/1",
+                      environ_base={"REMOTE_ADDR": "10.0.0.9"}).status_code != 429
+
+# verify requests beyond the concurrency cap are refused with 503 immediately
+def test_concurrency_cap_returns_503(app):
+    limiter = app.extensions["rate_limiter"]
+    limiter.limits["search"] = Limit(rate=100.0, burst=100, max_concurrent=1)
+    limiter._slots["search"] = threading.BoundedSemaphore(1)
+    assert limiter.try_enter("search")
+    response = app.test_client().get("/search?q=x")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    limiter.leave("search")
+    assert app.test_client().get("/search?q=x").status_code == 200
@@ -0,0 +1,79 @@
+import pytest
+import random
+import threading
+from database import init_database, insert_book, get_all_books, refresh_replica, replica_reads
+from services.library_service import search_books_in_catalog
+
+def _setup_replica(tmp_path, monkeypatch, max_staleness=30.0):
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "primary.db"))
+    monkeypatch.setattr("database.REPLICA_DATABASE", str(tmp_path / "replica.db"))
+    monkeypatch.setattr("database.REPLICA_MAX_STALENESS", max_staleness)
+    monkeypatch.setattr("database._replica_state", {'source': None, 'refreshed_at': 0.0})
+    monkeypatch.setattr("database._local", threading.local())
+    init_database()
+    insert_book("Replica Book", "Author R", str(random.randint(1000000000000, 9999999999999)), 1, 1)
+
+def _insert_from_other_thread(title):
+    isbn = str(random.randint(1000000000000, 9999999999999))
+    thread = threading.Thread(target=insert_book, args=(title, "Author R", isbn, 1, 1))
+    thread.start()
+    thread.join()
+
+# verify reports read the snapshot until it exceeds the staleness bound
+def test_replica_reads_are_bounded_stale(tmp_path, monkeypatch):
+    _setup_replica(tmp_path, monkeypatch)
+    assert refresh_replica() is True
+    monkeypatch.setattr("database._local", threading.local())
+
+    _insert_from_other_thread("Later Book")
+    assert search_books_in_catalog("later", "title") == []
+    # outside replica_reads() the primary is always used
+    assert len(get_all_books()) == 2
+
+    monkeypatch.setattr("database.REPLICA_MAX_STALENESS", 0.0)
+    assert len(search_books_in_catalog("later", "title")) == 1
+
+# verify a thread always sees its own writes
+def test_read_your_writes(tmp_path, monkeypatch):
+    _setup_replica(tmp_path, monkeypatch)
+    with replica_reads():
+        assert len(get_all_books()) == 1
+
+    insert_book("My Own Book", "Author R", str(random.randint(1000000000000, 9999999999999)), 1, 1)
+    assert len(search_books_in_catalog("own", "title")) == 1
+
+# verify replica connections cannot write
+def test_replica_connection_is_read_only(tmp_path, monkeypatch):
+    _setup_replica(tmp_path, monkeypatch)
+    import database
+    assert refresh_replica() is True
+    monkeypatch.setattr("database._local", threading.local())
+    with replica_reads():
+        conn = database.get_read_connection()
+    with pytest.raises(Exception):
+        conn.execute("DELETE FROM books")
+    conn.close()
+
+# verify an externally maintained replica that is missing falls back to the primary
+def test_missing_external_replica_uses_primary(tmp_path, monkeypatch):
+    _setup_replica(tmp_path, monkeypatch, max_staleness=None)
+    assert len(search_books_in_catalog("replica", "title")) == 1
+
+# verify a stale replica is refreshed in the background while reads use the primary
+def test_stale_replica_refreshed_in_background(tmp_path, monkeypatch):
+    _setup_replica(tmp_path, monkeypatch)
+    import database
+    monkeypatch.setattr("database.REPLICA_PAGES_PER_STEP", 1)
+    monkeypatch.setattr("database._local", threading.local())
+
+    def read_file():
+        with replica_reads():
+            conn = database.get_read_connection()
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+        conn.close()
+        return path
+
+    # no copy yet: the read goes to the primary while the copy is made
+    assert read_file() == str(tmp_path / "primary.db")
+    database._replica_refresher.join(10)
+    assert read_file() == str(tmp_path / "replica.db")
@@ -0,0 +1,53 @@
+import csv
+import json
+import pytest
+from datetime import datetime, timedelta
+from database import init_database, insert_book, insert_borrow_record
+from services.library_service import get_patron_status_report
+from reports import run_patron_reports
+
+PATRONS = ["100001", "100002", "100003", "100004", "100005"]
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+    for i in range(3):
+        insert_book(f"Report Book {i}", "Author", f"{9780000000000 + i}", 10, 10)
+    now = datetime.now()
+    for p, patron_id in enumerate(PATRONS):
+        for i in range(p % 3 + 1):
+            borrow_date = now - timedelta(days=10 + 5 * p)
+            insert_borrow_record(patron_id, i + 1, borrow_date, borrow_date + timedelta(days=14))
+    return tmp_path
+
+# verify sharded JSONL output matches the per-patron report, in patron order
+@pytest.mark.parametrize("workers", [1, 2])
+def test_jsonl_reports_match_single_reports(library, workers):
+    output = library / "reports.jsonl"
+    assert run_patron_reports(str(output), "jsonl", workers=workers, shard_size=2) == len(PATRONS)
+
+    reports = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [report["patron_id"] for report in reports] == PATRONS
+    for report in reports:
+        assert report == get_patron_status_report(report["patron_id"])
+    assert not (library / "reports.jsonl.partial").exists()
+
+# verify CSV output holds one row of totals per patron
+def test_csv_reports(library):
+    output = library / "reports.csv"
+    run_patron_reports(str(output), "csv", workers=1, shard_size=3)
+
+    with open(output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["patron_id"] for row in rows] == PATRONS
+    expected = get_patron_status_report("100005")
+    assert float(rows[-1]["total_late_fees"]) == expected["total_late_fees"]
+    assert int(rows[-1]["overdue_count"]) == expected["overdue_count"]
+
+# verify an unknown format is rejected before anything is written
+def test_unknown_format_rejected(library):
+    with pytest.raises(ValueError):
+        run_patron_reports(str(library / "reports.xml"), "xml")
+    assert not (library / "reports.xml").exists()
@@ -0,0 +1,80 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+import database
+from database import (
+    get_db_connection, insert_book, insert_borrow_record, get_book_by_isbn
+)
+from app import create_app
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    return create_app()
+
+def _count_connections(monkeypatch):
+    opened = []
+    original = sqlite3.connect
+
+    def counting(*args, **kwargs):
+        opened.append(1)
+        return original(*args, **kwargs)
+    monkeypatch.setattr("sqlite3.connect", counting)
+    return opened
+
+def _book_count():
+    conn = sqlite3.connect(database.DATABASE)
+    count = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+    conn.close()
+    return count
+
+# verify a /return request opens one connection for all of its queries
+def test_return_request_uses_one_connection(app, monkeypatch):
+    insert_book("Shared Connection", "Author", "9780000000001", 1, 0)
+    book_id = get_book_by_isbn("9780000000001").id
+    insert_borrow_record("123456", book_id, datetime.now() - timedelta(days=3), datetime.now() + timedelta(days=11))
+
+    opened = _count_connections(monkeypatch)
+    response = app.test_client().post("/return", data={"patron_id": "123456", "book_id": book_id})
+    assert response.status_code == 200
+    assert len(opened) <= 1
+    assert get_book_by_isbn("9780000000001").available_copies == 1
+
+# verify get_db_connection still returns a new connection inside a request
+def test_get_db_connection_not_shared(app):
+    with app.test_request_context():
+        app.preprocess_request()
+        first, second = get_db_connection(), get_db_connection()
+        assert first is not second
+        first.close()
+        second.close()
+
+# verify a unit of work commits once at the end of the request, or not at all if it raised
+def test_unit_of_work_commits_at_request_end(tmp_path, monkeypatch):
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "test_library.db"))
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    monkeypatch.setattr("database.REQUEST_UNIT_OF_WORK", True)
+    app = create_app()
+    seen = {}
+
+    @app.route("/_add/<isbn>")
+    def add(isbn):
+        insert_book("Unit Of Work", "Author", isbn, 1, 1)
+        seen["during"] = _book_count()
+        # a failing helper only undoes its own writes
+        insert_book("Duplicate", "Author", isbn, 1, 1)
+        if isbn.endswith("9"):
+            raise RuntimeError("boom")
+        return "ok"
+
+    client = app.test_client()
+    assert client.get("/_add/9780000000002").status_code == 200
+    assert seen["during"] == 0
+    assert _book_count() == 1
+    assert get_book_by_isbn("9780000000002").title == "Unit Of Work"
+
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    assert client.get("/_add/9780000000009").status_code == 500
+    assert _book_count() == 1
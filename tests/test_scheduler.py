@@ -0,0 +1,99 @@
+import pytest
+from datetime import datetime, timedelta, time
+from database import init_database, acquire_lock, release_lock, get_job_last_run
+import time as clock
+from scheduler import Job, JobScheduler, check_lease
+
+# verify only one owner can hold a lease until it expires or is released
+def test_lease_single_owner(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    assert acquire_lock("scheduler", "worker-a", 60) is True
+    assert acquire_lock("scheduler", "worker-b", 60) is False
+    assert acquire_lock("scheduler", "worker-a", 60) is True
+    release_lock("scheduler", "worker-a")
+    assert acquire_lock("scheduler", "worker-b", 60) is True
+
+# verify an expired lease can be taken over by another worker
+def test_lease_expires(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    assert acquire_lock("scheduler", "worker-a", 0) is True
+    assert acquire_lock("scheduler", "worker-b", 60) is True
+
+# verify daily jobs are due once per day after their scheduled time
+def test_daily_job_due():
+    job = Job("nightly", lambda: None, daily_at=time(2, 0))
+    now = datetime(2024, 5, 10, 9, 0)
+    assert job.is_due(None, now) is True
+    assert job.is_due(datetime(2024, 5, 10, 2, 0, 5), now) is False
+    assert job.is_due(datetime(2024, 5, 9, 2, 0, 5), now) is True
+    assert job.is_due(datetime(2024, 5, 9, 23, 0), datetime(2024, 5, 10, 1, 0)) is False
+
+# verify only the leader runs jobs and runs are recorded for the next leader
+def test_only_leader_runs_jobs(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    calls = []
+    leader, follower = JobScheduler(), JobScheduler()
+    for scheduler in (leader, follower):
+        scheduler.add_interval_job("count", lambda: calls.append(1), interval=timedelta(hours=1))
+
+    assert leader.run_pending() == ["count"]
+    assert follower.run_pending() == []
+    assert leader.run_pending() == []
+    assert len(calls) == 1
+    assert get_job_last_run("count") is not None
+
+    leader.stop()
+    assert follower.run_pending(datetime.now() + timedelta(hours=2)) == ["count"]
+    assert len(calls) == 2
+
+# verify the lease is renewed while a job runs longer than the lease
+def test_lease_renewed_during_long_job(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    leader, follower = JobScheduler(lease_seconds=2), JobScheduler(lease_seconds=2)
+    taken_over = []
+
+    def long_job():
+        for _ in range(12):
+            clock.sleep(0.25)
+            check_lease()
+            taken_over.append(follower.is_leader())
+
+    leader.add_interval_job("long", long_job, interval=timedelta(hours=1))
+    assert leader.run_pending() == ["long"]
+    assert taken_over == [False] * 12
+
+# verify a job stops at its next batch once the lease is lost, and is not recorded
+def test_job_stops_when_lease_lost(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    init_database()
+
+    leader = JobScheduler(lease_seconds=1)
+    batches = []
+
+    def long_job():
+        release_lock("scheduler", leader.owner)
+        acquire_lock("scheduler", "worker-b", 60)
+        for _ in range(20):
+            check_lease()
+            batches.append(1)
+            clock.sleep(0.1)
+
+    leader.add_interval_job("long", long_job, interval=timedelta(hours=1))
+    leader.add_interval_job("next", lambda: None, interval=timedelta(hours=1))
+    assert leader.run_pending() == []
+    assert len(batches) < 20
+    assert get_job_last_run("long") is None
+    assert get_job_last_run("next") is None
@@ -0,0 +1,86 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+import database
+from database import (
+    init_database, insert_book, get_book_by_isbn, get_statement_cache_stats,
+    reset_statement_cache_stats, warm_statements, optimize_database, STATEMENTS
+)
+from app import create_app
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    monkeypatch.setattr("app.add_sample_data", lambda: None)
+    return create_app()
+
+def _stats(name):
+    for entry in get_statement_cache_stats()["statements"]:
+        if entry["statement"] == name:
+            return entry["hits"], entry["misses"]
+    return 0, 0
+
+# verify a connection compiles a statement once and then reuses it
+def test_statement_cache_hits_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "test_library.db"))
+    init_database()
+    reset_statement_cache_stats()
+    conn = database.get_db_connection()
+    for _ in range(3):
+        conn.execute(STATEMENTS["book_by_id"], (1,)).fetchall()
+    conn.close()
+    assert _stats("book_by_id") == (2, 1)
+
+# verify warm-up prepares every registry query on a connection
+def test_warm_statements_prepares_queries(tmp_path, monkeypatch):
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "test_library.db"))
+    init_database()
+    conn = database.get_db_connection()
+    queries = [sql for sql in STATEMENTS.values()
+               if sql.lstrip().upper().startswith("SELECT") and "{table}" not in sql]
+    assert warm_statements(conn) == len(queries)
+    reset_statement_cache_stats()
+    conn.execute(STATEMENTS["changes_since"], (0, 10)).fetchall()
+    conn.close()
+    assert _stats("changes_since") == (1, 0)
+
+# verify planner statistics are gathered by the first run and refreshed later
+def test_optimize_database_analyzes(tmp_path, monkeypatch):
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "test_library.db"))
+    init_database()
+    insert_book("Planner Stats", "Author", "9780000000001", 1, 1)
+    assert optimize_database() is True
+    conn = sqlite3.connect(database.DATABASE)
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+    conn.close()
+    assert optimize_database() is True
+
+# verify requests reuse the pooled connection's warmed statements and the API reports it
+def test_requests_hit_warmed_cache(app):
+    insert_book("Warm Cache", "Author", "9780000000002", 1, 1)
+    book_id = get_book_by_isbn("9780000000002").id
+    reset_statement_cache_stats()
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get(f"/api/late_fee/123456/{book_id}").status_code in (200, 404)
+    hits, misses = _stats("patron_loans")
+    assert hits == 3 and misses == 0
+
+    stats = client.get("/api/stats/statements").get_json()
+    assert stats["hits"] >= hits
+    assert 0 < stats["hit_rate"] <= 1
+
+# verify batch borrows and returns send the registry's statements rather than their own copies
+def test_batch_paths_use_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr("database.DATABASE", str(tmp_path / "test_library.db"))
+    init_database()
+    insert_book("Batch Cache", "Author", "9780000000003", 2, 2)
+    book_id = get_book_by_isbn("9780000000003").id
+    reset_statement_cache_stats()
+    assert database.borrow_books_batch("123456", [book_id, 999], datetime.now(),
+                                       datetime.now() + timedelta(days=14), 5)
+    assert database.return_books_batch("123456", [book_id], datetime.now())
+    for name in ("patron_loan_count", "book_exists", "ready_hold_id", "update_availability",
+                 "adjust_any_branch_copies"):
+        assert sum(_stats(name)) > 0, name
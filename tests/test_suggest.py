@@ -0,0 +1,46 @@
+import pytest
+from database import init_database, insert_book
+from services.suggest_service import suggest_books
+from app import create_app
+
+def _setup_catalog(tmp_path, monkeypatch):
+    test_db = tmp_path / "test_library.db"
+    monkeypatch.setattr("database.DATABASE", str(test_db))
+    monkeypatch.setattr("services.suggest_service.VERSION_CHECK_INTERVAL", 0.0)
+    init_database()
+    insert_book("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565", 1, 1)
+    insert_book("Great Expectations", "Charles Dickens", "9780141439563", 1, 1)
+    insert_book("Gathering Storm", "Winston Churchill", "9780395416850", 1, 1)
+
+# verify whole-title matches rank ahead of word matches
+def test_suggest_title_prefix(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+
+    assert [s["text"] for s in suggest_books("great")] == ["Great Expectations", "The Great Gatsby"]
+    assert [s["text"] for s in suggest_books("GAT")] == ["Gathering Storm", "The Great Gatsby"]
+    assert suggest_books("great", k=1)[0]["book_id"] == 2
+    assert suggest_books("  ") == []
+
+# verify authors and ISBNs are suggested too
+def test_suggest_author_and_isbn(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+
+    assert suggest_books("dick") == [{"book_id": 2, "field": "author", "text": "Charles Dickens"}]
+    assert suggest_books("978-0743") == [{"book_id": 1, "field": "isbn", "text": "9780743273565"}]
+
+# verify books added later show up once the catalog version changes
+def test_suggest_index_rebuilt_on_new_books(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    assert suggest_books("moby") == []
+
+    insert_book("Moby Dick", "Herman Melville", "9781503280786", 1, 1)
+    assert [s["text"] for s in suggest_books("moby")] == ["Moby Dick"]
+    assert len(suggest_books("dick")) == 2
+
+# verify the API endpoint
+def test_suggest_api(tmp_path, monkeypatch):
+    _setup_catalog(tmp_path, monkeypatch)
+    client = create_app().test_client()
+
+    data = client.get("/api/suggest?q=fitz&k=5").get_json()
+    assert data["suggestions"][0]["text"] == "F. Scott Fitzgerald"